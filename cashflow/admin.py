@@ -1,9 +1,32 @@
 from django.contrib import admin
-from .models import Status, Type, Category, Subcategory, CashFlowRecord
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
+from .bulk import delete_records, update_records
+from .forms import RecordBulkForm
+from .models import (
+    Status, Type, Category, Subcategory, CashFlowRecord, ArchivedCashFlowRecord,
+    RecurringRecord, DailyRollup, BalanceCheckpoint, Job,
+)
+from .reference_cache import invalidate_reference_data
+
+
+@admin.action(description="Сбросить кеш справочников")
+def reset_reference_cache(modeladmin, request, queryset):
+    invalidate_reference_data()
+    modeladmin.message_user(request, "Кеш справочников сброшен")
+
+
+class ReferenceAdmin(admin.ModelAdmin):
+    """Базовый класс админки справочников с поддержкой кеша справочников"""
+    actions = [reset_reference_cache]
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_reference_data()
 
 
 @admin.register(Status)
-class StatusAdmin(admin.ModelAdmin):
+class StatusAdmin(ReferenceAdmin):
     list_display = ['name', 'description', 'created_at']
     search_fields = ['name', 'description']
     list_filter = ['created_at']
@@ -11,7 +34,7 @@ class StatusAdmin(admin.ModelAdmin):
 
 
 @admin.register(Type)
-class TypeAdmin(admin.ModelAdmin):
+class TypeAdmin(ReferenceAdmin):
     list_display = ['name', 'description', 'created_at']
     search_fields = ['name', 'description']
     list_filter = ['created_at']
@@ -19,7 +42,7 @@ class TypeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(ReferenceAdmin):
     list_display = ['name', 'type', 'description', 'created_at']
     search_fields = ['name', 'description', 'type__name']
     list_filter = ['type', 'created_at']
@@ -27,13 +50,40 @@ class CategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Subcategory)
-class SubcategoryAdmin(admin.ModelAdmin):
+class SubcategoryAdmin(ReferenceAdmin):
     list_display = ['name', 'category', 'description', 'created_at']
     search_fields = ['name', 'description', 'category__name']
     list_filter = ['category', 'created_at']
     ordering = ['category__name', 'name']
 
 
+@admin.action(description="Изменить выбранные записи")
+def bulk_update_records(modeladmin, request, queryset):
+    """Массовое изменение статуса и классификации одним UPDATE"""
+    form = RecordBulkForm(request.POST if 'apply' in request.POST else None)
+    if form.is_bound and form.is_valid():
+        changes = form.get_changes()
+        if changes:
+            updated = update_records(queryset, **changes)
+            modeladmin.message_user(request, f"Изменено записей: {updated}")
+            return None
+        form.add_error(None, "Не выбрано ни одного нового значения.")
+
+    context = {
+        **modeladmin.admin_site.each_context(request),
+        'title': "Изменение выбранных записей ДДС",
+        'opts': modeladmin.model._meta,
+        'form': form,
+        'record_count': queryset.count(),
+        # При выборе всех записей по фильтрам список id не передаётся
+        'select_across': request.POST.get('select_across') == '1',
+        'selected_ids': [] if request.POST.get('select_across') == '1'
+        else queryset.values_list('pk', flat=True),
+        'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+    }
+    return TemplateResponse(request, 'admin/cashflow/cashflowrecord/bulk_update.html', context)
+
+
 @admin.register(CashFlowRecord)
 class CashFlowRecordAdmin(admin.ModelAdmin):
     list_display = ['date', 'type', 'category', 'subcategory', 'amount', 'status', 'created_at']
@@ -41,7 +91,8 @@ class CashFlowRecordAdmin(admin.ModelAdmin):
     list_filter = ['date', 'type', 'category', 'subcategory', 'status', 'created_at']
     date_hierarchy = 'date'
     ordering = ['-date', '-created_at']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['idempotency_key', 'created_at', 'updated_at']
+    actions = [bulk_update_records]
 
     fieldsets = (
         ('Основная информация', {
@@ -50,6 +101,66 @@ class CashFlowRecordAdmin(admin.ModelAdmin):
         ('Классификация', {
             'fields': ('status', 'type', 'category', 'subcategory')
         }),
+        ('Системная информация', {
+            'fields': ('idempotency_key', 'created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'status', 'type', 'category', 'subcategory'
+        )
+
+    def delete_queryset(self, request, queryset):
+        # Одним DELETE вместо удаления и сигналов для каждой записи
+        delete_records(queryset)
+
+
+@admin.register(ArchivedCashFlowRecord)
+class ArchivedCashFlowRecordAdmin(admin.ModelAdmin):
+    list_display = ['id', 'date', 'type', 'category', 'subcategory', 'amount', 'status', 'archived_at']
+    search_fields = ['comment']
+    list_filter = ['type', 'status']
+    date_hierarchy = 'date'
+    ordering = ['-date', '-created_at']
+
+    # Архив закрытых периодов только для чтения; записи переносит команда archive_records
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'status', 'type', 'category', 'subcategory'
+        )
+
+
+@admin.register(RecurringRecord)
+class RecurringRecordAdmin(admin.ModelAdmin):
+    list_display = ['name', 'rule', 'amount', 'type', 'category', 'status', 'start_date', 'end_date',
+                    'is_active', 'materialized_until']
+    search_fields = ['name', 'comment', 'category__name', 'subcategory__name']
+    list_filter = ['is_active', 'type', 'status']
+    ordering = ['name']
+    # Отметку последнего запуска сдвигает команда materialize_recurring
+    readonly_fields = ['materialized_until', 'created_at', 'updated_at']
+
+    fieldsets = (
+        ('Основная информация', {
+            'fields': ('name', 'amount', 'comment', 'is_active')
+        }),
+        ('Расписание', {
+            'fields': ('rule', 'start_date', 'end_date', 'materialized_until')
+        }),
+        ('Классификация', {
+            'fields': ('status', 'type', 'category', 'subcategory')
+        }),
         ('Системная информация', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -60,3 +171,58 @@ class CashFlowRecordAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related(
             'status', 'type', 'category', 'subcategory'
         )
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'status', 'type', 'category', 'subcategory', 'total_amount', 'record_count']
+    list_filter = ['date', 'type', 'category', 'status']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+
+    # Итоги поддерживаются автоматически и пересчитываются командой rebuild_rollups
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'status', 'type', 'category', 'subcategory'
+        )
+
+
+@admin.register(BalanceCheckpoint)
+class BalanceCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['month', 'status', 'balance']
+    list_filter = ['status']
+    ordering = ['-month', 'status__name']
+
+    # Точки остатка поддерживаются автоматически и пересчитываются при запросе остатка
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('status')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'command', 'status', 'progress', 'total', 'message', 'created_at', 'finished_at']
+    list_filter = ['status', 'command']
+    ordering = ['-created_at', '-id']
+    readonly_fields = [
+        'command', 'arguments', 'options', 'status', 'progress', 'total', 'message', 'output',
+        'input_file', 'result_file', 'worker', 'created_at', 'started_at', 'heartbeat_at', 'finished_at',
+    ]
+
+    # Задания создаются из интерфейса и выполняются командой run_workers
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
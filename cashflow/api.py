@@ -0,0 +1,272 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .archive import reaches_archive
+from .balances import balance_series
+from .filters import get_record_filters, filter_records, invalid_filters
+from .forecast import ForecastUnavailable, build_forecast, get_forecast_options
+from .ingest import get_max_batch_size, ingest_records
+from .models import Status, Type, Category, Subcategory, CashFlowRecord, ArchivedCashFlowRecord
+from .pagination import KeysetPaginator
+from .reports import BUCKETS, choose_bucket, parse_date
+from .routers import replica_reads
+from .serializers import (
+    StatusSerializer, TypeSerializer, CategorySerializer, SubcategorySerializer,
+    CashFlowRecordSerializer,
+)
+
+
+class KeysetCursorPagination(BasePagination):
+    """Курсорная пагинация API на основе KeysetPaginator ленты записей"""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 100
+    max_page_size = 1000
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.get_page_size(request))
+        self.page = paginator.get_page(request.query_params.get(self.cursor_query_param))
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        previous_link = self.get_link(self.page.previous_cursor)
+        if previous_link is None and self.page.has_previous:
+            previous_link = remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return Response({
+            'next': self.get_link(self.page.next_cursor),
+            'previous': previous_link,
+            'results': data,
+        })
+
+
+class SparseFieldsViewSetMixin:
+    """Загрузка связанных таблиц только для запрошенных полей ответа"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        related = self.get_serializer_class().get_select_related(self.request)
+        return queryset.select_related(*related) if related else queryset
+
+
+class ReplicaReadsMixin:
+    """Чтение записей ДДС и итогов с реплик для GET-запросов"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class StatusViewSet(SparseFieldsViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """Статусы"""
+    queryset = Status.objects.all()
+    serializer_class = StatusSerializer
+    pagination_class = None
+
+
+class TypeViewSet(SparseFieldsViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """Типы операций"""
+    queryset = Type.objects.all()
+    serializer_class = TypeSerializer
+    pagination_class = None
+
+
+class CategoryViewSet(SparseFieldsViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """Категории; ?type= ограничивает категории одного типа"""
+    queryset = Category.objects.all()
+    serializer_class = CategorySerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        type_id = self.request.query_params.get('type')
+        if type_id and type_id.isdigit():
+            queryset = queryset.filter(type_id=type_id)
+        return queryset
+
+
+class SubcategoryViewSet(SparseFieldsViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """Подкатегории; ?category= ограничивает подкатегории одной категории"""
+    queryset = Subcategory.objects.all()
+    serializer_class = SubcategorySerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        category_id = self.request.query_params.get('category')
+        if category_id and category_id.isdigit():
+            queryset = queryset.filter(category_id=category_id)
+        return queryset
+
+
+class CashFlowRecordViewSet(ReplicaReadsMixin, SparseFieldsViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Записи ДДС с фильтрами главной страницы.
+
+    Параметры: date_from, date_to, status, type, category, subcategory,
+    fields (список полей ответа), cursor и page_size (1-1000).
+    POST batch/ - пакетная загрузка записей.
+    """
+    queryset = CashFlowRecord.objects.all()
+    serializer_class = CashFlowRecordSerializer
+    pagination_class = KeysetCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            try:
+                queryset = filter_records(queryset, get_record_filters(self.request.query_params))
+            except (ValueError, DjangoValidationError) as error:
+                messages = error.messages if isinstance(error, DjangoValidationError) else [str(error)]
+                raise ValidationError({'filters': messages})
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        # Архивные записи добавляются, только если период фильтров захватывает архив
+        filters = get_record_filters(self.request.query_params)
+        if reaches_archive(filters):
+            related = self.get_serializer_class().get_select_related(self.request)
+            archive = filter_records(ArchivedCashFlowRecord.objects.select_related(*related), filters)
+            queryset = [queryset, archive]
+        return super().paginate_queryset(queryset)
+
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        """
+        Пакетная загрузка записей: массив записей или {"records": [...]}.
+
+        Поля записи: date, status, type, category, subcategory (названия
+        или id), amount, comment, idempotency_key. Ответ содержит результат
+        по каждой записи: created, duplicate или error.
+        """
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get('records')
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'records': ['Expected a non-empty list of records.']})
+        max_batch_size = get_max_batch_size()
+        if len(items) > max_batch_size:
+            raise ValidationError({'records': [f'At most {max_batch_size} records per request.']})
+
+        results = ingest_records(items)
+        counts = {'created': 0, 'duplicate': 0, 'error': 0}
+        for result in results:
+            counts[result['status']] += 1
+        response_status = status.HTTP_201_CREATED if counts['created'] else status.HTTP_200_OK
+        return Response({
+            'created': counts['created'],
+            'duplicates': counts['duplicate'],
+            'failed': counts['error'],
+            'results': results,
+        }, status=response_status)
+
+
+class BalanceView(ReplicaReadsMixin, APIView):
+    """
+    Остаток денежных средств (поступления минус списания) на конец каждого периода.
+
+    Параметры: date_from, date_to (по умолчанию последние 30 дней), status,
+    bucket (day, week или month; по умолчанию по ширине периода).
+    """
+
+    def get(self, request):
+        params = request.query_params
+        date_to = parse_date(params.get('date_to')) or timezone.localdate()
+        date_from = parse_date(params.get('date_from')) or date_to - timedelta(days=30)
+        if date_from > date_to:
+            raise ValidationError({'date_from': ['date_from must not be later than date_to.']})
+        bucket = params.get('bucket') or choose_bucket(date_from, date_to)
+        if bucket not in BUCKETS:
+            raise ValidationError({'bucket': [f'Expected one of: {", ".join(BUCKETS)}.']})
+        status_id = params.get('status')
+        if status_id and not status_id.isdigit():
+            raise ValidationError({'status': ['Expected a status id.']})
+
+        series = balance_series(date_from, date_to, status_id, bucket)
+        # Суммы передаются строками, как DecimalField в остальных ответах API
+        return Response({
+            'date_from': date_from,
+            'date_to': date_to,
+            'bucket': bucket,
+            'opening_balance': str(series['opening_balance']),
+            'closing_balance': str(series['closing_balance']),
+            'points': [
+                {'period': point['period'], 'net': str(point['net']), 'balance': str(point['balance'])}
+                for point in series['points']
+            ],
+        })
+
+
+class ForecastView(ReplicaReadsMixin, APIView):
+    """
+    Прогноз поступлений и списаний по категориям на ближайшие месяцы.
+
+    Параметры: фильтры главной страницы (период задаёт окно истории),
+    months (горизонт, 1-24), history (месяцев истории без периода, 1-120),
+    method (auto, moving_average, seasonal_naive или linear_trend).
+    """
+
+    def get(self, request):
+        options, errors = get_forecast_options(request.query_params)
+        filters = get_record_filters(request.query_params)
+        errors.update({
+            name: 'Expected a date in YYYY-MM-DD format.' if name.startswith('date') else 'Expected an id.'
+            for name in invalid_filters(filters)
+        })
+        if errors:
+            raise ValidationError({name: [message] for name, message in errors.items()})
+        try:
+            forecast = build_forecast(filters, options)
+        except ForecastUnavailable as error:
+            return Response({'detail': str(error)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        # Суммы передаются строками, как DecimalField в остальных ответах API
+        return Response({
+            'history_from': forecast['history_from'],
+            'history_to': forecast['history_to'],
+            'method': forecast['method'],
+            'months': forecast['months'],
+            'totals': [
+                {
+                    'month': row['month'],
+                    'income': str(row['income']),
+                    'expense': str(row['expense']),
+                    'net': str(row['net']),
+                }
+                for row in forecast['totals']
+            ],
+            'categories': [
+                {
+                    'type': row['type_id'],
+                    'type_name': row['type_name'],
+                    'category': row['category_id'],
+                    'category_name': row['category_name'],
+                    'method': row['method'],
+                    'forecast': [str(value) for value in row['forecast']],
+                    'scheduled': [str(value) for value in row['scheduled']],
+                }
+                for row in forecast['rows']
+            ],
+        })
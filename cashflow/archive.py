@@ -0,0 +1,120 @@
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from .bulk import delete_ids
+from .filters import SEARCH_PARAM, filter_records
+from .models import ArchivedCashFlowRecord, CashFlowRecord
+from .reports import parse_date
+from .routers import primary_reads
+
+
+# Последняя дата архивных записей в общем кеше Django ('' - архив пуст)
+ARCHIVE_BOUNDARY_CACHE_KEY = 'cashflow:archive_boundary'
+
+
+def get_boundary_timeout():
+    """
+    Срок хранения границы архива в кеше (секунды).
+
+    archive_records сбрасывает границу после каждого пакета; срок ограничивает
+    устаревание, если сброс не дошёл до кеша процесса (кеш locmem).
+    """
+    return getattr(settings, 'CASHFLOW_ARCHIVE_BOUNDARY_TIMEOUT', 300)
+
+
+def get_archive_boundary():
+    """Последняя дата записей в архиве (None - архив пуст)"""
+    boundary = cache.get(ARCHIVE_BOUNDARY_CACHE_KEY)
+    if boundary is None:
+        # Граница кешируется для всех процессов, поэтому читается с основной базы
+        with primary_reads():
+            last = ArchivedCashFlowRecord.objects.order_by('-date').values_list('date', flat=True).first()
+        boundary = last.isoformat() if last else ''
+        cache.set(ARCHIVE_BOUNDARY_CACHE_KEY, boundary, get_boundary_timeout())
+    return date.fromisoformat(boundary) if boundary else None
+
+
+async def aget_archive_boundary():
+    """Асинхронный вариант get_archive_boundary"""
+    boundary = await cache.aget(ARCHIVE_BOUNDARY_CACHE_KEY)
+    if boundary is None:
+        with primary_reads():
+            last = await ArchivedCashFlowRecord.objects.order_by('-date').values_list('date', flat=True).afirst()
+        boundary = last.isoformat() if last else ''
+        await cache.aset(ARCHIVE_BOUNDARY_CACHE_KEY, boundary, get_boundary_timeout())
+    return date.fromisoformat(boundary) if boundary else None
+
+
+def invalidate_archive_boundary():
+    cache.delete(ARCHIVE_BOUNDARY_CACHE_KEY)
+
+
+def reaches_archive(filters):
+    """Захватывает ли период фильтров архивные записи"""
+    return period_reaches(filters, get_archive_boundary())
+
+
+def period_reaches(filters, boundary):
+    """Начинается ли период фильтров не позже последней даты архива boundary"""
+    if boundary is None:
+        return False
+    date_from = parse_date(filters.get('date_from'))
+    return date_from is None or date_from <= boundary
+
+
+def record_querysets(filters, select_related=()):
+    """
+    Querysets ленты записей ДДС для фильтров главной страницы.
+
+    Архивная таблица добавляется только если период фильтров её захватывает,
+    поэтому запросы за текущие периоды не затрагивают архив.
+    """
+    querysets = [CashFlowRecord.objects.select_related(*select_related)]
+    if reaches_archive(filters):
+        querysets.append(ArchivedCashFlowRecord.objects.select_related(*select_related))
+    return [filter_records(queryset, filters) for queryset in querysets]
+
+
+async def arecord_querysets(filters, select_related=()):
+    """Асинхронный вариант record_querysets"""
+    querysets = [CashFlowRecord.objects.select_related(*select_related)]
+    if period_reaches(filters, await aget_archive_boundary()):
+        querysets.append(ArchivedCashFlowRecord.objects.select_related(*select_related))
+    if filters.get(SEARCH_PARAM):
+        # Поиск при первом обращении читает список таблиц FTS5 синхронной интроспекцией
+        return await sync_to_async(lambda: [filter_records(queryset, filters) for queryset in querysets])()
+    return [filter_records(queryset, filters) for queryset in querysets]
+
+
+def archive_records(before, batch_size=5000, progress=None):
+    """
+    Перенос записей с датой раньше before в архив пакетами по batch_size.
+
+    Каждый пакет копируется в архив и удаляется из ленты в одной транзакции.
+    Записи остаются в учёте, поэтому дневные итоги и остатки не меняются.
+    """
+    fields = [field.attname for field in CashFlowRecord._meta.concrete_fields]
+    moved = 0
+    while True:
+        with transaction.atomic():
+            records = CashFlowRecord.objects.filter(date__lt=before).order_by('pk')
+            if connection.features.has_select_for_update:
+                records = records.select_for_update()
+            rows = list(records.values(*fields)[:batch_size])
+            if not rows:
+                break
+            ArchivedCashFlowRecord.objects.bulk_create(
+                [ArchivedCashFlowRecord(**row) for row in rows]
+            )
+            # Удаляются ровно скопированные записи: запись, дату которой
+            # параллельно перенесли в период, дождётся следующего пакета
+            delete_ids(CashFlowRecord, [row['id'] for row in rows])
+        # Перенесённые записи должны сразу читаться из архива во всех процессах
+        invalidate_archive_boundary()
+        moved += len(rows)
+        if progress:
+            progress(moved)
+    return moved
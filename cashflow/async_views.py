@@ -0,0 +1,82 @@
+"""
+Асинхронные варианты представлений ленты и справочников для запуска под ASGI.
+
+Данные читаются асинхронным ORM, поэтому запрос не занимает поток, пока
+ждёт базу. Шаблон отрисовывается в потоке синхронного кода запроса: теги
+шаблонов, сессия и сообщения обращаются к базе синхронно. Подключаются
+вместо синхронных представлений настройкой CASHFLOW_ASYNC_VIEWS.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import render
+from .archive import arecord_querysets
+from .filters import SEARCH_PARAM
+from .pagination import AsyncPaginator, KeysetPaginator, acached_count
+from .reference_cache import aget_reference_data
+from .reports import areference_usage_counts
+from .routers import read_from_replica
+from .views import (
+    INDEX_SELECT_RELATED, get_page_filters, get_pagination_mode, index_context, index_records,
+    live_count_filters, reference_context, reference_json,
+)
+
+
+@read_from_replica
+async def index(request):
+    """Главная страница с таблицей записей ДДС и фильтрами"""
+    current_filters = get_page_filters(request)
+    querysets = await arecord_querysets(current_filters, select_related=INDEX_SELECT_RELATED)
+    search_query = current_filters[SEARCH_PARAM]
+
+    pagination_mode = get_pagination_mode(search_query)
+    total_count = None
+    if pagination_mode == 'keyset':
+        page_obj = await KeysetPaginator(querysets, 20).aget_page(request.GET.get('cursor'))
+        if getattr(settings, 'CASHFLOW_SHOW_TOTAL_COUNT', True):
+            total_count = await acached_count(querysets, current_filters)
+    else:
+        paginator = AsyncPaginator(index_records(querysets, search_query), 20)
+        page_obj = await paginator.aget_page(request.GET.get('page'))
+        total_count = paginator.count
+    bulk_count = total_count
+    if total_count is not None and len(querysets) > 1:
+        bulk_count = await acached_count(querysets[0], live_count_filters(current_filters))
+
+    reference = await aget_reference_data()
+    context = index_context(
+        request, current_filters, reference, page_obj, pagination_mode, total_count, bulk_count,
+    )
+    return await sync_to_async(render)(request, 'cashflow/index.html', context)
+
+
+@reference_json
+async def get_categories_by_type(request):
+    """AJAX endpoint для получения категорий по типу"""
+    type_id = request.GET.get('type_id')
+    if type_id:
+        try:
+            categories = (await aget_reference_data()).categories_for_type(int(type_id))
+        except ValueError:
+            categories = []
+        return JsonResponse([{'id': c.id, 'name': c.name} for c in categories], safe=False)
+    return JsonResponse([], safe=False)
+
+
+@reference_json
+async def get_subcategories_by_category(request):
+    """AJAX endpoint для получения подкатегорий по категории"""
+    category_id = request.GET.get('category_id')
+    if category_id:
+        try:
+            subcategories = (await aget_reference_data()).subcategories_for_category(int(category_id))
+        except ValueError:
+            subcategories = []
+        return JsonResponse([{'id': s.id, 'name': s.name} for s in subcategories], safe=False)
+    return JsonResponse([], safe=False)
+
+
+async def reference_data(request):
+    """Страница управления справочниками"""
+    context = reference_context(await aget_reference_data(), await areference_usage_counts())
+    return await sync_to_async(render)(request, 'cashflow/reference_data.html', context)
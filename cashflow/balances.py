@@ -0,0 +1,166 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import F
+from django.db.models.functions import TruncMonth
+from .models import BalanceCheckpoint, DailyRollup
+from .reference_cache import get_reference_data
+from .reports import BUCKETS, INCOME_TYPE_NAME, income_expense_sums
+from .routers import primary_reads
+
+
+def month_start(day):
+    """Первое число месяца даты"""
+    return day.replace(day=1)
+
+
+def add_month(month):
+    """Первое число следующего месяца"""
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def shift_checkpoints(changes):
+    """
+    Учёт изменения записей в контрольных точках остатка.
+
+    changes - пары (ключ дневного итога, изменение суммы). Изменение записи
+    за дату D меняет остаток на начало всех следующих месяцев, поэтому
+    на каждую пару (месяц, статус) выполняется один UPDATE более поздних точек.
+    Задним числом исправленные записи обрабатываются так же.
+    """
+    types = get_reference_data().types_by_id
+    deltas = defaultdict(Decimal)
+    for bucket, amount in changes:
+        if not amount:
+            continue
+        day, status_id, type_id = bucket[:3]
+        type_obj = types.get(type_id)
+        sign = 1 if type_obj is not None and type_obj.name == INCOME_TYPE_NAME else -1
+        deltas[(month_start(day), status_id)] += sign * amount
+    for (month, status_id), delta in deltas.items():
+        if delta:
+            BalanceCheckpoint.objects.filter(status_id=status_id, month__gt=month).update(
+                balance=F('balance') + delta
+            )
+
+
+def clear_checkpoints(date_from=None):
+    """Удаление контрольных точек, на которые влияют записи начиная с date_from"""
+    checkpoints = BalanceCheckpoint.objects.all()
+    if date_from:
+        checkpoints = checkpoints.filter(month__gt=date_from)
+    checkpoints.delete()
+
+
+def build_checkpoints(month, status_ids):
+    """
+    Расчёт недостающих контрольных точек на начало месяца.
+
+    Остаток считается от ближайшей более ранней точки статуса по месячным
+    суммам дневных итогов; точки всех промежуточных месяцев сохраняются,
+    чтобы следующие запросы начинались с них. Расчёт читает основную базу:
+    отставшая реплика сохранила бы неверные точки.
+    """
+    with primary_reads():
+        return _build_checkpoints(month, status_ids)
+
+
+def _build_checkpoints(month, status_ids):
+    previous = {}
+    for checkpoint in BalanceCheckpoint.objects.filter(
+        status_id__in=status_ids, month__lt=month
+    ).order_by('status_id', '-month'):
+        previous.setdefault(checkpoint.status_id, checkpoint)
+
+    rollups = DailyRollup.objects.order_by().filter(status_id__in=status_ids, date__lt=month)
+    if len(previous) == len(status_ids):
+        rollups = rollups.filter(date__gte=min(checkpoint.month for checkpoint in previous.values()))
+    net_by_month = defaultdict(dict)
+    for row in rollups.annotate(period=TruncMonth('date')).values('status_id', 'period').annotate(
+        **income_expense_sums()
+    ):
+        net_by_month[row['status_id']][row['period']] = row['income'] - row['expense']
+
+    balances = {}
+    checkpoints = []
+    for status_id in status_ids:
+        monthly = net_by_month.get(status_id, {})
+        base = previous.get(status_id)
+        balance = base.balance if base is not None else Decimal('0')
+        if base is None and not monthly:
+            # До этого месяца у статуса нет записей
+            checkpoints.append(BalanceCheckpoint(month=month, status_id=status_id, balance=balance))
+        else:
+            current = base.month if base is not None else min(monthly)
+            while current < month:
+                balance += monthly.get(current, Decimal('0'))
+                current = add_month(current)
+                checkpoints.append(BalanceCheckpoint(month=current, status_id=status_id, balance=balance))
+        balances[status_id] = balance
+
+    BalanceCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+    return balances
+
+
+def get_checkpoints(month):
+    """Остатки по статусам на начало месяца; недостающие точки рассчитываются и сохраняются"""
+    status_ids = [status.pk for status in get_reference_data().statuses]
+    balances = dict(
+        BalanceCheckpoint.objects.filter(month=month, status_id__in=status_ids)
+        .values_list('status_id', 'balance')
+    )
+    missing = [status_id for status_id in status_ids if status_id not in balances]
+    if missing:
+        balances.update(build_checkpoints(month, missing))
+    return balances
+
+
+def balance_at(day, status_id=None):
+    """
+    Остаток на конец дня: контрольная точка месяца плюс итоги с начала месяца.
+
+    Без status_id - суммарный остаток по всем статусам.
+    """
+    month = month_start(day)
+    checkpoints = get_checkpoints(month)
+    rollups = DailyRollup.objects.order_by().filter(date__gte=month, date__lte=day)
+    if status_id:
+        opening = checkpoints.get(int(status_id), Decimal('0'))
+        rollups = rollups.filter(status_id=status_id)
+    else:
+        opening = sum(checkpoints.values(), Decimal('0'))
+    sums = rollups.aggregate(**income_expense_sums())
+    return opening + sums['income'] - sums['expense']
+
+
+def balance_series(date_from, date_to, status_id=None, bucket='day'):
+    """Остаток на конец каждого периода (день, неделя, месяц) между двумя датами"""
+    balance = balance_at(date_from - timedelta(days=1), status_id)
+    opening = balance
+    rollups = DailyRollup.objects.order_by().filter(date__gte=date_from, date__lte=date_to)
+    if status_id:
+        rollups = rollups.filter(status_id=status_id)
+    points = []
+    for row in rollups.annotate(period=BUCKETS[bucket]('date')).values('period').annotate(
+        **income_expense_sums()
+    ).order_by('period'):
+        net = row['income'] - row['expense']
+        balance += net
+        points.append({'period': row['period'], 'net': net, 'balance': balance})
+    return {'opening_balance': opening, 'closing_balance': balance, 'points': points}
+
+
+def add_report_balances(report, status_id=None):
+    """Остаток на начало отчёта и на конец каждого его периода"""
+    if report['date_from'] is None:
+        return report
+    balance = balance_at(report['date_from'] - timedelta(days=1), status_id)
+    report['opening_balance'] = balance
+    for row in report['periods']:
+        balance += row['net']
+        row['balance'] = balance
+    report['closing_balance'] = balance
+    return report
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from .models import CashFlowRecord
+from .rollups import BUCKET_FIELDS, apply_bucket_totals, apply_records, get_bucket
+
+
+# Порядок значений в строках для массовой вставки записей ДДС
+RECORD_COLUMNS = ('date', 'status_id', 'type_id', 'category_id', 'subcategory_id', 'amount', 'comment')
+
+# id в одном DELETE: список ограничен числом параметров запроса
+DELETE_CHUNK_SIZE = 500
+
+
+def insert_records(rows, extra_columns=()):
+    """
+    Массовая вставка проверенных записей ДДС одним executemany.
+
+    rows - кортежи значений в порядке RECORD_COLUMNS (+ extra_columns).
+    Модели не создаются: для сотен тысяч строк подготовка значений через
+    bulk_create занимает на порядок больше времени, чем сама вставка.
+    Дневные итоги обновляются в той же транзакции.
+    """
+    if not rows:
+        return 0
+    opts = CashFlowRecord._meta
+    quote = connection.ops.quote_name
+    columns = [opts.get_field(name).column for name in RECORD_COLUMNS + tuple(extra_columns)]
+    columns += ['created_at', 'updated_at']
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    sql = (
+        f'INSERT INTO {quote(opts.db_table)} ({", ".join(quote(column) for column in columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))})'
+    )
+    adapt_date = connection.ops.adapt_datefield_value
+    adapt_amount = connection.ops.adapt_decimalfield_value
+
+    totals = defaultdict(lambda: [Decimal('0'), 0])
+    params = []
+    for row in rows:
+        bucket = row[:5]
+        totals[bucket][0] += row[5]
+        totals[bucket][1] += 1
+        params.append((adapt_date(row[0]), *row[1:5], adapt_amount(row[5], 12, 2), *row[6:], now, now))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+        apply_bucket_totals(totals)
+    return len(params)
+
+
+def delete_ids(model, ids):
+    """
+    Удаление строк модели по списку id пакетами по DELETE_CHUNK_SIZE.
+
+    Объекты не загружаются и сигналы не вызываются; удаляются ровно
+    переданные строки, даже если условие отбора уже подходит и другим.
+    """
+    quote = connection.ops.quote_name
+    sql = f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} IN '
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+            chunk = ids[start:start + DELETE_CHUNK_SIZE]
+            cursor.execute(sql + f'({", ".join(["%s"] * len(chunk))})', chunk)
+            deleted += cursor.rowcount
+    return deleted
+
+
+def lock_records(queryset):
+    """Блокировка изменяемых записей до конца транзакции (если база поддерживает)"""
+    if connection.features.has_select_for_update:
+        list(queryset.select_for_update().values_list('pk', flat=True))
+
+
+def get_bucket_totals(queryset):
+    """Суммы и количества записей по ключам дневных итогов одним запросом"""
+    rows = queryset.order_by().values(*BUCKET_FIELDS).annotate(
+        total=Sum('amount'), count=Count('id')
+    )
+    return {get_bucket(row): (row['total'], row['count']) for row in rows}
+
+
+def update_records(queryset, **changes):
+    """
+    Изменение набора записей ДДС одним UPDATE.
+
+    changes - новые значения полей справочников (status_id, type_id,
+    category_id, subcategory_id), согласованность которых проверена заранее.
+    Сигналы при массовом изменении не вызываются, поэтому дневные итоги
+    переносятся по сгруппированным суммам, прочитанным до изменения.
+    """
+    positions = {name: BUCKET_FIELDS.index(name) for name in changes}
+    with transaction.atomic():
+        lock_records(queryset)
+        old_totals = get_bucket_totals(queryset)
+        updated = queryset.update(**changes, updated_at=timezone.now())
+
+        totals = defaultdict(lambda: [Decimal('0'), 0])
+        for bucket, (amount, count) in old_totals.items():
+            new_bucket = list(bucket)
+            for name, value in changes.items():
+                new_bucket[positions[name]] = value
+            totals[bucket][0] -= amount
+            totals[bucket][1] -= count
+            totals[tuple(new_bucket)][0] += amount
+            totals[tuple(new_bucket)][1] += count
+        apply_bucket_totals({
+            bucket: values for bucket, values in totals.items() if values[1] or values[0]
+        })
+    return updated
+
+
+def delete_records(queryset):
+    """
+    Удаление набора записей ДДС с вычитанием из дневных итогов.
+
+    На записи ДДС не ссылаются другие модели, поэтому удаление выполняется
+    без загрузки объектов и без сигналов для каждой записи. Удаляются и
+    вычитаются из итогов ровно прочитанные записи: запись, попавшая под
+    условие отбора параллельно, не удаляется мимо итогов.
+    """
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            queryset = queryset.select_for_update()
+        rows = list(queryset.order_by().values('pk', 'amount', *BUCKET_FIELDS))
+        deleted = delete_ids(CashFlowRecord, [row['pk'] for row in rows])
+        apply_records(rows, sign=-1)
+    return deleted
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from .reference_cache import get_reference_version
+
+
+def reference_fragments(request):
+    """
+    Версия справочников для ключей кеша фрагментов шаблонов ({% cache %}).
+
+    Версия меняется при любом изменении статусов, типов, категорий и
+    подкатегорий, поэтому закешированные списки справочников не устаревают.
+    """
+    return {
+        'reference_version': SimpleLazyObject(get_reference_version),
+        'fragment_cache_timeout': getattr(settings, 'CASHFLOW_FRAGMENT_CACHE_TIMEOUT', 86400),
+    }
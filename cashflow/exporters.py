@@ -0,0 +1,72 @@
+import csv
+import heapq
+
+from .archive import record_querysets
+from .pagination import KEYSET_ORDERING
+from .reference_cache import get_reference_data
+
+
+# Колонки выгрузки совпадают с колонками импорта, файл можно загрузить обратно
+EXPORT_COLUMNS = ('date', 'status', 'type', 'category', 'subcategory', 'amount', 'comment')
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку вместо буферизации"""
+
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(filters, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Строки выгрузки записей ДДС по фильтрам главной страницы.
+
+    Записи читаются кортежами через iterator() без создания моделей,
+    названия справочников подставляются из кеша справочников без JOIN.
+    """
+    reference = get_reference_data()
+    statuses = {obj.pk: obj.name for obj in reference.statuses}
+    types = {obj.pk: obj.name for obj in reference.types}
+    categories = {obj.pk: obj.name for obj in reference.categories}
+    subcategories = {obj.pk: obj.name for obj in reference.subcategories}
+
+    # Лента и архив (если период его захватывает) читаются параллельно
+    # и объединяются в порядке ленты без загрузки в память
+    sources = [
+        records.order_by(*KEYSET_ORDERING).values_list(
+            'date', 'created_at', 'id',
+            'status_id', 'type_id', 'category_id', 'subcategory_id', 'amount', 'comment'
+        ).iterator(chunk_size=chunk_size)
+        for records in record_querysets(filters)
+    ]
+    rows = sources[0] if len(sources) == 1 else heapq.merge(
+        *sources, key=lambda row: row[:3], reverse=True
+    )
+
+    yield EXPORT_COLUMNS
+    for record_date, _, _, status_id, type_id, category_id, subcategory_id, amount, comment in rows:
+        yield (
+            record_date.isoformat(),
+            statuses.get(status_id, status_id),
+            types.get(type_id, type_id),
+            categories.get(category_id, category_id),
+            subcategories.get(subcategory_id, subcategory_id),
+            amount,
+            comment,
+        )
+
+
+def iter_csv(filters, chunk_size=EXPORT_CHUNK_SIZE):
+    """Потоковая выгрузка CSV: первая строка (с BOM для Excel) отдаётся сразу"""
+    writer = csv.writer(Echo())
+    rows = iter_export_rows(filters, chunk_size)
+    yield '\ufeff' + writer.writerow(next(rows))
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow(row))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
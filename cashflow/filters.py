@@ -0,0 +1,77 @@
+from django.utils.dateparse import parse_date
+from .search import search_records
+
+
+FILTER_PARAMS = ('date_from', 'date_to', 'status', 'type', 'category', 'subcategory')
+
+# Поиск по тексту комментария; к дневным итогам не применяется
+SEARCH_PARAM = 'q'
+
+# Названия фильтров в форме фильтров для сообщений о некорректных значениях
+FILTER_LABELS = {
+    'date_from': 'Дата с',
+    'date_to': 'Дата по',
+    'status': 'Статус',
+    'type': 'Тип',
+    'category': 'Категория',
+    'subcategory': 'Подкатегория',
+}
+
+# Наибольший id, который принимают целочисленные столбцы базы
+MAX_ID = 2 ** 63 - 1
+
+
+def get_record_filters(params):
+    """Извлечение параметров фильтрации записей ДДС из GET-параметров"""
+    filters = {name: params.get(name) for name in FILTER_PARAMS}
+    filters[SEARCH_PARAM] = (params.get(SEARCH_PARAM) or '').strip() or None
+    return filters
+
+
+def is_valid_filter(name, value):
+    """Можно ли передать значение фильтра в запрос: дата ГГГГ-ММ-ДД или id справочника"""
+    if name in ('date_from', 'date_to'):
+        try:
+            return parse_date(value) is not None
+        except ValueError:
+            return False
+    return value.isascii() and value.isdigit() and int(value) <= MAX_ID
+
+
+def invalid_filters(filters):
+    """Сообщения о фильтрах с некорректными значениями"""
+    return {
+        name: f'Фильтр «{FILTER_LABELS[name]}»: некорректное значение «{filters[name]}»'
+        for name in FILTER_PARAMS
+        if filters.get(name) and not is_valid_filter(name, filters[name])
+    }
+
+
+def clean_record_filters(filters):
+    """
+    Фильтры страниц без некорректных значений.
+
+    Нечисловой id или недопустимая дата не передаются в запрос, а
+    отбрасываются; возвращаются фильтры и сообщения об отброшенных значениях.
+    """
+    errors = invalid_filters(filters)
+    return dict(filters, **dict.fromkeys(errors)), list(errors.values())
+
+
+def filter_records(records, filters):
+    """Применение фильтров главной страницы к queryset записей ДДС"""
+    if filters.get('date_from'):
+        records = records.filter(date__gte=filters['date_from'])
+    if filters.get('date_to'):
+        records = records.filter(date__lte=filters['date_to'])
+    if filters.get('status'):
+        records = records.filter(status_id=filters['status'])
+    if filters.get('type'):
+        records = records.filter(type_id=filters['type'])
+    if filters.get('category'):
+        records = records.filter(category_id=filters['category'])
+    if filters.get('subcategory'):
+        records = records.filter(subcategory_id=filters['subcategory'])
+    if filters.get(SEARCH_PARAM):
+        records = search_records(records, filters[SEARCH_PARAM])
+    return records
@@ -0,0 +1,342 @@
+"""
+Прогноз поступлений и списаний по категориям на ближайшие месяцы.
+
+История - месячные суммы дневных итогов (DailyRollup) в разрезе типа и
+категории. Модели (скользящее среднее, сезонная наивная, линейный тренд)
+считаются numpy сразу для всех категорий как для строк матрицы
+категория × месяц; в режиме auto каждая категория получает модель с
+наименьшей ошибкой на последних месяцах истории. Платежи регулярных
+операций (RecurringRecord) не прогнозируются, а берутся из их расписания.
+Результат кешируется до изменения дневных итогов, справочников или шаблонов.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .balances import add_month, month_start
+from .filters import filter_records
+from .models import DailyRollup, RecurringRecord
+from .recurring import get_occurrences
+from .reference_cache import get_reference_data
+from .reports import INCOME_TYPE_NAME, parse_date
+from .rollups import get_rollups_version
+
+try:
+    import numpy as np
+except ImportError:
+    # Необязательная зависимость: без numpy прогноз недоступен
+    np = None
+
+
+class ForecastUnavailable(Exception):
+    """Прогноз не может быть построен (не установлен пакет numpy)"""
+
+
+# Фильтры главной страницы, применяемые к истории (период задаёт окно истории)
+CLASSIFICATION_PARAMS = ('status', 'type', 'category', 'subcategory')
+
+METHOD_CHOICES = [
+    ('auto', 'Автовыбор по категории'),
+    ('moving_average', 'Скользящее среднее'),
+    ('seasonal_naive', 'Сезонная (как год назад)'),
+    ('linear_trend', 'Линейный тренд'),
+]
+
+MAX_MONTHS = 24
+MAX_HISTORY_MONTHS = 120
+
+# Окно скользящего среднего и длина сезона, месяцев
+MOVING_AVERAGE_MONTHS = 3
+SEASON_MONTHS = 12
+
+# Последние месяцы истории, по которым в режиме auto сравниваются модели
+BACKTEST_MONTHS = 3
+
+
+def moving_average(history, horizon):
+    """Среднее последних MOVING_AVERAGE_MONTHS месяцев"""
+    level = history[:, -MOVING_AVERAGE_MONTHS:].mean(axis=1, keepdims=True)
+    return np.repeat(level, horizon, axis=1)
+
+
+def seasonal_naive(history, horizon):
+    """Значение того же месяца годом раньше; при истории короче года - скользящее среднее"""
+    if history.shape[1] < SEASON_MONTHS:
+        return moving_average(history, horizon)
+    columns = history.shape[1] - SEASON_MONTHS + np.arange(horizon) % SEASON_MONTHS
+    return history[:, columns]
+
+
+def linear_trend(history, horizon):
+    """Линейная регрессия по номеру месяца (наименьшие квадраты для всех строк сразу)"""
+    months = history.shape[1]
+    if months < 2:
+        return moving_average(history, horizon)
+    steps = np.arange(months, dtype=float)
+    centered = steps - steps.mean()
+    mean = history.mean(axis=1)
+    slope = (history - mean[:, None]) @ centered / (centered @ centered)
+    future = np.arange(months, months + horizon) - steps.mean()
+    # Суммы по категории не бывают отрицательными
+    return np.clip(mean[:, None] + slope[:, None] * future, 0, None)
+
+
+MODELS = {
+    'moving_average': moving_average,
+    'seasonal_naive': seasonal_naive,
+    'linear_trend': linear_trend,
+}
+
+
+def select_models(history, horizon):
+    """
+    Прогноз каждой строки моделью с наименьшей средней ошибкой на последних месяцах.
+
+    Модели обучаются на истории без последних BACKTEST_MONTHS месяцев и
+    сравниваются с ними; возвращаются прогнозы по полной истории и номера
+    выбранных моделей в порядке MODELS.
+    """
+    names = list(MODELS)
+    holdout = min(BACKTEST_MONTHS, history.shape[1] - 1)
+    if holdout < 1:
+        return moving_average(history, horizon), np.zeros(len(history), dtype=int)
+    train, actual = history[:, :-holdout], history[:, -holdout:]
+    errors = np.stack([
+        np.abs(MODELS[name](train, holdout) - actual).mean(axis=1) for name in names
+    ])
+    # При равной ошибке выбирается более простая модель (первая в MODELS)
+    best = errors.argmin(axis=0)
+    forecasts = np.stack([MODELS[name](history, horizon) for name in names])
+    return forecasts[best, np.arange(len(history))], best
+
+
+def get_forecast_options(params):
+    """
+    Параметры прогноза из GET-параметров: горизонт, длина истории и модель.
+
+    Возвращает параметры (некорректные значения заменяются значениями по
+    умолчанию) и словарь ошибок по параметрам.
+    """
+    options = {
+        'months': getattr(settings, 'CASHFLOW_FORECAST_MONTHS', 6),
+        'history': getattr(settings, 'CASHFLOW_FORECAST_HISTORY_MONTHS', 24),
+        'method': 'auto',
+    }
+    errors = {}
+    for name, limit in (('months', MAX_MONTHS), ('history', MAX_HISTORY_MONTHS)):
+        value = params.get(name)
+        if not value:
+            continue
+        if not value.isdigit() or not 1 <= int(value) <= limit:
+            errors[name] = f'Expected a number of months from 1 to {limit}.'
+        else:
+            options[name] = int(value)
+    method = params.get('method')
+    if method:
+        if method in dict(METHOD_CHOICES):
+            options['method'] = method
+        else:
+            errors['method'] = f'Expected one of: {", ".join(dict(METHOD_CHOICES))}.'
+    return options, errors
+
+
+def get_history_window(filters, history_months):
+    """
+    Месяцы истории [первый, месяц прогноза) для периода фильтров.
+
+    Прогноз начинается с текущего месяца (он ещё не закончился и в историю
+    не входит) или с месяца после date_to, если период закончился раньше.
+    """
+    anchor = month_start(timezone.localdate())
+    date_to = parse_date(filters.get('date_to'))
+    if date_to:
+        anchor = min(anchor, add_month(month_start(date_to)))
+    date_from = parse_date(filters.get('date_from'))
+    if date_from and month_start(date_from) < anchor:
+        start = month_start(date_from)
+        if month_index(anchor) - month_index(start) > MAX_HISTORY_MONTHS:
+            start = shift_month(anchor, -MAX_HISTORY_MONTHS)
+    else:
+        start = shift_month(anchor, -history_months)
+    return start, anchor
+
+
+def month_index(month):
+    return month.year * 12 + month.month - 1
+
+
+def shift_month(month, months):
+    index = month_index(month) + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def forecast_cache_key(filters, options, start, anchor):
+    """Ключ кеша прогноза: параметры и версии данных, от которых он зависит"""
+    templates = RecurringRecord.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    digest = hashlib.md5(json.dumps({
+        'filters': {name: filters.get(name) for name in CLASSIFICATION_PARAMS},
+        'options': options,
+        'window': [start, anchor],
+        'rollups': get_rollups_version(),
+        'reference': get_reference_data().version,
+        'templates': templates,
+    }, sort_keys=True, default=str).encode()).hexdigest()
+    return f'cashflow:forecast:{digest}'
+
+
+def build_forecast(filters, options):
+    """
+    Прогноз по категориям для фильтров главной страницы (с кешированием).
+
+    Результат пересчитывается, когда меняются дневные итоги (новые,
+    изменённые или удалённые записи), справочники или шаблоны регулярных
+    операций, а также с началом нового месяца.
+    """
+    if np is None:
+        raise ForecastUnavailable('Forecasting requires the numpy package')
+    start, anchor = get_history_window(filters, options['history'])
+    key = forecast_cache_key(filters, options, start, anchor)
+    forecast = cache.get(key)
+    if forecast is None:
+        forecast = compute_forecast(filters, options, start, anchor)
+        cache.set(key, forecast, getattr(settings, 'CASHFLOW_FORECAST_CACHE_TIMEOUT', 86400))
+    return forecast
+
+
+def load_history(filters, start, anchor, rows):
+    """Месячные суммы по (тип, категория) одним группирующим запросом к дневным итогам"""
+    rollups = filter_records(
+        DailyRollup.objects.order_by(), {name: filters.get(name) for name in CLASSIFICATION_PARAMS}
+    ).filter(date__gte=start, date__lt=anchor)
+    values = []
+    for row in rollups.annotate(month=TruncMonth('date')).values(
+        'type_id', 'category_id', 'month'
+    ).annotate(total=Sum('total_amount')):
+        key = (row['type_id'], row['category_id'])
+        values.append((rows.setdefault(key, len(rows)), month_index(row['month']), row['total']))
+    return values
+
+
+def load_schedules(filters, start, anchor, horizon_end, rows):
+    """
+    Суммы регулярных операций по (тип, категория) и месяцам.
+
+    Возвращает записи, уже созданные по шаблонам в окне истории (по
+    materialized_until), и платежи по расписанию в месяцах прогноза.
+    """
+    templates = RecurringRecord.objects.filter(is_active=True, start_date__lt=horizon_end)
+    for name in CLASSIFICATION_PARAMS:
+        if filters.get(name):
+            templates = templates.filter(**{f'{name}_id': filters[name]})
+
+    past, scheduled = [], []
+    last_history_day = anchor - timedelta(days=1)
+    for template in templates:
+        try:
+            history_days = []
+            if template.materialized_until:
+                history_days = get_occurrences(
+                    template, start, min(last_history_day, template.materialized_until)
+                )
+            future_days = get_occurrences(template, anchor, horizon_end - timedelta(days=1))
+        except ValueError:
+            # Шаблон с некорректным правилом пропускает и materialize_recurring
+            continue
+        if not history_days and not future_days:
+            continue
+        row = rows.setdefault((template.type_id, template.category_id), len(rows))
+        past += [(row, month_index(day), template.amount) for day in history_days]
+        scheduled += [(row, month_index(day), template.amount) for day in future_days]
+    return past, scheduled
+
+
+def to_matrix(values, shape, first_month):
+    matrix = np.zeros(shape)
+    for row, month, amount in values:
+        column = month - first_month
+        if 0 <= column < shape[1]:
+            matrix[row, column] += float(amount)
+    return matrix
+
+
+def to_decimal(value):
+    """Сумма с точностью до копеек (без «-0.00»)"""
+    return Decimal(f'{float(value):.2f}') + 0
+
+
+def compute_forecast(filters, options, start, anchor):
+    horizon = options['months']
+    horizon_end = shift_month(anchor, horizon)
+    history_months = month_index(anchor) - month_index(start)
+
+    rows = {}
+    history_values = load_history(filters, start, anchor, rows)
+    past_values, scheduled_values = load_schedules(filters, start, anchor, horizon_end, rows)
+
+    shape = (len(rows), history_months)
+    history = to_matrix(history_values, shape, month_index(start))
+    # Платежи по расписанию известны заранее и прогнозируются только остальные суммы
+    baseline = np.clip(history - to_matrix(past_values, shape, month_index(start)), 0, None)
+    scheduled = to_matrix(scheduled_values, (len(rows), horizon), month_index(anchor))
+
+    names = list(MODELS)
+    if options['method'] == 'auto':
+        predicted, chosen = select_models(baseline, horizon)
+    else:
+        predicted = MODELS[options['method']](baseline, horizon)
+        chosen = np.full(len(rows), names.index(options['method']))
+    forecast = predicted + scheduled
+
+    reference = get_reference_data()
+    labels = dict(METHOD_CHOICES)
+    result_rows = []
+    for (type_id, category_id), index in rows.items():
+        type_obj = reference.types_by_id.get(type_id)
+        category = reference.categories_by_id.get(category_id)
+        result_rows.append({
+            'type_id': type_id,
+            'type_name': type_obj.name if type_obj else '',
+            'category_id': category_id,
+            'category_name': category.name if category else '',
+            'is_income': type_obj is not None and type_obj.name == INCOME_TYPE_NAME,
+            'method': names[chosen[index]],
+            'method_display': labels[names[chosen[index]]],
+            'history_total': to_decimal(history[index].sum()),
+            'forecast': [to_decimal(value) for value in forecast[index]],
+            'scheduled': [to_decimal(value) for value in scheduled[index]],
+            'total': to_decimal(forecast[index].sum()),
+        })
+    result_rows.sort(key=lambda row: (not row['is_income'], row['type_name'], -row['total']))
+
+    months = [shift_month(anchor, offset) for offset in range(horizon)]
+    income = np.zeros(horizon)
+    expense = np.zeros(horizon)
+    for row in result_rows:
+        values = forecast[rows[(row['type_id'], row['category_id'])]]
+        if row['is_income']:
+            income += values
+        else:
+            expense += values
+    totals = [
+        {
+            'month': month,
+            'income': to_decimal(income[offset]),
+            'expense': to_decimal(expense[offset]),
+            'net': to_decimal(income[offset] - expense[offset]),
+        }
+        for offset, month in enumerate(months)
+    ]
+    return {
+        'history_from': start,
+        'history_to': anchor - timedelta(days=1),
+        'months': months,
+        'method': options['method'],
+        'rows': result_rows,
+        'totals': totals,
+    }
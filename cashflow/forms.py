@@ -1,6 +1,68 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
 from .models import CashFlowRecord, Category, Subcategory, Status, Type
+from .reference_cache import get_reference_data
+
+
+class CachedModelChoiceIterator(ModelChoiceIterator):
+    """Варианты выбора из закешированного списка объектов вместо queryset"""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.objects:
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.objects) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.objects)
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    Выбор объекта справочника из кеша справочников.
+
+    Пока списку objects не присвоено значение, поле работает как обычный
+    ModelChoiceField и обращается к queryset.
+    """
+
+    _objects = None
+
+    @property
+    def objects(self):
+        return self._objects
+
+    @objects.setter
+    def objects(self, value):
+        self._objects = list(value)
+        self._objects_by_pk = {obj.pk: obj for obj in self._objects}
+        self.widget.choices = self.choices
+
+    def _get_choices(self):
+        if self._objects is None:
+            return super()._get_choices()
+        return CachedModelChoiceIterator(self)
+
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+
+    def to_python(self, value):
+        if self._objects is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            value = value.pk
+        try:
+            return self._objects_by_pk[int(value)]
+        except (KeyError, ValueError, TypeError):
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
 
 
 class CashFlowRecordForm(forms.ModelForm):
@@ -9,6 +71,12 @@ class CashFlowRecordForm(forms.ModelForm):
     class Meta:
         model = CashFlowRecord
         fields = ['date', 'status', 'type', 'category', 'subcategory', 'amount', 'comment']
+        field_classes = {
+            'status': CachedModelChoiceField,
+            'type': CachedModelChoiceField,
+            'category': CachedModelChoiceField,
+            'subcategory': CachedModelChoiceField,
+        }
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'status': forms.Select(attrs={'class': 'form-control'}),
@@ -31,29 +99,41 @@ class CashFlowRecordForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+        # Варианты выбора берутся из кеша справочников, а не из базы
+        reference = get_reference_data()
+        self.fields['status'].objects = reference.statuses
+        self.fields['type'].objects = reference.types
+
         # Фильтрация категорий по типу (если тип выбран)
         if 'type' in self.data:
             try:
                 type_id = int(self.data.get('type'))
-                self.fields['category'].queryset = Category.objects.filter(type_id=type_id)
+                self.fields['category'].objects = reference.categories_for_type(type_id)
             except (ValueError, TypeError):
-                self.fields['category'].queryset = Category.objects.none()
-        elif self.instance.pk and self.instance.type:
-            self.fields['category'].queryset = Category.objects.filter(type=self.instance.type)
+                self.fields['category'].objects = []
+        elif self.instance.pk and self.instance.type_id:
+            self.fields['category'].objects = reference.categories_for_type(self.instance.type_id)
         else:
-            self.fields['category'].queryset = Category.objects.none()
+            self.fields['category'].objects = []
 
         # Фильтрация подкатегорий по категории (если категория выбрана)
         if 'category' in self.data:
             try:
                 category_id = int(self.data.get('category'))
-                self.fields['subcategory'].queryset = Subcategory.objects.filter(category_id=category_id)
+                self.fields['subcategory'].objects = reference.subcategories_for_category(category_id)
             except (ValueError, TypeError):
-                self.fields['subcategory'].queryset = Subcategory.objects.none()
-        elif self.instance.pk and self.instance.category:
-            self.fields['subcategory'].queryset = Subcategory.objects.filter(category=self.instance.category)
+                self.fields['subcategory'].objects = []
+        elif self.instance.pk and self.instance.category_id:
+            self.fields['subcategory'].objects = reference.subcategories_for_category(self.instance.category_id)
         else:
-            self.fields['subcategory'].queryset = Subcategory.objects.none()
+            self.fields['subcategory'].objects = []
+
+    def _get_validation_exclusions(self):
+        # Существование объектов справочников уже проверено по кешу,
+        # повторная проверка ForeignKey в модели выполняла бы запросы к базе
+        exclude = super()._get_validation_exclusions()
+        exclude.update(['status', 'type', 'category', 'subcategory'])
+        return exclude
 
     def clean(self):
         """Валидация всей формы"""
@@ -63,14 +143,14 @@ class CashFlowRecordForm(forms.ModelForm):
         subcategory_obj = cleaned_data.get('subcategory')
 
         # Проверка соответствия категории типу
-        if type_obj and category_obj and category_obj.type != type_obj:
+        if type_obj and category_obj and category_obj.type_id != type_obj.pk:
             raise ValidationError(
                 "Выбранная категория не соответствует типу операции. "
                 "Пожалуйста, выберите категорию, соответствующую типу."
             )
 
         # Проверка соответствия подкатегории категории
-        if category_obj and subcategory_obj and subcategory_obj.category != category_obj:
+        if category_obj and subcategory_obj and subcategory_obj.category_id != category_obj.pk:
             raise ValidationError(
                 "Выбранная подкатегория не соответствует категории. "
                 "Пожалуйста, выберите подкатегорию, соответствующую категории."
@@ -127,3 +207,87 @@ class SubcategoryForm(forms.ModelForm):
             'category': forms.Select(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
         }
+
+
+class RecordImportForm(forms.Form):
+    """Форма загрузки файла для импорта записей ДДС"""
+    file = forms.FileField(
+        label='Файл (CSV или XLSX)',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if not file.name.lower().endswith(('.csv', '.xlsx')):
+            raise ValidationError("Поддерживаются только файлы CSV и XLSX.")
+        return file
+
+
+class RecordBulkForm(forms.Form):
+    """
+    Форма массового изменения записей ДДС.
+
+    Пустое поле означает «не менять». Подкатегория однозначно определяет
+    категорию и тип, поэтому согласованность проверяется один раз для
+    новых значений, а не для каждой изменяемой записи.
+    """
+    status = CachedModelChoiceField(
+        queryset=Status.objects.all(), required=False, empty_label='не менять', label='Статус',
+        widget=forms.Select(attrs={'class': 'form-control form-control-sm'}),
+    )
+    type = CachedModelChoiceField(
+        queryset=Type.objects.all(), required=False, empty_label='не менять', label='Тип',
+        widget=forms.Select(attrs={'class': 'form-control form-control-sm'}),
+    )
+    category = CachedModelChoiceField(
+        queryset=Category.objects.all(), required=False, empty_label='не менять', label='Категория',
+        widget=forms.Select(attrs={'class': 'form-control form-control-sm'}),
+    )
+    subcategory = CachedModelChoiceField(
+        queryset=Subcategory.objects.all(), required=False, empty_label='не менять', label='Подкатегория',
+        widget=forms.Select(attrs={'class': 'form-control form-control-sm'}),
+    )
+
+    def __init__(self, *args, reference=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Асинхронное представление передаёт уже загруженные справочники
+        reference = reference or get_reference_data()
+        self.fields['status'].objects = reference.statuses
+        self.fields['type'].objects = reference.types
+        self.fields['category'].objects = reference.categories
+        self.fields['subcategory'].objects = reference.subcategories
+
+    def clean(self):
+        """Проверка согласованности новых значений тип → категория → подкатегория"""
+        cleaned_data = super().clean()
+        type_obj = cleaned_data.get('type')
+        category_obj = cleaned_data.get('category')
+        subcategory_obj = cleaned_data.get('subcategory')
+
+        if (type_obj or category_obj) and not subcategory_obj:
+            raise ValidationError(
+                "При изменении типа или категории необходимо выбрать подкатегорию."
+            )
+        if subcategory_obj:
+            if category_obj and subcategory_obj.category_id != category_obj.pk:
+                raise ValidationError(
+                    "Выбранная подкатегория не соответствует категории."
+                )
+            if type_obj and subcategory_obj.category.type_id != type_obj.pk:
+                raise ValidationError(
+                    "Выбранная категория не соответствует типу операции."
+                )
+        return cleaned_data
+
+    def get_changes(self):
+        """Новые значения полей записей для массового изменения"""
+        changes = {}
+        status = self.cleaned_data.get('status')
+        subcategory = self.cleaned_data.get('subcategory')
+        if status:
+            changes['status_id'] = status.pk
+        if subcategory:
+            changes['subcategory_id'] = subcategory.pk
+            changes['category_id'] = subcategory.category_id
+            changes['type_id'] = subcategory.category.type_id
+        return changes
@@ -0,0 +1,232 @@
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from .bulk import insert_records
+from .reference_cache import get_reference_data
+
+
+# Колонки файла импорта и допустимые варианты заголовков
+COLUMNS = {
+    'date': ('date', 'дата', 'дата операции'),
+    'status': ('status', 'статус'),
+    'type': ('type', 'тип'),
+    'category': ('category', 'категория'),
+    'subcategory': ('subcategory', 'подкатегория'),
+    'amount': ('amount', 'сумма'),
+    'comment': ('comment', 'комментарий'),
+}
+REQUIRED_COLUMNS = ('date', 'status', 'type', 'category', 'subcategory', 'amount')
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y')
+MIN_AMOUNT = Decimal('0.01')
+MAX_AMOUNT = Decimal('9999999999.99')
+
+
+class ImportFormatError(Exception):
+    """Файл импорта не может быть прочитан (неизвестный формат, нет колонок)"""
+
+
+class ImportResult:
+    """Итог импорта: количество созданных записей и ошибки по строкам"""
+
+    def __init__(self):
+        self.created = 0
+        self.processed = 0
+        self.errors = []
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+
+def column_title(column):
+    """Название колонки для сообщений об ошибках"""
+    return COLUMNS[column][1]
+
+
+def map_header(header):
+    """Сопоставление заголовков файла с колонками импорта"""
+    aliases = {
+        alias: column for column, names in COLUMNS.items() for alias in names
+    }
+    mapping = {}
+    for index, title in enumerate(header):
+        column = aliases.get(str(title or '').strip().lower())
+        if column and column not in mapping:
+            mapping[column] = index
+    missing = [column for column in REQUIRED_COLUMNS if column not in mapping]
+    if missing:
+        titles = ', '.join(f'{column_title(column)} ({column})' for column in missing)
+        raise ImportFormatError(f'Нет обязательных колонок: {titles}')
+    return mapping
+
+
+def iter_rows(rows):
+    """Преобразование строк таблицы в пары (номер строки, словарь значений)"""
+    rows = iter(rows)
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise ImportFormatError('Файл пуст')
+    mapping = map_header(header)
+    for line_number, row in enumerate(rows, start=2):
+        if not any(value not in (None, '') for value in row):
+            continue
+        yield line_number, {
+            column: row[index] if index < len(row) else None
+            for column, index in mapping.items()
+        }
+
+
+def read_csv(file, encoding='utf-8-sig', delimiter=None):
+    """Потоковое чтение CSV из бинарного или текстового файла"""
+    if not isinstance(file, io.TextIOBase):
+        file = io.TextIOWrapper(file, encoding=encoding, newline='')
+    try:
+        if delimiter is None:
+            sample = file.read(4096)
+            file.seek(0)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+            except csv.Error:
+                delimiter = ','
+        yield from iter_rows(csv.reader(file, delimiter=delimiter))
+    except UnicodeDecodeError:
+        raise ImportFormatError(f'Файл не является текстом в кодировке {encoding}')
+
+
+def read_xlsx(file):
+    """Потоковое чтение первого листа XLSX (требуется пакет openpyxl)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError('Для импорта XLSX нужен пакет openpyxl')
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    return iter_rows(workbook.worksheets[0].iter_rows(values_only=True))
+
+
+def read_file(file, name, **options):
+    """Выбор способа чтения по расширению файла"""
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    if extension == 'xlsx':
+        return read_xlsx(file)
+    if extension in ('csv', 'txt', ''):
+        return read_csv(file, **options)
+    raise ImportFormatError(f'Неподдерживаемый формат файла: .{extension}')
+
+
+class RecordImporter:
+    """
+    Пакетный импорт записей ДДС.
+
+    Названия (или id) справочников разрешаются через кеш справочников,
+    правила CashFlowRecord.clean() проверяются по словарям в памяти,
+    корректные строки сохраняются массовой вставкой пакетами по batch_size
+    в отдельных транзакциях вместе с обновлением дневных итогов.
+    Ошибочные строки пропускаются и попадают в отчёт.
+    """
+
+    def __init__(self, batch_size=5000, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        reference = get_reference_data()
+        self.statuses = self.build_lookup(reference.statuses, lambda obj: ())
+        self.types = self.build_lookup(reference.types, lambda obj: ())
+        self.categories = self.build_lookup(reference.categories, lambda obj: (obj.type_id,))
+        self.subcategories = self.build_lookup(reference.subcategories, lambda obj: (obj.category_id,))
+
+    @staticmethod
+    def build_lookup(objects, parent):
+        """Словарь (родитель..., название или id) → объект справочника"""
+        lookup = {parent(obj) + (str(obj.pk),): obj for obj in objects}
+        # Совпадение по названию приоритетнее совпадения по id
+        lookup.update({parent(obj) + (obj.name.strip().lower(),): obj for obj in objects})
+        return lookup
+
+    @staticmethod
+    def resolve(lookup, parent, value, column):
+        key = str(value if value is not None else '').strip().lower()
+        if not key:
+            raise ValueError(f'{column_title(column)}: значение не указано')
+        obj = lookup.get(parent + (key,))
+        if obj is None:
+            raise ValueError(f'{column_title(column)}: значение «{value}» не найдено')
+        return obj
+
+    @staticmethod
+    def parse_date(value):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        text = str(value or '').strip()
+        try:
+            return date.fromisoformat(text)
+        except ValueError:
+            pass
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).date()
+            except ValueError:
+                continue
+        raise ValueError(f'дата: «{value}» не является датой')
+
+    @staticmethod
+    def parse_amount(value):
+        text = str(value if value is not None else '').strip().replace(' ', '').replace(',', '.')
+        try:
+            amount = Decimal(text)
+        except InvalidOperation:
+            raise ValueError(f'сумма: «{value}» не является числом')
+        if not amount.is_finite():
+            raise ValueError(f'сумма: «{value}» не является числом')
+        amount = amount.quantize(Decimal('0.01'))
+        if amount < MIN_AMOUNT or amount > MAX_AMOUNT:
+            raise ValueError(
+                f'сумма: {amount} вне допустимого диапазона ({MIN_AMOUNT} - {MAX_AMOUNT})'
+            )
+        return amount
+
+    def build_record(self, values):
+        """Проверка строки и подготовка значений записи ДДС (в порядке RECORD_COLUMNS)"""
+        status = self.resolve(self.statuses, (), values.get('status'), 'status')
+        type_obj = self.resolve(self.types, (), values.get('type'), 'type')
+        # Категория ищется только среди категорий типа: проверка категория ↔ тип
+        category = self.resolve(self.categories, (type_obj.pk,), values.get('category'), 'category')
+        # Подкатегория ищется только среди подкатегорий категории: проверка подкатегория ↔ категория
+        subcategory = self.resolve(
+            self.subcategories, (category.pk,), values.get('subcategory'), 'subcategory'
+        )
+        return (
+            self.parse_date(values.get('date')),
+            status.pk,
+            type_obj.pk,
+            category.pk,
+            subcategory.pk,
+            self.parse_amount(values.get('amount')),
+            str(values.get('comment') or '').strip(),
+        )
+
+    def run(self, rows):
+        result = ImportResult()
+        batch = []
+        for line_number, values in rows:
+            result.processed += 1
+            try:
+                batch.append(self.build_record(values))
+            except ValueError as error:
+                result.errors.append((line_number, str(error)))
+            if len(batch) >= self.batch_size:
+                self.save_batch(batch, result)
+                batch = []
+        if batch:
+            self.save_batch(batch, result)
+        return result
+
+    def save_batch(self, batch, result):
+        """Сохранение пакета записей и обновление дневных итогов одной транзакцией"""
+        result.created += insert_records(batch)
+        if self.progress:
+            self.progress(result)
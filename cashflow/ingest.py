@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .bulk import RECORD_COLUMNS
+from .importers import RecordImporter
+from .models import ArchivedCashFlowRecord, CashFlowRecord
+from .rollups import apply_records
+
+
+IDEMPOTENCY_KEY_MAX_LENGTH = CashFlowRecord._meta.get_field('idempotency_key').max_length
+
+
+def get_max_batch_size():
+    """Максимальное количество записей в одном запросе пакетной загрузки"""
+    return getattr(settings, 'CASHFLOW_INGEST_MAX_BATCH', 1000)
+
+
+def ingest_records(items):
+    """
+    Пакетная загрузка записей ДДС из внешних систем.
+
+    Каждая запись проверяется правилами импорта (справочники по названию
+    или id из кеша справочников), корректные записи сохраняются bulk_create
+    в одной транзакции вместе с обновлением дневных итогов. Запись с уже
+    известным idempotency_key не создаётся повторно, а возвращается как
+    дубликат с id существующей записи.
+
+    Возвращает список результатов в порядке входных записей.
+    """
+    importer = RecordImporter()
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'index': index, 'status': 'error', 'errors': ['record must be an object']}
+            continue
+        key = str(item.get('idempotency_key') or '').strip() or None
+        try:
+            if key and len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                raise ValueError(
+                    f'idempotency_key: must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters'
+                )
+            row = importer.build_record(item)
+        except ValueError as error:
+            results[index] = {'index': index, 'status': 'error', 'errors': [str(error)]}
+            continue
+        valid.append((index, key, row))
+
+    # Параллельный запрос с теми же ключами может успеть раньше:
+    # при нарушении уникальности пакет повторяется с учётом его записей
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                results_by_index = save_records(valid)
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+    for index, result in results_by_index.items():
+        results[index] = result
+    return results
+
+
+def save_records(valid):
+    """Сохранение проверенных записей, пропуская уже загруженные ключи"""
+    keys = {key for _, key, _ in valid if key}
+    existing = {}
+    if keys:
+        # Ключи записей, уже перенесённых в архив, тоже считаются загруженными
+        for model in (CashFlowRecord, ArchivedCashFlowRecord):
+            existing.update(
+                model.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', 'pk')
+            )
+
+    records = []
+    created_keys = {}
+    results = {}
+    for index, key, row in valid:
+        if key in existing:
+            results[index] = {'index': index, 'status': 'duplicate', 'id': existing[key]}
+            continue
+        if key in created_keys:
+            # Повтор ключа внутри одного запроса
+            created_keys[key].append(index)
+            continue
+        if key:
+            created_keys[key] = []
+        record = CashFlowRecord(**dict(zip(RECORD_COLUMNS, row)), idempotency_key=key)
+        records.append((index, record))
+
+    CashFlowRecord.objects.bulk_create([record for _, record in records])
+    apply_records([
+        {name: getattr(record, name) for name in RECORD_COLUMNS} for _, record in records
+    ])
+
+    for index, record in records:
+        results[index] = {'index': index, 'status': 'created', 'id': record.pk}
+        for duplicate_index in created_keys.get(record.idempotency_key, ()):
+            results[duplicate_index] = {'index': duplicate_index, 'status': 'duplicate', 'id': record.pk}
+    return results
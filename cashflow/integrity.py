@@ -0,0 +1,152 @@
+"""
+Согласованность классификации записей ДДС на уровне базы данных.
+
+Подкатегория определяет категорию, категория - тип операции. Триггеры
+отклоняют запись, у которой тип, категория и подкатегория не согласованы,
+и перенос используемой категории (подкатегории) в другой тип (категорию).
+Проверка выполняется в базе одним поиском по первичному ключу, поэтому
+сохранение записи не требует обращений к справочникам из Python.
+"""
+
+TAXONOMY_ERROR = 'cashflow: record type, category and subcategory do not match'
+TAXONOMY_MOVE_ERROR = 'cashflow: cannot move a category or subcategory that is used by records'
+
+RECORD_MODELS = ('cashflowrecord', 'archivedcashflowrecord')
+
+# Миграция, создающая триггеры; после неё migrate восстанавливает удалённые триггеры
+TAXONOMY_MIGRATION = ('cashflow', '0008_record_taxonomy_triggers')
+
+
+def get_tables(apps):
+    """Таблицы записей и справочников (apps - реестр моделей или его состояние в миграции)"""
+    return {
+        'records': [apps.get_model('cashflow', name)._meta.db_table for name in RECORD_MODELS],
+        'category': apps.get_model('cashflow', 'Category')._meta.db_table,
+        'subcategory': apps.get_model('cashflow', 'Subcategory')._meta.db_table,
+    }
+
+
+def trigger_names(tables):
+    names = []
+    for table in tables['records']:
+        names += [f'{table}_taxonomy_insert', f'{table}_taxonomy_update']
+    return names + [f'{tables["category"]}_taxonomy_move', f'{tables["subcategory"]}_taxonomy_move']
+
+
+def taxonomy_match(tables):
+    """Условие SQL: тип и категория новой записи соответствуют её подкатегории"""
+    return (
+        f'EXISTS (SELECT 1 FROM {tables["subcategory"]} s '
+        f'JOIN {tables["category"]} c ON c.id = s.category_id '
+        f'WHERE s.id = NEW.subcategory_id AND c.id = NEW.category_id AND c.type_id = NEW.type_id)'
+    )
+
+
+def used_by_records(tables, column):
+    return ' OR '.join(
+        f'EXISTS (SELECT 1 FROM {table} WHERE {column} = OLD.id)' for table in tables['records']
+    )
+
+
+def sqlite_statements(tables):
+    match = taxonomy_match(tables)
+    statements = []
+    for table in tables['records']:
+        statements.append(
+            f'CREATE TRIGGER IF NOT EXISTS {table}_taxonomy_insert BEFORE INSERT ON {table} '
+            f"WHEN NOT {match} BEGIN SELECT RAISE(ABORT, '{TAXONOMY_ERROR}'); END"
+        )
+        statements.append(
+            f'CREATE TRIGGER IF NOT EXISTS {table}_taxonomy_update '
+            f'BEFORE UPDATE OF type_id, category_id, subcategory_id ON {table} '
+            f"WHEN NOT {match} BEGIN SELECT RAISE(ABORT, '{TAXONOMY_ERROR}'); END"
+        )
+    for parent, column, child_column in (
+        ('category', 'type_id', 'category_id'),
+        ('subcategory', 'category_id', 'subcategory_id'),
+    ):
+        table = tables[parent]
+        statements.append(
+            f'CREATE TRIGGER IF NOT EXISTS {table}_taxonomy_move BEFORE UPDATE OF {column} ON {table} '
+            f'WHEN NEW.{column} <> OLD.{column} AND ({used_by_records(tables, child_column)}) '
+            f"BEGIN SELECT RAISE(ABORT, '{TAXONOMY_MOVE_ERROR}'); END"
+        )
+    return statements
+
+
+def postgresql_statements(tables):
+    statements = [
+        'CREATE OR REPLACE FUNCTION cashflow_check_record_taxonomy() RETURNS trigger AS $$ '
+        f'BEGIN IF NOT {taxonomy_match(tables)} THEN '
+        f"RAISE EXCEPTION '{TAXONOMY_ERROR}' USING ERRCODE = 'check_violation'; "
+        'END IF; RETURN NEW; END $$ LANGUAGE plpgsql',
+    ]
+    for table in tables['records']:
+        statements += [
+            f'DROP TRIGGER IF EXISTS {table}_taxonomy_insert ON {table}',
+            f'CREATE TRIGGER {table}_taxonomy_insert BEFORE INSERT ON {table} '
+            'FOR EACH ROW EXECUTE FUNCTION cashflow_check_record_taxonomy()',
+            f'DROP TRIGGER IF EXISTS {table}_taxonomy_update ON {table}',
+            f'CREATE TRIGGER {table}_taxonomy_update '
+            f'BEFORE UPDATE OF type_id, category_id, subcategory_id ON {table} '
+            'FOR EACH ROW EXECUTE FUNCTION cashflow_check_record_taxonomy()',
+        ]
+    for parent, column, child_column in (
+        ('category', 'type_id', 'category_id'),
+        ('subcategory', 'category_id', 'subcategory_id'),
+    ):
+        table = tables[parent]
+        statements += [
+            f'CREATE OR REPLACE FUNCTION cashflow_check_{parent}_move() RETURNS trigger AS $$ '
+            f'BEGIN IF NEW.{column} <> OLD.{column} AND ({used_by_records(tables, child_column)}) THEN '
+            f"RAISE EXCEPTION '{TAXONOMY_MOVE_ERROR}' USING ERRCODE = 'check_violation'; "
+            'END IF; RETURN NEW; END $$ LANGUAGE plpgsql',
+            f'DROP TRIGGER IF EXISTS {table}_taxonomy_move ON {table}',
+            f'CREATE TRIGGER {table}_taxonomy_move BEFORE UPDATE OF {column} ON {table} '
+            f'FOR EACH ROW EXECUTE FUNCTION cashflow_check_{parent}_move()',
+        ]
+    return statements
+
+
+def install_taxonomy_triggers(connection, apps):
+    """Создание триггеров согласованности (повторный вызов безопасен)"""
+    tables = get_tables(apps)
+    if connection.vendor == 'sqlite':
+        statements = sqlite_statements(tables)
+    elif connection.vendor == 'postgresql':
+        statements = postgresql_statements(tables)
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_taxonomy_triggers(connection, apps):
+    tables = get_tables(apps)
+    with connection.cursor() as cursor:
+        for table in tables['records']:
+            for name in (f'{table}_taxonomy_insert', f'{table}_taxonomy_update'):
+                if connection.vendor == 'postgresql':
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {name} ON {table}')
+                elif connection.vendor == 'sqlite':
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        for parent in ('category', 'subcategory'):
+            table = tables[parent]
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'DROP TRIGGER IF EXISTS {table}_taxonomy_move ON {table}')
+                cursor.execute(f'DROP FUNCTION IF EXISTS cashflow_check_{parent}_move()')
+            elif connection.vendor == 'sqlite':
+                cursor.execute(f'DROP TRIGGER IF EXISTS {table}_taxonomy_move')
+        if connection.vendor == 'postgresql':
+            cursor.execute('DROP FUNCTION IF EXISTS cashflow_check_record_taxonomy()')
+
+
+def missing_taxonomy_triggers(connection, apps):
+    """Есть ли таблицы без триггеров (SQLite удаляет их при пересоздании таблицы)"""
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+    return any(name not in existing for name in trigger_names(get_tables(apps)))
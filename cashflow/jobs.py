@@ -0,0 +1,242 @@
+"""
+Очередь фоновых заданий в базе данных.
+
+Задание - вызов команды управления из Job.COMMAND_CHOICES с сохранёнными
+аргументами. Воркеры команды run_workers забирают задания по одному,
+выполняют команду через call_command и сохраняют её вывод и прогресс,
+поэтому одна и та же команда запускается из консоли и из интерфейса.
+"""
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command, get_commands, load_command_class
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.utils import timezone
+from .models import Job
+
+
+# Сохраняемый хвост вывода команды
+OUTPUT_LIMIT = 64 * 1024
+
+# Интервал записи вывода и прогресса в базу, секунды
+FLUSH_INTERVAL = 1.0
+
+# Кеши, содержимое которых видно только одному процессу
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def has_shared_cache():
+    """
+    Общий ли кеш Django для всех процессов.
+
+    Задания меняют версии справочников и дневных итогов и границу архива
+    в кеше; с кешем одного процесса веб-процессы этих изменений не увидят.
+    """
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def get_job_dir():
+    """Каталог входных файлов и результатов заданий"""
+    return Path(getattr(settings, 'CASHFLOW_JOB_DIR', settings.BASE_DIR / 'job_files'))
+
+
+def job_path(name):
+    """Абсолютный путь файла задания по имени относительно CASHFLOW_JOB_DIR"""
+    return get_job_dir() / name
+
+
+def save_upload(upload, folder='imports'):
+    """Сохранение загруженного файла для задания; возвращает имя относительно CASHFLOW_JOB_DIR"""
+    extension = Path(upload.name).suffix.lower()
+    name = f'{folder}/{uuid.uuid4().hex}{extension}'
+    path = job_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as file:
+        for chunk in upload.chunks():
+            file.write(chunk)
+    return name
+
+
+def enqueue(command, *arguments, input_file='', result_file='', **options):
+    """Постановка команды управления в очередь"""
+    if command not in dict(Job.COMMAND_CHOICES):
+        raise ValueError(f'Command "{command}" cannot be queued')
+    return Job.objects.create(
+        command=command,
+        arguments=[str(argument) for argument in arguments],
+        options=options,
+        input_file=input_file,
+        result_file=result_file,
+    )
+
+
+def claim_job(worker):
+    """
+    Захват следующего задания очереди.
+
+    Задание переводится в состояние «выполняется» условным UPDATE: из
+    нескольких воркеров, выбравших одно задание, его получает только один.
+    """
+    candidates = Job.objects.filter(status=Job.PENDING).order_by('pk').values_list('pk', flat=True)
+    for pk in candidates[:10]:
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=pk, status=Job.PENDING).update(
+            status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def fail_stale_jobs(timeout):
+    """Отметка заданий, воркер которых перестал подавать сигналы дольше timeout секунд"""
+    threshold = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=threshold).update(
+        status=Job.FAILED,
+        message='Воркер остановился до завершения задания',
+        finished_at=timezone.now(),
+    )
+
+
+class JobOutput:
+    """
+    Поток вывода команды задания (stdout/stderr для call_command).
+
+    Вывод и прогресс сохраняются в задание не чаще FLUSH_INTERVAL, последняя
+    непустая строка становится сообщением о ходе выполнения.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.chunks = []
+        self.flushed_at = 0.0
+
+    def write(self, text):
+        self.chunks.append(text)
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        if lines:
+            self.job.message = lines[-1][:255]
+        self.maybe_flush()
+
+    def progress(self, done, total=None):
+        """Прогресс для команд, принимающих скрытый параметр progress"""
+        self.job.progress = done
+        if total is not None:
+            self.job.total = total
+        self.maybe_flush()
+
+    def isatty(self):
+        return False
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed_at >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self.chunks:
+            self.job.output = (self.job.output + ''.join(self.chunks))[-OUTPUT_LIMIT:]
+            self.chunks = []
+        Job.objects.filter(pk=self.job.pk).update(
+            output=self.job.output,
+            message=self.job.message,
+            progress=self.job.progress,
+            total=self.job.total,
+            heartbeat_at=timezone.now(),
+        )
+        self.flushed_at = time.monotonic()
+
+
+class Heartbeat(threading.Thread):
+    """Периодический сигнал воркера, пока команда работает без вывода (длинный SQL-запрос)"""
+
+    def __init__(self, job, interval):
+        super().__init__(daemon=True)
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    Job.objects.filter(pk=self.job.pk, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    # База занята записью самой команды (SQLite), сигнал повторится позже
+                    continue
+        finally:
+            # У потока своё соединение с базой
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    """Выполнение задания и сохранение результата"""
+    output = JobOutput(job)
+    command = load_command_class(get_commands()[job.command], job.command)
+    options = dict(job.options)
+    # Команды с поддержкой прогресса принимают его как скрытый параметр
+    if 'progress' in command.stealth_options:
+        options['progress'] = output.progress
+
+    heartbeat = Heartbeat(job, getattr(settings, 'CASHFLOW_JOB_HEARTBEAT', 30))
+    heartbeat.start()
+    try:
+        call_command(command, *job.arguments, stdout=output, stderr=output, **options)
+    except CommandError as error:
+        job.status = Job.FAILED
+        job.message = str(error)[:255]
+    except Exception as error:
+        job.status = Job.FAILED
+        job.message = f'{type(error).__name__}: {error}'[:255]
+        output.chunks.append(traceback.format_exc())
+    else:
+        job.status = Job.DONE
+    finally:
+        heartbeat.stop()
+
+    if job.input_file:
+        # Загруженный файл нужен только на время выполнения
+        job_path(job.input_file).unlink(missing_ok=True)
+    output.flush()
+    job.finished_at = timezone.now()
+    Job.objects.filter(pk=job.pk).update(
+        status=job.status, message=job.message, finished_at=job.finished_at
+    )
+    return job
+
+
+def work(stop, poll_interval=1.0, burst=False):
+    """
+    Цикл воркера: захват и выполнение заданий до события stop.
+
+    В режиме burst воркер завершается, когда очередь пуста.
+    """
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    processed = 0
+    try:
+        while not stop.is_set():
+            job = claim_job(worker)
+            if job is None:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+                continue
+            run_job(job)
+            processed += 1
+    finally:
+        connection.close()
+    return processed
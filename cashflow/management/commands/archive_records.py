@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from cashflow.archive import archive_records
+from cashflow.models import ArchivedCashFlowRecord, CashFlowRecord
+
+
+class Command(BaseCommand):
+    help = 'Move records of closed periods into the archive table'
+
+    # Прогресс передаётся воркером фоновых заданий (cashflow.jobs)
+    stealth_options = ('progress',)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help='Archive records dated before this date (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            help='Archive everything before the first day of the month N months ago '
+                 '(default: CASHFLOW_ARCHIVE_KEEP_MONTHS setting, 24)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of records moved per transaction (default: 5000)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many records would be archived',
+        )
+
+    def get_before(self, options):
+        if options['before']:
+            try:
+                return date.fromisoformat(options['before'])
+            except ValueError:
+                raise CommandError(f'Invalid date: {options["before"]}')
+        keep_months = options['keep_months']
+        if keep_months is None:
+            keep_months = getattr(settings, 'CASHFLOW_ARCHIVE_KEEP_MONTHS', 24)
+        if keep_months < 0:
+            raise CommandError('--keep-months must not be negative')
+        month = timezone.localdate().replace(day=1)
+        months = month.year * 12 + month.month - 1 - keep_months
+        return date(months // 12, months % 12 + 1, 1)
+
+    def handle(self, *args, **options):
+        before = self.get_before(options)
+        pending = CashFlowRecord.objects.filter(date__lt=before).count()
+        self.stdout.write(f'Records dated before {before}: {pending}')
+        if options['dry_run'] or not pending:
+            return
+
+        self.stdout.write('Archiving records...')
+        progress = options.get('progress')
+
+        def report(moved):
+            self.stdout.write(f'  Moved {moved} records')
+            if progress:
+                progress(moved, pending)
+
+        moved = archive_records(before, batch_size=options['batch_size'], progress=report)
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'✅ Archived {moved} records successfully!'))
+        self.stdout.write(f'  - Records in ledger: {CashFlowRecord.objects.count()}')
+        self.stdout.write(f'  - Records in archive: {ArchivedCashFlowRecord.objects.count()}')
@@ -0,0 +1,203 @@
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from itertools import combinations
+from math import ceil
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from cashflow.filters import FILTER_PARAMS
+from cashflow.models import CashFlowRecord
+from cashflow.pagination import KEYSET_ORDERING, encode_cursor
+
+
+def percentile(values, share):
+    """Значение перцентиля по методу ближайшего ранга"""
+    ordered = sorted(values)
+    return ordered[max(ceil(share * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = 'Time the ledger pages and endpoints and report query counts and p50/p95 latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Timed requests per case (default: 20)',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Untimed requests per case before measuring (default: 2)',
+        )
+        parser.add_argument(
+            '--only',
+            help='Run only cases whose name contains this text',
+        )
+        parser.add_argument(
+            '--max-p95',
+            type=float,
+            help='Fail if any case has p95 latency above this many milliseconds',
+        )
+        parser.add_argument(
+            '--max-queries',
+            type=int,
+            help='Fail if any case runs more SQL queries per request than this',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['warmup'] < 0:
+            raise CommandError('--repeat must be positive and --warmup must not be negative')
+        if not CashFlowRecord.objects.exists():
+            raise CommandError(
+                'There are no records, run "python manage.py generate_fake_records" first'
+            )
+
+        cases = [
+            case for case in self.get_cases()
+            if not options['only'] or options['only'] in case[0]
+        ]
+        if not cases:
+            raise CommandError(f'No benchmark cases match "{options["only"]}"')
+
+        self.stdout.write(
+            f'{CashFlowRecord.objects.count()} records, {len(cases)} cases, '
+            f'{options["repeat"]} requests each'
+        )
+        self.stdout.write('')
+        self.stdout.write(f'{"case":<60} {"queries":>7} {"p50 ms":>9} {"p95 ms":>9}')
+
+        failures = []
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        # Показатели запросов считает сама команда, журнал каждого запроса не нужен
+        with override_settings(ALLOWED_HOSTS=hosts, DEBUG=False, CASHFLOW_REQUEST_METRICS=False):
+            client = Client()
+            for name, method, url, data, extra_settings in cases:
+                with override_settings(**extra_settings):
+                    result = self.run_case(client, method, url, data, options)
+                line = (
+                    f'{name:<60} {result["queries"]:>7} '
+                    f'{result["p50"]:>9.1f} {result["p95"]:>9.1f}'
+                )
+                problems = self.check_limits(result, options)
+                if problems:
+                    failures.append(f'{name}: {", ".join(problems)}')
+                    self.stdout.write(self.style.WARNING(line))
+                else:
+                    self.stdout.write(line)
+
+        self.stdout.write('')
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(f'  {failure}'))
+            raise CommandError(f'{len(failures)} of {len(cases)} cases exceed the limits')
+        self.stdout.write(self.style.SUCCESS(f'✅ Benchmarked {len(cases)} cases'))
+
+    def get_cases(self):
+        """Сценарии: (название, метод, URL, данные POST, временные настройки)"""
+        index_url = reverse('cashflow:index')
+        sample = self.get_sample_filters()
+        cases = []
+
+        # Главная страница со всеми комбинациями фильтров
+        for size in range(len(FILTER_PARAMS) + 1):
+            for names in combinations(FILTER_PARAMS, size):
+                query = urlencode({name: sample[name] for name in names})
+                label = ', '.join(names) or 'no filters'
+                cases.append((f'index [{label}]', 'get', f'{index_url}?{query}', None, {}))
+
+        # Глубокие страницы: курсор и номер страницы
+        total = CashFlowRecord.objects.count()
+        depth = total // 2
+        middle = CashFlowRecord.objects.order_by(*KEYSET_ORDERING)[depth]
+        cursor = encode_cursor(middle, 'next')
+        cases.append((f'index keyset page at row {depth}', 'get', f'{index_url}?cursor={cursor}', None, {}))
+        offset_mode = {'CASHFLOW_PAGINATION_MODE': 'offset'}
+        last_page = max(ceil(total / 20), 1)
+        for page in sorted({1, max(last_page // 2, 1), last_page}):
+            cases.append((f'index offset page {page}', 'get', f'{index_url}?page={page}', None, offset_mode))
+        cases.append(('index comment search', 'get', f'{index_url}?q=оплата', None, {}))
+
+        # AJAX-справочники, отчёт и справочники
+        cases.append((
+            'categories_by_type', 'get',
+            f'{reverse("cashflow:categories_by_type")}?type_id={sample["type"]}', None, {},
+        ))
+        cases.append((
+            'subcategories_by_category', 'get',
+            f'{reverse("cashflow:subcategories_by_category")}?category_id={sample["category"]}', None, {},
+        ))
+        cases.append(('taxonomy', 'get', reverse('cashflow:taxonomy'), None, {}))
+        cases.append(('report', 'get', reverse('cashflow:report'), None, {}))
+        cases.append(('reference_data', 'get', reverse('cashflow:reference_data'), None, {}))
+
+        # Отправка формы создания записи (изменения откатываются)
+        cases.append(('record_create form', 'get', reverse('cashflow:record_create'), None, {}))
+        cases.append(('record_create submit', 'post', reverse('cashflow:record_create'), {
+            'date': sample['date_to'],
+            'status': sample['status'],
+            'type': sample['type'],
+            'category': sample['category'],
+            'subcategory': sample['subcategory'],
+            'amount': '1234.50',
+            'comment': 'benchmark',
+        }, {}))
+        return cases
+
+    def get_sample_filters(self):
+        """Фильтры по последнему кварталу и классификации самой новой записи"""
+        latest = CashFlowRecord.objects.order_by(*KEYSET_ORDERING).first()
+        bounds = CashFlowRecord.objects.aggregate(first=Min('date'), last=Max('date'))
+        date_from = max(bounds['first'], bounds['last'] - timedelta(days=90))
+        return {
+            'date_from': date_from.isoformat(),
+            'date_to': bounds['last'].isoformat(),
+            'status': latest.status_id,
+            'type': latest.type_id,
+            'category': latest.category_id,
+            'subcategory': latest.subcategory_id,
+        }
+
+    def run_case(self, client, method, url, data, options):
+        timings = []
+        queries = 0
+        for attempt in range(options['warmup'] + options['repeat']):
+            with ExitStack() as stack:
+                if method == 'post':
+                    # Отправка формы не должна менять данные
+                    stack.enter_context(transaction.atomic())
+                    stack.callback(transaction.set_rollback, True)
+                contexts = [
+                    stack.enter_context(CaptureQueriesContext(connection))
+                    for connection in connections.all()
+                ]
+                started = time.perf_counter()
+                response = client.post(url, data) if method == 'post' else client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                else:
+                    response.content
+                elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code >= 400 or (method == 'post' and response.status_code != 302):
+                raise CommandError(f'{method.upper()} {url} returned {response.status_code}')
+            if attempt >= options['warmup']:
+                timings.append(elapsed)
+                queries = max(queries, sum(len(context.captured_queries) for context in contexts))
+        return {'queries': queries, 'p50': percentile(timings, 0.5), 'p95': percentile(timings, 0.95)}
+
+    def check_limits(self, result, options):
+        problems = []
+        if options['max_p95'] is not None and result['p95'] > options['max_p95']:
+            problems.append(f'p95 {result["p95"]:.1f} ms > {options["max_p95"]} ms')
+        if options['max_queries'] is not None and result['queries'] > options['max_queries']:
+            problems.append(f'{result["queries"]} queries > {options["max_queries"]}')
+        return problems
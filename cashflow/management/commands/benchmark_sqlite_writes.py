@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from cashflow.bulk import RECORD_COLUMNS
+from cashflow.models import CashFlowRecord
+from cashflow.sqlite_profile import get_sqlite_pragmas, pragma_statements
+
+
+# Настройки SQLite по умолчанию (sqlite3 и Django ждут блокировку 5 секунд)
+BASELINE_PRAGMAS = {'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout': 5000}
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent record writes on SQLite with default settings and the tuned profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of concurrent writers (default: 4)',
+        )
+        parser.add_argument(
+            '--records',
+            type=int,
+            default=200,
+            help='Records saved by each writer, one transaction per record (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The benchmark only applies to the SQLite backend')
+        if options['workers'] < 1 or options['records'] < 1:
+            raise CommandError('--workers and --records must be positive')
+
+        schema = self.get_schema()
+        immediate = connection.settings_dict.get('OPTIONS', {}).get('transaction_mode') == 'IMMEDIATE'
+        profiles = [
+            ('default settings', BASELINE_PRAGMAS, False),
+            ('tuned profile', get_sqlite_pragmas(), immediate),
+        ]
+
+        self.stdout.write(
+            f'{options["workers"]} writers x {options["records"]} records, '
+            f'each in its own transaction (read + insert)'
+        )
+        self.stdout.write('')
+        results = []
+        for label, pragmas, immediate in profiles:
+            self.stdout.write(f'{label}:')
+            for statement in pragma_statements(pragmas):
+                self.stdout.write(f'  {statement}')
+            if immediate:
+                self.stdout.write('  BEGIN IMMEDIATE')
+            result = self.run_profile(schema, pragmas, immediate, options['workers'], options['records'])
+            results.append(result)
+            self.stdout.write(
+                f'  saved: {result["saved"]}, "database is locked": {result["locked"]}, '
+                f'time: {result["elapsed"]:.2f}s, throughput: {result["rate"]:.0f} records/s'
+            )
+            self.stdout.write('')
+
+        baseline, tuned = results
+        speedup = tuned['rate'] / baseline['rate'] if baseline['rate'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Tuned profile: {tuned["rate"]:.0f} records/s ({speedup:.1f}x), '
+            f'lock errors {baseline["locked"]} -> {tuned["locked"]}'
+        ))
+
+    def get_schema(self):
+        """
+        DDL таблицы записей ДДС и её индексов из текущей базы.
+
+        Триггеры таблицы не копируются: они пишут в индекс полнотекстового
+        поиска, которого во временной базе нет.
+        """
+        table = CashFlowRecord._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE tbl_name = %s AND type IN ('table', 'index') "
+                "AND sql IS NOT NULL ORDER BY type = 'index'",
+                [table],
+            )
+            schema = [row[0] for row in cursor.fetchall()]
+        if not schema:
+            raise CommandError(f'Table {table} not found, run "python manage.py migrate" first')
+        return schema
+
+    def run_profile(self, schema, pragmas, immediate, workers, records):
+        """Параллельная запись во временную копию таблицы записей"""
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        try:
+            setup = sqlite3.connect(path)
+            for statement in pragma_statements(pragmas) + schema:
+                setup.execute(statement)
+            setup.commit()
+            setup.close()
+
+            counters = {'saved': 0, 'locked': 0, 'errors': []}
+            lock = threading.Lock()
+            start = threading.Barrier(workers + 1)
+            threads = [
+                threading.Thread(
+                    target=self.write_records,
+                    args=(path, pragmas, immediate, records, number, counters, lock, start),
+                )
+                for number in range(workers)
+            ]
+            for thread in threads:
+                thread.start()
+            try:
+                start.wait()
+            except threading.BrokenBarrierError:
+                # Писатель упал до начала замера, ошибка сообщается ниже
+                pass
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            errors = [error for error in counters.pop('errors') if not isinstance(error, threading.BrokenBarrierError)]
+            if errors:
+                raise CommandError(f'Writer failed: {errors[0]}')
+        finally:
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        counters['elapsed'] = elapsed
+        counters['rate'] = counters['saved'] / elapsed if elapsed else 0
+        return counters
+
+    def write_records(self, path, pragmas, immediate, records, number, counters, lock, start):
+        """Сохранение записей по одной в транзакции, как при сохранении формы"""
+        table = CashFlowRecord._meta.db_table
+        columns = RECORD_COLUMNS + ('created_at', 'updated_at')
+        insert = (
+            f'INSERT INTO {table} ({", ".join(columns)}) '
+            f'VALUES ({", ".join("?" * len(columns))})'
+        )
+        now = timezone.now().isoformat()
+        first_day = date.today() - timedelta(days=365)
+        saved = locked = 0
+        db = None
+        try:
+            db = sqlite3.connect(path, timeout=0, isolation_level=None, check_same_thread=False)
+            for statement in pragma_statements(pragmas):
+                db.execute(statement)
+            start.wait()
+            for index in range(records):
+                day = (first_day + timedelta(days=(number * records + index) % 365)).isoformat()
+                try:
+                    db.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+                    db.execute(f'SELECT COUNT(*) FROM {table} WHERE date = ?', [day]).fetchone()
+                    db.execute(insert, [day, 1, 1, 1, 1, '100.00', f'benchmark {number}', now, now])
+                    db.execute('COMMIT')
+                    saved += 1
+                except sqlite3.OperationalError as error:
+                    if 'locked' not in str(error):
+                        raise
+                    locked += 1
+                finally:
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+        except Exception as error:
+            # Исключение потока не дошло бы до команды: ошибка передаётся
+            # основному потоку, а ожидающие начала замера потоки освобождаются
+            start.abort()
+            with lock:
+                counters['errors'].append(error)
+        finally:
+            if db is not None:
+                db.close()
+            with lock:
+                counters['saved'] += saved
+                counters['locked'] += locked
@@ -0,0 +1,92 @@
+import re
+from itertools import combinations
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Min
+from cashflow.filters import FILTER_PARAMS, filter_records
+from cashflow.models import CashFlowRecord, Status, Type, Category, Subcategory
+from cashflow.pagination import KEYSET_ORDERING
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN for every filter combination of the records ledger and report full scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='LIMIT used for the explained ledger query (default: 20)',
+        )
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the full query plan for every combination',
+        )
+
+    def handle(self, *args, **options):
+        sample = self.get_sample_filters()
+        limit = options['page_size'] + 1
+
+        self.stdout.write(f'Database vendor: {connection.vendor}')
+        self.stdout.write('')
+
+        problems = 0
+        total = 0
+        for size in range(len(FILTER_PARAMS) + 1):
+            for names in combinations(FILTER_PARAMS, size):
+                total += 1
+                filters = {name: sample[name] for name in names}
+                queryset = filter_records(
+                    CashFlowRecord.objects.order_by(*KEYSET_ORDERING), filters
+                )[:limit]
+                plan = queryset.explain()
+                issues = self.find_issues(plan)
+
+                label = ', '.join(names) or '(no filters)'
+                if issues:
+                    problems += 1
+                    self.stdout.write(self.style.WARNING(f'  {label}: {"; ".join(issues)}'))
+                else:
+                    self.stdout.write(f'  {label}: OK')
+                if options['verbose_plans']:
+                    for line in plan.splitlines():
+                        self.stdout.write(f'      {line}')
+
+        self.stdout.write('')
+        if problems:
+            self.stdout.write(self.style.WARNING(
+                f'{problems} of {total} filter combinations fall back to a full scan or sort'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ All {total} filter combinations use indexes'))
+
+    def get_sample_filters(self):
+        """Представительные значения фильтров из текущей базы"""
+        bounds = CashFlowRecord.objects.aggregate(first=Min('date'), last=Max('date'))
+        return {
+            'date_from': bounds['first'] or '2000-01-01',
+            'date_to': bounds['last'] or '2100-01-01',
+            'status': Status.objects.values_list('id', flat=True).first() or 1,
+            'type': Type.objects.values_list('id', flat=True).first() or 1,
+            'category': Category.objects.values_list('id', flat=True).first() or 1,
+            'subcategory': Subcategory.objects.values_list('id', flat=True).first() or 1,
+        }
+
+    def find_issues(self, plan):
+        """Поиск полного сканирования таблицы и сортировки всей выборки в плане"""
+        table = CashFlowRecord._meta.db_table
+        issues = []
+        for line in plan.splitlines():
+            if connection.vendor == 'sqlite':
+                if f'SCAN {table}' in line and 'USING' not in line:
+                    issues.append('full table scan')
+                if 'USE TEMP B-TREE FOR ORDER BY' in line:
+                    issues.append('sort of all matching rows')
+            elif connection.vendor == 'postgresql':
+                if f'Seq Scan on {table}' in line:
+                    issues.append('sequential scan')
+                if re.search(r'(?:^|->)\s*Sort\s', line.strip()):
+                    issues.append('sort of all matching rows')
+        return sorted(set(issues))
@@ -0,0 +1,64 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from cashflow.archive import record_querysets
+from cashflow.exporters import EXPORT_CHUNK_SIZE, iter_export_rows
+from cashflow.filters import FILTER_PARAMS, SEARCH_PARAM
+from cashflow.routers import replica_reads
+
+
+class Command(BaseCommand):
+    help = 'Export cash flow records to a CSV file with the filters of the records page'
+
+    # Прогресс передаётся воркером фоновых заданий (cashflow.jobs)
+    stealth_options = ('progress',)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', required=True, help='Path of the CSV file to write')
+        for name in FILTER_PARAMS:
+            parser.add_argument(
+                f'--{name.replace("_", "-")}',
+                dest=name,
+                help=f'Filter by {name.replace("_", " ")} (same values as on the records page)',
+            )
+        parser.add_argument(f'--{SEARCH_PARAM}', dest=SEARCH_PARAM, help='Comment search text')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=EXPORT_CHUNK_SIZE,
+            help=f'Number of records read per query (default: {EXPORT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        filters = {name: options[name] for name in (*FILTER_PARAMS, SEARCH_PARAM)}
+        progress = options.get('progress')
+        path = options['output']
+
+        # Выгрузка только читает записи, как и потоковая выгрузка страницы
+        with replica_reads():
+            total = sum(queryset.count() for queryset in record_querysets(filters))
+            self.stdout.write(f'Exporting {total} records to {path}...')
+            if progress:
+                progress(0, total)
+
+            exported = 0
+            try:
+                # BOM и разделитель как у выгрузки со страницы: файл открывается в Excel
+                with open(path, 'w', encoding='utf-8-sig', newline='') as file:
+                    writer = csv.writer(file)
+                    rows = iter_export_rows(filters, chunk_size=options['chunk_size'])
+                    writer.writerow(next(rows))
+                    for row in rows:
+                        writer.writerow(row)
+                        exported += 1
+                        if exported % options['chunk_size'] == 0:
+                            self.stdout.write(f'  Exported {exported} records')
+                            if progress:
+                                progress(exported, total)
+            except OSError as error:
+                raise CommandError(str(error))
+
+        if progress:
+            progress(exported, total)
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'✅ Exported {exported} records successfully!'))
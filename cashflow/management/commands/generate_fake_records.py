@@ -0,0 +1,136 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from cashflow.bulk import RECORD_COLUMNS
+from cashflow.models import CashFlowRecord, Status, Subcategory
+from cashflow.reports import INCOME_TYPE_NAME
+from cashflow.rollups import apply_records
+
+
+# Слова комментариев, чтобы поиск по комментарию работал на реальном объёме
+COMMENT_WORDS = [
+    'оплата', 'счёт', 'договор', 'аванс', 'возврат', 'перевод', 'поставщик',
+    'клиент', 'март', 'апрель', 'май', 'квартал', 'офис', 'аренда', 'заказ',
+    'доставка', 'премия', 'услуги', 'абонемент', 'подписка', 'ремонт', 'налог',
+]
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic cash flow records over the reference data for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=100000,
+            help='Number of records to create (default: 100000)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=730,
+            help='Spread record dates over this many days up to today (default: 730)',
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.0,
+            help='Zipf exponent of the subcategory distribution; 0 means uniform (default: 1.0)',
+        )
+        parser.add_argument(
+            '--income-share',
+            type=float,
+            default=0.2,
+            help='Share of income records (default: 0.2)',
+        )
+        parser.add_argument(
+            '--comment-share',
+            type=float,
+            default=0.7,
+            help='Share of records with a comment (default: 0.7)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of records per bulk_create call (default: 5000)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed for reproducible data',
+        )
+
+    def handle(self, *args, **options):
+        if options['count'] < 1 or options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--count, --days and --batch-size must be positive')
+        if not 0 <= options['income_share'] <= 1 or not 0 <= options['comment_share'] <= 1:
+            raise CommandError('--income-share and --comment-share must be between 0 and 1')
+
+        statuses = list(Status.objects.order_by('pk').values_list('pk', flat=True))
+        subcategories = list(
+            Subcategory.objects.select_related('category__type').order_by('pk')
+        )
+        if not statuses or not subcategories:
+            raise CommandError(
+                'Reference data is empty, run "python manage.py populate_initial_data" first'
+            )
+
+        income = [sub for sub in subcategories if sub.category.type.name == INCOME_TYPE_NAME]
+        expense = [sub for sub in subcategories if sub.category.type.name != INCOME_TYPE_NAME]
+        rng = random.Random(options['seed'])
+        pools = [
+            (pool, self.zipf_weights(len(pool), options['skew'], rng)) for pool in (income, expense)
+        ]
+        status_weights = self.zipf_weights(len(statuses), options['skew'], rng)
+
+        today = timezone.localdate()
+        first_day = today - timedelta(days=options['days'] - 1)
+        count = options['count']
+        batch_size = options['batch_size']
+        self.stdout.write(
+            f'Generating {count} records from {first_day} to {today} '
+            f'over {len(subcategories)} subcategories...'
+        )
+
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            records = []
+            for _ in range(size):
+                is_income = bool(income) and (not expense or rng.random() < options['income_share'])
+                pool, weights = pools[0] if is_income else pools[1]
+                subcategory = rng.choices(pool, weights)[0]
+                # Поступления реже и крупнее списаний
+                amount = Decimal(f'{rng.lognormvariate(10 if is_income else 8, 1.2):.2f}')
+                comment = ''
+                if rng.random() < options['comment_share']:
+                    comment = ' '.join(rng.sample(COMMENT_WORDS, rng.randint(1, 4)))
+                records.append(CashFlowRecord(
+                    date=first_day + timedelta(days=rng.randrange(options['days'])),
+                    status_id=rng.choices(statuses, status_weights)[0],
+                    type_id=subcategory.category.type_id,
+                    category_id=subcategory.category_id,
+                    subcategory_id=subcategory.pk,
+                    amount=max(amount, Decimal('0.01')),
+                    comment=comment,
+                ))
+            with transaction.atomic():
+                CashFlowRecord.objects.bulk_create(records)
+                apply_records([
+                    {name: getattr(record, name) for name in RECORD_COLUMNS} for record in records
+                ])
+            created += size
+            self.stdout.write(f'  {created}/{count}')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Created {created} records'))
+
+    def zipf_weights(self, size, skew, rng):
+        """Веса по закону Ципфа в случайном порядке: немногие значения встречаются чаще остальных"""
+        weights = [1 / (rank ** skew) for rank in range(1, size + 1)]
+        rng.shuffle(weights)
+        return weights
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+from cashflow.importers import ImportFormatError, RecordImporter, read_file
+
+
+class Command(BaseCommand):
+    help = 'Import cash flow records from a CSV or XLSX file'
+
+    # Прогресс передаётся воркером фоновых заданий (cashflow.jobs)
+    stealth_options = ('progress',)
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a .csv or .xlsx file with a header row')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of records inserted per transaction (default: 5000)',
+        )
+        parser.add_argument(
+            '--delimiter',
+            help='CSV delimiter (detected automatically by default)',
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8-sig',
+            help='CSV file encoding (default: utf-8-sig)',
+        )
+        parser.add_argument(
+            '--max-errors',
+            type=int,
+            default=100,
+            help='Maximum number of line errors to print (default: 100)',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.stdout.write(f'Importing records from {path}...')
+
+        progress = options.get('progress')
+
+        def report(result):
+            self.stdout.write(f'  Saved {result.created} records')
+            if progress:
+                progress(result.processed)
+
+        importer = RecordImporter(batch_size=options['batch_size'], progress=report)
+        reader_options = {}
+        if not path.lower().endswith('.xlsx'):
+            reader_options = {'encoding': options['encoding'], 'delimiter': options['delimiter']}
+
+        try:
+            with open(path, 'rb') as file:
+                result = importer.run(read_file(file, path, **reader_options))
+        except (OSError, ImportFormatError) as error:
+            raise CommandError(str(error))
+
+        if result.errors:
+            self.stdout.write('')
+            self.stdout.write(self.style.WARNING(f'Skipped {result.failed} invalid lines:'))
+            for line_number, message in result.errors[:options['max_errors']]:
+                self.stdout.write(f'  line {line_number}: {message}')
+            if result.failed > options['max_errors']:
+                self.stdout.write(f'  ... and {result.failed - options["max_errors"]} more')
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Imported {result.created} of {result.processed} records successfully!'
+        ))
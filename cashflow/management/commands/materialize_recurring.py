@@ -0,0 +1,86 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from cashflow.models import RecurringRecord
+from cashflow.recurring import materialize_recurring, pending_templates
+
+
+class Command(BaseCommand):
+    help = 'Create cash flow records for recurring record templates that are due'
+
+    # Прогресс передаётся воркером фоновых заданий (cashflow.jobs)
+    stealth_options = ('progress',)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--until',
+            help='Create records dated up to and including this date (YYYY-MM-DD, default: today)',
+        )
+        parser.add_argument(
+            '--from',
+            dest='date_from',
+            help='Re-check the whole window starting at this date (YYYY-MM-DD) instead of '
+                 'continuing each template after its last run; existing records are skipped',
+        )
+        parser.add_argument(
+            '--template',
+            type=int,
+            action='append',
+            dest='templates',
+            help='Only materialize the template with this id (can be repeated)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many records would be created',
+        )
+
+    def parse_date(self, value):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'Invalid date: {value}')
+
+    def handle(self, *args, **options):
+        date_to = self.parse_date(options['until']) if options['until'] else timezone.localdate()
+        date_from = self.parse_date(options['date_from']) if options['date_from'] else None
+        if date_from and date_from > date_to:
+            raise CommandError('--from must not be later than --until')
+
+        if date_from:
+            # Окно пересматривается и для шаблонов, записи по которым уже созданы
+            templates = RecurringRecord.objects.filter(is_active=True, start_date__lte=date_to)
+        else:
+            templates = pending_templates(date_to)
+        if options['templates']:
+            templates = RecurringRecord.objects.filter(pk__in=options['templates'], is_active=True)
+            missing = set(options['templates']) - set(templates.values_list('pk', flat=True))
+            if missing:
+                raise CommandError(f'Active templates not found: {", ".join(map(str, sorted(missing)))}')
+
+        progress = options.get('progress')
+        total = templates.count()
+
+        def report(processed):
+            self.stdout.write(f'  Checked {processed} templates')
+            if progress:
+                progress(processed, total)
+
+        self.stdout.write(f'Materializing recurring records up to {date_to}...')
+        result = materialize_recurring(
+            date_to, date_from=date_from, templates=templates, dry_run=options['dry_run'], progress=report,
+        )
+
+        for template, error in result['invalid']:
+            self.stdout.write(self.style.WARNING(f'  Skipped template #{template.pk} "{template.name}": {error}'))
+
+        self.stdout.write('')
+        if options['dry_run']:
+            self.stdout.write(f'Records that would be created: {result["created"]}')
+            self.stdout.write(f'  - Already created: {result["existing"]}')
+            return
+        self.stdout.write(self.style.SUCCESS(f'✅ Created {result["created"]} recurring records successfully!'))
+        self.stdout.write(f'  - Templates processed: {result["templates"]}')
+        self.stdout.write(f'  - Already created: {result["existing"]}')
+        self.stdout.write(f'  - Skipped templates: {len(result["invalid"])}')
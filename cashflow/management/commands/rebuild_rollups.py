@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from cashflow.models import DailyRollup
+from cashflow.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily cash flow rollups from records (full backfill or a date range)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date-from',
+            help='First date to rebuild (YYYY-MM-DD), default: beginning of history',
+        )
+        parser.add_argument(
+            '--date-to',
+            help='Last date to rebuild (YYYY-MM-DD), default: end of history',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of rollup rows inserted per batch (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding daily rollups...')
+
+        created = rebuild_rollups(
+            date_from=options['date_from'],
+            date_to=options['date_to'],
+            batch_size=options['batch_size'],
+        )
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {created} rollup rows successfully!'))
+        self.stdout.write(f'  - Total rollup rows: {DailyRollup.objects.count()}')
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def worker_process(settings_module, stop, poll_interval, burst):
+    """Точка входа процесса воркера (при запуске через spawn Django настраивается заново)"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+    from cashflow.jobs import work
+
+    # Ctrl+C обрабатывает родительский процесс: текущее задание дорабатывается до конца
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(stop, poll_interval=poll_interval, burst=burst)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers that execute queued imports, exports and rebuilds'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'CASHFLOW_JOB_WORKERS', 2),
+            help='Number of worker processes (default: CASHFLOW_JOB_WORKERS setting, 2)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait before checking an empty queue again (default: 1.0)',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit when the queue is empty instead of waiting for new jobs',
+        )
+
+    def handle(self, *args, **options):
+        from cashflow.jobs import fail_stale_jobs, has_shared_cache
+
+        concurrency = options['concurrency']
+        if concurrency < 1 or options['poll_interval'] <= 0:
+            raise CommandError('--concurrency and --poll-interval must be positive')
+        if not has_shared_cache():
+            raise CommandError(
+                'Workers need a cache shared with the web processes, set CACHE_BACKEND '
+                'to file, redis or database (see cashflow_project/caches.py)'
+            )
+
+        stale = fail_stale_jobs(getattr(settings, 'CASHFLOW_JOB_STALE_TIMEOUT', 300))
+        if stale:
+            self.stdout.write(self.style.WARNING(f'Marked {stale} stale running jobs as failed'))
+
+        # Дочерние процессы открывают собственные соединения с базой
+        connections.close_all()
+        stop = multiprocessing.Event()
+        settings_module = os.environ.get('DJANGO_SETTINGS_MODULE', 'cashflow_project.settings')
+        worker_args = (settings_module, stop, options['poll_interval'], options['burst'])
+
+        def start_worker():
+            process = multiprocessing.Process(target=worker_process, args=worker_args)
+            process.start()
+            return process
+
+        def request_stop(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGTERM, request_stop)
+        self.stdout.write(f'Starting {concurrency} workers (pid {os.getpid()})...')
+        workers = [start_worker() for _ in range(concurrency)]
+        restarted = 0
+        try:
+            while workers:
+                for process in list(workers):
+                    process.join(timeout=0.5)
+                    if process.is_alive():
+                        continue
+                    workers.remove(process)
+                    # Упавший воркер заменяется новым, пока не запрошена остановка
+                    if process.exitcode != 0 and not stop.is_set() and not options['burst']:
+                        self.stdout.write(self.style.WARNING(
+                            f'Worker {process.pid} exited with code {process.exitcode}, restarting'
+                        ))
+                        workers.append(start_worker())
+                        restarted += 1
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping workers after their current jobs...')
+            stop.set()
+            for process in workers:
+                process.join()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Workers stopped ({restarted} restarted)'))
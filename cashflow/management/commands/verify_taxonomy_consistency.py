@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from cashflow.bulk import update_records
+from cashflow.models import ArchivedCashFlowRecord, CashFlowRecord
+
+
+def mismatched_records(model):
+    """Записи, тип или категория которых не соответствуют подкатегории"""
+    return model.objects.filter(
+        ~Q(category_id=F('subcategory__category_id'))
+        | ~Q(type_id=F('subcategory__category__type_id'))
+    )
+
+
+class Command(BaseCommand):
+    help = 'Find records whose type and category do not match their subcategory, and optionally fix them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Set type and category from the subcategory and move the daily rollups',
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=10,
+            help='Number of mismatched records to list per table (default: 10)',
+        )
+
+    def handle(self, *args, **options):
+        if options['samples'] < 0:
+            raise CommandError('--samples must not be negative')
+
+        total = 0
+        for model in (CashFlowRecord, ArchivedCashFlowRecord):
+            label = model._meta.db_table
+            # Один проход по таблице: соединение с подкатегорией и категорией
+            rows = list(mismatched_records(model).values_list(
+                'pk', 'type_id', 'category_id', 'subcategory_id',
+                'subcategory__category__type_id', 'subcategory__category_id',
+            ))
+            if not rows:
+                self.stdout.write(f'{label}: no mismatches')
+                continue
+
+            total += len(rows)
+            self.stdout.write(self.style.WARNING(f'{label}: {len(rows)} mismatched records'))
+            for pk, type_id, category_id, subcategory_id, expected_type, expected_category in rows[:options['samples']]:
+                self.stdout.write(
+                    f'  #{pk}: subcategory {subcategory_id} belongs to category {expected_category} '
+                    f'(type {expected_type}), record has category {category_id} (type {type_id})'
+                )
+
+            if options['fix']:
+                targets = {(row[3], row[4], row[5]) for row in rows}
+                fixed = 0
+                for subcategory_id, type_id, category_id in targets:
+                    fixed += update_records(
+                        mismatched_records(model).filter(subcategory_id=subcategory_id),
+                        type_id=type_id,
+                        category_id=category_id,
+                    )
+                self.stdout.write(f'  - Fixed {fixed} records in {len(targets)} subcategories')
+
+        self.stdout.write('')
+        if not total:
+            self.stdout.write(self.style.SUCCESS('✅ All records match their subcategories'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'✅ Fixed {total} mismatched records'))
+        else:
+            raise CommandError(f'{total} mismatched records found, run with --fix to repair them')
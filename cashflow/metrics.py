@@ -0,0 +1,163 @@
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+
+logger = logging.getLogger('cashflow.metrics')
+
+# Показатели текущего запроса; None - запрос не измеряется
+_current_metrics = ContextVar('cashflow_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Показатели одного запроса: SQL-запросы, время базы и шаблонов"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обёртка выполнения SQL (connection.execute_wrapper); работает и без DEBUG
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.query_count += 1
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def install(self):
+        """Подключение к соединениям текущего потока"""
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self):
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class TimedTemplate:
+    """Шаблон, время отрисовки которого учитывается в показателях запроса"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Движок шаблонов Django с замером времени отрисовки для RequestMetricsMiddleware"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def get_query_budget():
+    """Допустимое число SQL-запросов на запрос к приложению cashflow"""
+    return getattr(settings, 'CASHFLOW_QUERY_BUDGET', 20)
+
+
+class RequestMetricsMiddleware:
+    """
+    Измерение запросов: число SQL-запросов, время базы, время отрисовки
+    шаблонов, общее время и размер ответа.
+
+    Показатели добавляются в заголовок Server-Timing и пишутся в лог
+    cashflow.metrics одной JSON-строкой; запросы к приложению cashflow сверх
+    CASHFLOW_QUERY_BUDGET SQL-запросов пишутся с уровнем WARNING.
+    Включается настройкой CASHFLOW_REQUEST_METRICS.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CASHFLOW_REQUEST_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        metrics.install()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.uninstall()
+            _current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        # Асинхронный ORM выполняет запросы в потоке синхронного кода запроса;
+        # соединения принадлежат потоку, поэтому обёртка подключается там же
+        await sync_to_async(metrics.install)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(metrics.uninstall)()
+            _current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        """Заголовок Server-Timing и строка журнала"""
+        total_time = metrics.total_time
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.query_count} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ])
+
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': metrics.query_count,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'template_ms': round(metrics.template_time * 1000, 1),
+            'total_ms': round(total_time * 1000, 1),
+            # У потокового ответа размер заранее неизвестен
+            'bytes': None if response.streaming else len(response.content),
+        }
+        budget = get_query_budget()
+        if match and match.app_name == 'cashflow' and metrics.query_count > budget:
+            record['query_budget'] = budget
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cashflowrecord',
+            index=models.Index(fields=['-date', '-created_at', '-id'], name='cfr_date_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflowrecord',
+            index=models.Index(fields=['status', '-date', '-created_at', '-id'], name='cfr_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflowrecord',
+            index=models.Index(fields=['type', '-date', '-created_at', '-id'], name='cfr_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflowrecord',
+            index=models.Index(fields=['category', '-date', '-created_at', '-id'], name='cfr_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflowrecord',
+            index=models.Index(fields=['subcategory', '-date', '-created_at', '-id'], name='cfr_subcategory_date_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    CashFlowRecord = apps.get_model('cashflow', 'CashFlowRecord')
+    DailyRollup = apps.get_model('cashflow', 'DailyRollup')
+    fields = ('date', 'status_id', 'type_id', 'category_id', 'subcategory_id')
+    grouped = CashFlowRecord.objects.order_by().values(*fields).annotate(
+        total=Sum('amount'), count=Count('id')
+    )
+    DailyRollup.objects.bulk_create(
+        (
+            DailyRollup(
+                total_amount=row['total'],
+                record_count=row['count'],
+                **{name: row[name] for name in fields}
+            )
+            for row in grouped.iterator(chunk_size=5000)
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0002_cashflowrecord_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Сумма')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='Количество записей')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cashflow.category', verbose_name='Категория')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cashflow.status', verbose_name='Статус')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cashflow.subcategory', verbose_name='Подкатегория')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='cashflow.type', verbose_name='Тип')),
+            ],
+            options={
+                'verbose_name': 'Дневной итог',
+                'verbose_name_plural': 'Дневные итоги',
+                'ordering': ['-date'],
+                'unique_together': {('date', 'status', 'type', 'category', 'subcategory')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
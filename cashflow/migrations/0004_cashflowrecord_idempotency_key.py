@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0003_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashflowrecord',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Идентификатор записи во внешней системе; повторная загрузка с тем же ключом не создаёт дубликат', max_length=100, null=True, unique=True, verbose_name='Ключ идемпотентности'),
+        ),
+    ]
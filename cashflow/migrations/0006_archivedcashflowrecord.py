@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:46
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0005_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCashFlowRecord',
+            fields=[
+                ('date', models.DateField(default=django.utils.timezone.now, verbose_name='Дата операции')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.01)], verbose_name='Сумма')),
+                ('comment', models.TextField(blank=True, verbose_name='Комментарий')),
+                ('idempotency_key', models.CharField(blank=True, help_text='Идентификатор записи во внешней системе; повторная загрузка с тем же ключом не создаёт дубликат', max_length=100, null=True, unique=True, verbose_name='Ключ идемпотентности')),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID записи')),
+                ('created_at', models.DateTimeField(verbose_name='Дата создания записи')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата обновления записи')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата переноса в архив')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='cashflow.category', verbose_name='Категория')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='cashflow.status', verbose_name='Статус')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='cashflow.subcategory', verbose_name='Подкатегория')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='cashflow.type', verbose_name='Тип')),
+            ],
+            options={
+                'verbose_name': 'Архивная запись ДДС',
+                'verbose_name_plural': 'Архивные записи ДДС',
+                'ordering': ['-date', '-created_at'],
+                'indexes': [models.Index(fields=['-date', '-created_at', '-id'], name='acfr_date_created_idx'), models.Index(fields=['status', '-date', '-created_at', '-id'], name='acfr_status_date_idx'), models.Index(fields=['type', '-date', '-created_at', '-id'], name='acfr_type_date_idx'), models.Index(fields=['category', '-date', '-created_at', '-id'], name='acfr_category_date_idx'), models.Index(fields=['subcategory', '-date', '-created_at', '-id'], name='acfr_subcategory_date_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+from cashflow.search import SEARCH_CONFIG, drop_fts, install_fts
+
+
+# Таблицы записей и имена GIN-индексов PostgreSQL для поиска по комментариям
+SEARCH_INDEXES = {
+    'cashflowrecord': 'cfr_comment_search',
+    'archivedcashflowrecord': 'acfr_comment_search',
+}
+
+
+def search_index(name):
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector('comment', config=SEARCH_CONFIG), name=name)
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    for model_name, index_name in SEARCH_INDEXES.items():
+        model = apps.get_model('cashflow', model_name)
+        if connection.vendor == 'postgresql':
+            schema_editor.add_index(model, search_index(index_name))
+        elif connection.vendor == 'sqlite':
+            try:
+                install_fts(connection, model._meta.db_table)
+            except OperationalError:
+                # SQLite собран без FTS5: поиск работает через LIKE
+                return
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    for model_name, index_name in SEARCH_INDEXES.items():
+        model = apps.get_model('cashflow', model_name)
+        if connection.vendor == 'postgresql':
+            schema_editor.remove_index(model, search_index(index_name))
+        elif connection.vendor == 'sqlite':
+            drop_fts(connection, model._meta.db_table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0006_archivedcashflowrecord'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
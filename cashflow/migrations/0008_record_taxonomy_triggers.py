@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from cashflow.integrity import drop_taxonomy_triggers, install_taxonomy_triggers
+
+
+def create_triggers(apps, schema_editor):
+    install_taxonomy_triggers(schema_editor.connection, apps)
+
+
+def drop_triggers(apps, schema_editor):
+    drop_taxonomy_triggers(schema_editor.connection, apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0007_record_comment_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:13
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0009_job_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='command',
+            field=models.CharField(choices=[('import_records', 'Импорт записей'), ('export_records', 'Выгрузка записей'), ('rebuild_rollups', 'Пересчёт дневных итогов'), ('archive_records', 'Архивация записей'), ('materialize_recurring', 'Создание регулярных операций')], max_length=50, verbose_name='Команда'),
+        ),
+        migrations.CreateModel(
+            name='RecurringRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Название')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0.01)], verbose_name='Сумма')),
+                ('comment', models.TextField(blank=True, help_text='Комментарий создаваемых записей; если не указан, используется название шаблона', verbose_name='Комментарий')),
+                ('rule', models.CharField(help_text='RRULE без DTSTART, например FREQ=MONTHLY;BYMONTHDAY=1 или FREQ=WEEKLY;BYDAY=FR', max_length=255, verbose_name='Правило повторения')),
+                ('start_date', models.DateField(default=django.utils.timezone.now, verbose_name='Дата начала')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='Дата окончания')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('materialized_until', models.DateField(blank=True, help_text='Последняя дата, по которую созданы записи; следующий запуск продолжает с неё', null=True, verbose_name='Записи созданы по')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='cashflow.category', verbose_name='Категория')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='cashflow.status', verbose_name='Статус')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='cashflow.subcategory', verbose_name='Подкатегория')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='cashflow.type', verbose_name='Тип')),
+            ],
+            options={
+                'verbose_name': 'Регулярная операция',
+                'verbose_name_plural': 'Регулярные операции',
+                'ordering': ['name'],
+                'indexes': [models.Index(fields=['is_active', 'materialized_until'], name='recurring_pending_idx')],
+            },
+        ),
+    ]
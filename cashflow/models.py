@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
@@ -35,6 +36,17 @@ class Type(models.Model):
         return self.name
 
 
+def is_moved_while_used(instance, parent_field, record_field):
+    """Сменился ли родитель справочного элемента, на который ссылаются записи или шаблоны"""
+    parent_id = type(instance).objects.filter(pk=instance.pk).values_list(parent_field, flat=True).first()
+    if parent_id is None or parent_id == getattr(instance, parent_field):
+        return False
+    return any(
+        model.objects.filter(**{record_field: instance.pk}).exists()
+        for model in (CashFlowRecord, ArchivedCashFlowRecord, RecurringRecord)
+    )
+
+
 class Category(models.Model):
     """Категория расходов/доходов"""
     name = models.CharField(max_length=100, verbose_name="Название категории")
@@ -57,6 +69,14 @@ class Category(models.Model):
     def __str__(self):
         return f"{self.type.name} - {self.name}"
 
+    def clean(self):
+        super().clean()
+        # Перенос используемой категории в другой тип нарушил бы классификацию записей
+        if self.pk and self.type_id and is_moved_while_used(self, 'type_id', 'category_id'):
+            raise ValidationError(
+                {'type': "Категория используется в записях, её нельзя перенести в другой тип"}
+            )
+
 
 class Subcategory(models.Model):
     """Подкатегория расходов/доходов"""
@@ -80,9 +100,39 @@ class Subcategory(models.Model):
     def __str__(self):
         return f"{self.category.name} - {self.name}"
 
+    def clean(self):
+        super().clean()
+        if self.pk and self.category_id and is_moved_while_used(self, 'category_id', 'subcategory_id'):
+            raise ValidationError(
+                {'category': "Подкатегория используется в записях, её нельзя перенести в другую категорию"}
+            )
+
 
-class CashFlowRecord(models.Model):
-    """Запись о движении денежных средств"""
+def check_taxonomy(instance):
+    """Соответствие категории типу и подкатегории категории (по кешу справочников)"""
+    from .reference_cache import get_reference_data
+
+    if not (instance.type_id and instance.category_id and instance.subcategory_id):
+        return
+    reference = get_reference_data()
+    category = reference.categories_by_id.get(instance.category_id)
+    subcategory = reference.subcategories_by_id.get(instance.subcategory_id)
+
+    # Проверка соответствия категории типу
+    if category is None or category.type_id != instance.type_id:
+        raise ValidationError(
+            "Категория должна соответствовать выбранному типу операции"
+        )
+
+    # Проверка соответствия подкатегории категории
+    if subcategory is None or subcategory.category_id != instance.category_id:
+        raise ValidationError(
+            "Подкатегория должна соответствовать выбранной категории"
+        )
+
+
+class BaseCashFlowRecord(models.Model):
+    """Поля записи о движении денежных средств (общие для ленты и архива)"""
     date = models.DateField(
         default=timezone.now,
         verbose_name="Дата операции"
@@ -117,29 +167,310 @@ class CashFlowRecord(models.Model):
         blank=True,
         verbose_name="Комментарий"
     )
+    idempotency_key = models.CharField(
+        max_length=100,
+        null=True,
+        blank=True,
+        unique=True,
+        verbose_name="Ключ идемпотентности",
+        help_text="Идентификатор записи во внешней системе; повторная загрузка с тем же ключом не создаёт дубликат"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания записи")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления записи")
 
+    # Признак для шаблонов: архивные записи не редактируются
+    is_archived = False
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.date} - {self.type.name} - {self.amount} р."
+
+
+class CashFlowRecord(BaseCashFlowRecord):
+    """Запись о движении денежных средств"""
+
     class Meta:
         verbose_name = "Запись ДДС"
         verbose_name_plural = "Записи ДДС"
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Лента без фильтров и фильтр по периоду в порядке сортировки ленты
+            models.Index(fields=['-date', '-created_at', '-id'], name='cfr_date_created_idx'),
+            # Фильтр по справочнику (+ период) без отдельной сортировки
+            models.Index(fields=['status', '-date', '-created_at', '-id'], name='cfr_status_date_idx'),
+            models.Index(fields=['type', '-date', '-created_at', '-id'], name='cfr_type_date_idx'),
+            models.Index(fields=['category', '-date', '-created_at', '-id'], name='cfr_category_date_idx'),
+            models.Index(fields=['subcategory', '-date', '-created_at', '-id'], name='cfr_subcategory_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запоминание загруженных значений для инкрементального обновления сводных таблиц"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def clean(self):
+        """
+        Валидация бизнес-правил.
+
+        Соответствие проверяется по справочникам из памяти процесса; в базе
+        то же правило обеспечивают триггеры (cashflow.integrity).
+        """
+        super().clean()
+        check_taxonomy(self)
+
+
+class ArchivedCashFlowRecord(BaseCashFlowRecord):
+    """
+    Запись ДДС закрытого периода, перенесённая в архив командой archive_records.
+
+    Сохраняет id исходной записи; дневные итоги и остатки архивом не меняются.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID записи")
+    created_at = models.DateTimeField(verbose_name="Дата создания записи")
+    updated_at = models.DateTimeField(verbose_name="Дата обновления записи")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата переноса в архив")
+
+    is_archived = True
+
+    class Meta:
+        verbose_name = "Архивная запись ДДС"
+        verbose_name_plural = "Архивные записи ДДС"
+        ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['-date', '-created_at', '-id'], name='acfr_date_created_idx'),
+            models.Index(fields=['status', '-date', '-created_at', '-id'], name='acfr_status_date_idx'),
+            models.Index(fields=['type', '-date', '-created_at', '-id'], name='acfr_type_date_idx'),
+            models.Index(fields=['category', '-date', '-created_at', '-id'], name='acfr_category_date_idx'),
+            models.Index(fields=['subcategory', '-date', '-created_at', '-id'], name='acfr_subcategory_date_idx'),
+        ]
+
+
+class RecurringRecord(models.Model):
+    """
+    Шаблон регулярной операции (аренда, зарплата, подписки).
+
+    Расписание задаётся правилом RRULE (RFC 5545), например
+    FREQ=MONTHLY;BYMONTHDAY=5; записи ДДС по шаблону создаёт команда
+    materialize_recurring.
+    """
+    name = models.CharField(max_length=100, verbose_name="Название")
+    status = models.ForeignKey(
+        Status,
+        on_delete=models.PROTECT,
+        related_name='+',
+        verbose_name="Статус"
+    )
+    type = models.ForeignKey(
+        Type,
+        on_delete=models.PROTECT,
+        related_name='+',
+        verbose_name="Тип"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.PROTECT,
+        related_name='+',
+        verbose_name="Категория"
+    )
+    subcategory = models.ForeignKey(
+        Subcategory,
+        on_delete=models.PROTECT,
+        related_name='+',
+        verbose_name="Подкатегория"
+    )
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        validators=[MinValueValidator(0.01)],
+        verbose_name="Сумма"
+    )
+    comment = models.TextField(
+        blank=True,
+        verbose_name="Комментарий",
+        help_text="Комментарий создаваемых записей; если не указан, используется название шаблона"
+    )
+    rule = models.CharField(
+        max_length=255,
+        verbose_name="Правило повторения",
+        help_text="RRULE без DTSTART, например FREQ=MONTHLY;BYMONTHDAY=1 или FREQ=WEEKLY;BYDAY=FR"
+    )
+    start_date = models.DateField(default=timezone.now, verbose_name="Дата начала")
+    end_date = models.DateField(null=True, blank=True, verbose_name="Дата окончания")
+    is_active = models.BooleanField(default=True, verbose_name="Активен")
+    materialized_until = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name="Записи созданы по",
+        help_text="Последняя дата, по которую созданы записи; следующий запуск продолжает с неё"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
+
+    class Meta:
+        verbose_name = "Регулярная операция"
+        verbose_name_plural = "Регулярные операции"
+        ordering = ['name']
+        indexes = [
+            # Выбор шаблонов, по которым ещё не созданы записи
+            models.Index(fields=['is_active', 'materialized_until'], name='recurring_pending_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.date} - {self.type.name} - {self.amount} р."
+        return f"{self.name} - {self.amount} р. ({self.rule})"
 
     def clean(self):
-        """Валидация бизнес-правил"""
         super().clean()
+        from .recurring import parse_rule
 
-        # Проверка соответствия категории типу
-        if self.category.type != self.type:
-            raise models.ValidationError(
-                "Категория должна соответствовать выбранному типу операции"
-            )
+        check_taxonomy(self)
+        if self.end_date and self.start_date and self.end_date < self.start_date:
+            raise ValidationError({'end_date': "Дата окончания раньше даты начала"})
+        if self.rule:
+            try:
+                parse_rule(self.rule, self.start_date or timezone.localdate())
+            except ValueError as error:
+                raise ValidationError({'rule': f"Некорректное правило повторения: {error}"})
 
-        # Проверка соответствия подкатегории категории
-        if self.subcategory.category != self.category:
-            raise models.ValidationError(
-                "Подкатегория должна соответствовать выбранной категории"
-            )
+
+class DailyRollup(models.Model):
+    """Дневной итог по записям ДДС в разрезе статуса, типа, категории и подкатегории"""
+    date = models.DateField(verbose_name="Дата")
+    status = models.ForeignKey(
+        Status,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Статус"
+    )
+    type = models.ForeignKey(
+        Type,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Тип"
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Категория"
+    )
+    subcategory = models.ForeignKey(
+        Subcategory,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Подкатегория"
+    )
+    total_amount = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=0,
+        verbose_name="Сумма"
+    )
+    record_count = models.PositiveIntegerField(default=0, verbose_name="Количество записей")
+
+    class Meta:
+        verbose_name = "Дневной итог"
+        verbose_name_plural = "Дневные итоги"
+        ordering = ['-date']
+        unique_together = ['date', 'status', 'type', 'category', 'subcategory']
+
+    def __str__(self):
+        return f"{self.date} - {self.type.name} - {self.category.name} - {self.total_amount} р."
+
+
+class BalanceCheckpoint(models.Model):
+    """Остаток денежных средств по статусу на начало месяца (поступления минус списания)"""
+    month = models.DateField(verbose_name="Месяц")
+    status = models.ForeignKey(
+        Status,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Статус"
+    )
+    balance = models.DecimalField(
+        max_digits=18,
+        decimal_places=2,
+        default=0,
+        verbose_name="Остаток на начало месяца"
+    )
+
+    class Meta:
+        verbose_name = "Контрольная точка остатка"
+        verbose_name_plural = "Контрольные точки остатка"
+        ordering = ['-month']
+        unique_together = ['month', 'status']
+
+    def __str__(self):
+        return f"{self.month:%m.%Y} - {self.status.name} - {self.balance} р."
+
+
+class Job(models.Model):
+    """
+    Фоновое задание: команда управления, которую выполняет воркер run_workers.
+
+    Долгие операции (импорт больших файлов, полная выгрузка, пересчёт итогов)
+    ставятся в очередь из интерфейса и не занимают веб-воркер.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнено'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    # Команды, которые можно поставить в очередь
+    COMMAND_CHOICES = [
+        ('import_records', 'Импорт записей'),
+        ('export_records', 'Выгрузка записей'),
+        ('rebuild_rollups', 'Пересчёт дневных итогов'),
+        ('archive_records', 'Архивация записей'),
+        ('materialize_recurring', 'Создание регулярных операций'),
+    ]
+
+    command = models.CharField(max_length=50, choices=COMMAND_CHOICES, verbose_name="Команда")
+    arguments = models.JSONField(default=list, blank=True, verbose_name="Аргументы")
+    options = models.JSONField(default=dict, blank=True, verbose_name="Параметры")
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Состояние"
+    )
+    progress = models.PositiveIntegerField(default=0, verbose_name="Выполнено")
+    total = models.PositiveIntegerField(null=True, blank=True, verbose_name="Всего")
+    message = models.CharField(max_length=255, blank=True, verbose_name="Сообщение")
+    output = models.TextField(blank=True, verbose_name="Вывод команды")
+    input_file = models.CharField(max_length=255, blank=True, verbose_name="Входной файл")
+    result_file = models.CharField(max_length=255, blank=True, verbose_name="Файл результата")
+    worker = models.CharField(max_length=100, blank=True, verbose_name="Воркер")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало выполнения")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Последний сигнал воркера")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание выполнения")
+
+    class Meta:
+        verbose_name = "Фоновое задание"
+        verbose_name_plural = "Фоновые задания"
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Выбор следующего задания очереди
+            models.Index(fields=['status', 'id'], name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_command_display()} #{self.pk} - {self.get_status_display()}"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def percent(self):
+        """Процент выполнения; None, если объём работы заранее неизвестен"""
+        if not self.total:
+            return 100 if self.status == self.DONE else None
+        return min(100, self.progress * 100 // self.total)
@@ -0,0 +1,251 @@
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+
+
+# Порядок ленты записей ДДС; id добавлен как однозначный разделитель
+KEYSET_ORDERING = ('-date', '-created_at', '-id')
+
+
+def encode_cursor(record, direction):
+    """Кодирование позиции записи в непрозрачный курсор"""
+    payload = [direction, record.date.isoformat(), record.created_at.isoformat(), record.pk]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Декодирование курсора; возвращает None для повреждённых значений"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, date_value, created_at, pk = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ('next', 'prev'):
+            return None
+        return direction, date.fromisoformat(date_value), datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+class KeysetPage:
+    """Страница ленты, полученная поиском по ключу вместо OFFSET"""
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], 'next')
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], 'prev')
+        return None
+
+
+def keyset_key(record):
+    """Значения ключа сортировки ленты для объединения нескольких источников"""
+    return record.date, record.created_at, record.pk
+
+
+class KeysetPaginator:
+    """
+    Пагинация по ключу (-date, -created_at, -id).
+
+    Каждая страница выбирается условием «строго после/до курсора» и LIMIT,
+    поэтому стоимость N-й страницы не отличается от первой и не требует COUNT(*).
+    Можно передать список querysets (лента и архив): из каждого выбирается
+    не больше одной страницы, и результаты объединяются по ключу.
+    """
+
+    def __init__(self, queryset, per_page):
+        querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        self.querysets = [qs.order_by(*KEYSET_ORDERING) for qs in querysets]
+        self.per_page = per_page
+
+    def page_querysets(self, boundary=None, reverse=False):
+        """Не более per_page + 1 строк из каждого источника"""
+        querysets = []
+        for queryset in self.querysets:
+            if boundary is not None:
+                queryset = queryset.filter(boundary)
+            if reverse:
+                queryset = queryset.reverse()
+            querysets.append(queryset[:self.per_page + 1])
+        return querysets
+
+    def merge(self, rows, reverse=False):
+        """Строки источников, объединённые в порядке ленты"""
+        if len(self.querysets) > 1:
+            rows.sort(key=keyset_key, reverse=not reverse)
+        return rows[:self.per_page + 1]
+
+    def fetch(self, boundary=None, reverse=False):
+        rows = []
+        for queryset in self.page_querysets(boundary, reverse):
+            rows.extend(queryset)
+        return self.merge(rows, reverse)
+
+    async def afetch(self, boundary=None, reverse=False):
+        rows = []
+        for queryset in self.page_querysets(boundary, reverse):
+            rows.extend([row async for row in queryset.aiterator()])
+        return self.merge(rows, reverse)
+
+    def get_position(self, cursor):
+        """Условие выборки страницы по курсору: (направление, условие, обратный порядок)"""
+        position = decode_cursor(cursor) if cursor else None
+        if position is None:
+            return None, None, False
+
+        direction, date_value, created_at, pk = position
+        if direction == 'next':
+            boundary = (
+                Q(date__lt=date_value)
+                | Q(date=date_value, created_at__lt=created_at)
+                | Q(date=date_value, created_at=created_at, id__lt=pk)
+            )
+            return direction, boundary, False
+
+        boundary = (
+            Q(date__gt=date_value)
+            | Q(date=date_value, created_at__gt=created_at)
+            | Q(date=date_value, created_at=created_at, id__gt=pk)
+        )
+        return direction, boundary, True
+
+    def make_page(self, direction, rows):
+        if direction is None:
+            return KeysetPage(rows[:self.per_page], len(rows) > self.per_page, False)
+        if direction == 'next':
+            return KeysetPage(rows[:self.per_page], len(rows) > self.per_page, True)
+        has_previous = len(rows) > self.per_page
+        return KeysetPage(list(reversed(rows[:self.per_page])), True, has_previous)
+
+    def get_page(self, cursor=None):
+        direction, boundary, reverse = self.get_position(cursor)
+        return self.make_page(direction, self.fetch(boundary, reverse))
+
+    async def aget_page(self, cursor=None):
+        direction, boundary, reverse = self.get_position(cursor)
+        return self.make_page(direction, await self.afetch(boundary, reverse))
+
+
+class MergedRecords:
+    """
+    Последовательность записей нескольких querysets в порядке ленты
+    для постраничного вывода через django.core.paginator.Paginator.
+
+    ordering и key задают другой порядок убывания, например по релевантности поиска.
+    """
+
+    def __init__(self, querysets, ordering=KEYSET_ORDERING, key=keyset_key):
+        self.querysets = [qs.order_by(*ordering) for qs in querysets]
+        self.key = key
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        rows = []
+        for queryset in self.querysets:
+            rows.extend(queryset[:index.stop])
+        rows.sort(key=self.key, reverse=True)
+        return rows[index]
+
+    async def acount(self):
+        return sum([await queryset.acount() for queryset in self.querysets])
+
+    async def aslice(self, start, stop):
+        rows = []
+        for queryset in self.querysets:
+            rows.extend([row async for row in queryset[:stop].aiterator()])
+        rows.sort(key=self.key, reverse=True)
+        return rows[start:stop]
+
+
+class AsyncPaginator(Paginator):
+    """
+    Постраничный вывод по номеру страницы для асинхронных представлений.
+
+    Количество и строки страницы читаются асинхронным ORM, поэтому страница
+    не обращается к базе при отрисовке шаблона. Принимает queryset или MergedRecords.
+    """
+
+    async def aget_page(self, number):
+        if 'count' not in self.__dict__:
+            self.count = await self.object_list.acount()
+        try:
+            number = self.validate_number(number)
+        except PageNotAnInteger:
+            number = 1
+        except EmptyPage:
+            number = self.num_pages
+        bottom = (number - 1) * self.per_page
+        top = min(bottom + self.per_page, self.count)
+        if isinstance(self.object_list, MergedRecords):
+            rows = await self.object_list.aslice(bottom, top)
+        else:
+            rows = [row async for row in self.object_list[bottom:top].aiterator()]
+        return self._get_page(rows, number, self)
+
+
+def count_cache_key(filters):
+    digest = hashlib.md5(
+        json.dumps(filters, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f'cashflow:count:{digest}'
+
+
+def cached_count(queryset, filters):
+    """
+    Количество записей для набора фильтров с кешированием (queryset или список querysets).
+
+    Точный COUNT(*) по большой таблице выполняется не чаще одного раза
+    за CASHFLOW_COUNT_CACHE_TIMEOUT секунд для одних и тех же фильтров.
+    """
+    key = count_cache_key(filters)
+    count = cache.get(key)
+    if count is None:
+        querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        count = sum(qs.order_by().count() for qs in querysets)
+        cache.set(key, count, getattr(settings, 'CASHFLOW_COUNT_CACHE_TIMEOUT', 60))
+    return count
+
+
+async def acached_count(queryset, filters):
+    """Асинхронный вариант cached_count"""
+    key = count_cache_key(filters)
+    count = await cache.aget(key)
+    if count is None:
+        querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        count = sum([await qs.order_by().acount() for qs in querysets])
+        await cache.aset(key, count, getattr(settings, 'CASHFLOW_COUNT_CACHE_TIMEOUT', 60))
+    return count
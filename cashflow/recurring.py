@@ -0,0 +1,183 @@
+"""
+Регулярные операции: создание записей ДДС по шаблонам RecurringRecord.
+
+Даты повторений вычисляются правилами dateutil.rrule. Запись, созданная по
+шаблону, получает ключ идемпотентности recurring:<id шаблона>:<дата>, поэтому
+повторный запуск за тот же период не создаёт дубликатов, а новые записи всех
+шаблонов вставляются одним пакетом вместе с обновлением дневных итогов.
+"""
+import re
+from datetime import datetime, time, timedelta
+
+from dateutil.rrule import rrulestr
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from .bulk import insert_records
+from .models import ArchivedCashFlowRecord, CashFlowRecord, RecurringRecord, check_taxonomy
+
+
+KEY_PREFIX = 'recurring:'
+
+# Шаблонов между вызовами progress
+PROGRESS_STEP = 1000
+
+# Ключей и id в одном запросе: список ограничен числом параметров запроса
+QUERY_CHUNK_SIZE = 500
+
+# Шаблон создаёт не больше одной записи в день, поэтому правила чаще
+# ежедневного не допускаются
+SUBDAILY_FREQUENCIES = ('HOURLY', 'MINUTELY', 'SECONDLY')
+
+
+def parse_rule(rule, start_date):
+    """Правило повторения шаблона с первым повторением не раньше start_date"""
+    text = rule.strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[len('RRULE:'):]
+    if 'DTSTART' in text.upper():
+        raise ValueError('DTSTART is taken from the template start date')
+    frequencies = set(re.findall(r'FREQ\s*=\s*(\w+)', text.upper()))
+    if frequencies & set(SUBDAILY_FREQUENCIES):
+        raise ValueError('FREQ must be DAILY or less frequent')
+    try:
+        return rrulestr(text, dtstart=datetime.combine(start_date, time()))
+    except (TypeError, ValueError) as error:
+        raise ValueError(str(error) or 'invalid rule')
+
+
+def get_record_key(template_id, day):
+    """Ключ идемпотентности записи шаблона на дату"""
+    return f'{KEY_PREFIX}{template_id}:{day.isoformat()}'
+
+
+def get_occurrences(template, date_from, date_to):
+    """
+    Даты повторений шаблона в периоде [date_from, date_to] с учётом дат начала и окончания.
+
+    Несколько повторений в один день (например, BYHOUR) дают одну дату.
+    """
+    date_from = max(date_from, template.start_date)
+    if template.end_date:
+        date_to = min(date_to, template.end_date)
+    if date_from > date_to:
+        return []
+    rule = parse_rule(template.rule, template.start_date)
+    return sorted({
+        moment.date() for moment in rule.between(
+            datetime.combine(date_from, time()), datetime.combine(date_to, time.max), inc=True
+        )
+    })
+
+
+def pending_templates(date_to):
+    """Активные шаблоны, по которым записи созданы не по date_to"""
+    return RecurringRecord.objects.filter(is_active=True, start_date__lte=date_to).filter(
+        Q(materialized_until__isnull=True) | Q(materialized_until__lt=date_to)
+    ).filter(
+        # Шаблоны, закончившиеся до последнего запуска, больше не просматриваются
+        Q(end_date__isnull=True) | Q(materialized_until__isnull=True)
+        | Q(end_date__gt=F('materialized_until'))
+    )
+
+
+def existing_keys(keys):
+    """
+    Ключи из keys, записи по которым уже созданы.
+
+    Записи ищутся по ключу, а не по дате: пользователь мог перенести
+    созданную запись на другую дату. Ключи проверяются пакетами по
+    QUERY_CHUNK_SIZE; записи, перенесённые в архив, тоже считаются созданными.
+    """
+    keys = list(keys)
+    found = set()
+    for start in range(0, len(keys), QUERY_CHUNK_SIZE):
+        chunk = keys[start:start + QUERY_CHUNK_SIZE]
+        for model in (CashFlowRecord, ArchivedCashFlowRecord):
+            found.update(
+                model.objects.filter(idempotency_key__in=chunk).values_list('idempotency_key', flat=True)
+            )
+    return found
+
+
+def materialize_recurring(date_to, date_from=None, templates=None, dry_run=False, progress=None):
+    """
+    Создание записей ДДС по шаблонам регулярных операций по дату date_to.
+
+    Без date_from каждый шаблон продолжает со дня после materialized_until
+    (или с даты начала); с date_from период пересматривается заново, уже
+    созданные записи пропускаются по ключу идемпотентности. Шаблон, правило
+    или классификация которого некорректны, пропускается целиком.
+
+    Возвращает словарь с количеством просмотренных шаблонов, созданных и уже
+    существовавших записей и списком пропущенных шаблонов с причиной.
+    """
+    if templates is None:
+        templates = pending_templates(date_to)
+    templates = list(templates.order_by('pk'))
+
+    occurrences = []
+    invalid = []
+    for index, template in enumerate(templates, 1):
+        start = date_from
+        if start is None and template.materialized_until:
+            start = template.materialized_until + timedelta(days=1)
+        try:
+            check_taxonomy(template)
+            days = get_occurrences(template, start or template.start_date, date_to)
+        except (ValidationError, ValueError) as error:
+            invalid.append((template, '; '.join(getattr(error, 'messages', [str(error)]))))
+            continue
+        occurrences.extend((template, day) for day in days)
+        if progress and index % PROGRESS_STEP == 0:
+            progress(index)
+    if progress:
+        progress(len(templates))
+
+    result = {'templates': len(templates), 'created': 0, 'existing': 0, 'invalid': invalid}
+    if dry_run:
+        rows = new_rows(occurrences)
+        result.update(created=len(rows), existing=len(occurrences) - len(rows))
+        return result
+
+    # Параллельный запуск может успеть создать часть записей раньше:
+    # при нарушении уникальности ключей пакет повторяется
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                result.update(save_occurrences(templates, invalid, occurrences, date_to))
+            break
+        except IntegrityError:
+            if attempt:
+                raise
+    return result
+
+
+def new_rows(occurrences):
+    """Строки для insert_records по повторениям, записи которых ещё не созданы"""
+    keys = [get_record_key(template.pk, day) for template, day in occurrences]
+    existing = existing_keys(keys)
+    rows = []
+    for (template, day), key in zip(occurrences, keys):
+        if key in existing:
+            continue
+        rows.append((
+            day, template.status_id, template.type_id, template.category_id, template.subcategory_id,
+            template.amount, template.comment or template.name, key,
+        ))
+    return rows
+
+
+def save_occurrences(templates, invalid, occurrences, date_to):
+    """Вставка записей, которых ещё нет, и сдвиг materialized_until шаблонов"""
+    rows = new_rows(occurrences)
+    created = insert_records(rows, extra_columns=('idempotency_key',))
+
+    skipped = {template.pk for template, _ in invalid}
+    done = [template.pk for template in templates if template.pk not in skipped]
+    # Шаблоны обновляются пакетами: список id ограничен числом параметров запроса
+    for start in range(0, len(done), QUERY_CHUNK_SIZE):
+        RecurringRecord.objects.filter(pk__in=done[start:start + QUERY_CHUNK_SIZE]).filter(
+            Q(materialized_until__isnull=True) | Q(materialized_until__lt=date_to)
+        ).update(materialized_until=date_to)
+    return {'created': created, 'existing': len(occurrences) - len(rows)}
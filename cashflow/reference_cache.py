@@ -0,0 +1,137 @@
+import threading
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from .models import Status, Type, Category, Subcategory
+
+
+# Ключ версии справочников в общем кеше Django
+VERSION_CACHE_KEY = 'cashflow:reference_version'
+
+_lock = threading.Lock()
+_local = {'version': None, 'data': None}
+
+
+class ReferenceData:
+    """Снимок всех справочников: статусы и дерево тип → категории → подкатегории"""
+
+    def __init__(self, version, statuses, types, categories, subcategories):
+        self.version = version
+        self.statuses = statuses
+        self.types = types
+        self.categories = categories
+        self.subcategories = subcategories
+
+        self.statuses_by_id = {status.pk: status for status in self.statuses}
+        self.types_by_id = {type_obj.pk: type_obj for type_obj in self.types}
+        self.categories_by_id = {category.pk: category for category in self.categories}
+        self.subcategories_by_id = {subcategory.pk: subcategory for subcategory in self.subcategories}
+
+        self.categories_by_type = defaultdict(list)
+        for category in self.categories:
+            self.categories_by_type[category.type_id].append(category)
+        self.subcategories_by_category = defaultdict(list)
+        for subcategory in self.subcategories:
+            self.subcategories_by_category[subcategory.category_id].append(subcategory)
+
+        # Количество дочерних элементов для страницы справочников
+        for type_obj in self.types:
+            type_obj.category_count = len(self.categories_by_type.get(type_obj.pk, []))
+        for category in self.categories:
+            category.subcategory_count = len(self.subcategories_by_category.get(category.pk, []))
+
+    @staticmethod
+    def querysets():
+        return (
+            Status.objects.all(),
+            Type.objects.all(),
+            Category.objects.select_related('type'),
+            Subcategory.objects.select_related('category__type'),
+        )
+
+    @classmethod
+    def load(cls, version):
+        return cls(version, *(list(queryset) for queryset in cls.querysets()))
+
+    @classmethod
+    async def aload(cls, version):
+        return cls(version, *[[obj async for obj in queryset.aiterator()] for queryset in cls.querysets()])
+
+    def categories_for_type(self, type_id):
+        return self.categories_by_type.get(type_id, [])
+
+    def subcategories_for_category(self, category_id):
+        return self.subcategories_by_category.get(category_id, [])
+
+
+def get_reference_version():
+    """Текущая версия справочников, общая для всех процессов"""
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def get_reference_data():
+    """
+    Справочники из памяти процесса.
+
+    Снимок перестраивается только при смене версии в общем кеше, поэтому
+    обычный запрос обходится без обращений к базе за справочными данными.
+    """
+    version = get_reference_version()
+    data = _local['data']
+    if data is not None and _local['version'] == version:
+        return data
+    with _lock:
+        if _local['data'] is None or _local['version'] != version:
+            _local['data'] = ReferenceData.load(version)
+            _local['version'] = version
+        return _local['data']
+
+
+async def aget_reference_version():
+    """Асинхронный вариант get_reference_version"""
+    version = await cache.aget(VERSION_CACHE_KEY)
+    if version is None:
+        await cache.aadd(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = await cache.aget(VERSION_CACHE_KEY)
+    return version
+
+
+async def aget_reference_data():
+    """
+    Асинхронный вариант get_reference_data.
+
+    Снимок загружается асинхронным ORM без блокировки: одновременные запросы
+    могут загрузить его дважды, но не ждут друг друга в цикле событий.
+    """
+    version = await aget_reference_version()
+    data = _local['data']
+    if data is not None and _local['version'] == version:
+        return data
+    data = await ReferenceData.aload(version)
+    with _lock:
+        _local['data'] = data
+        _local['version'] = version
+    return data
+
+
+def invalidate_reference_data():
+    """
+    Сброс снимка справочников во всех процессах после фиксации транзакции.
+
+    Новая версия до фиксации позволила бы другому процессу сохранить под ней
+    снимок ещё не изменённых справочников.
+    """
+    transaction.on_commit(reset_reference_data)
+
+
+def reset_reference_data():
+    cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+    with _lock:
+        _local['data'] = None
+        _local['version'] = None
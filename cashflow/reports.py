@@ -0,0 +1,142 @@
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from .filters import FILTER_PARAMS, filter_records
+from .models import DailyRollup, RecurringRecord
+
+
+# Название типа операции, считающегося поступлением денежных средств
+INCOME_TYPE_NAME = 'Пополнение'
+
+# Максимальная ширина периода (в днях) для дневной и недельной детализации
+DAILY_BUCKETS_MAX_DAYS = 62
+WEEKLY_BUCKETS_MAX_DAYS = 366
+
+BUCKETS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def parse_date(value):
+    """Разбор даты из параметра фильтра; некорректные значения игнорируются"""
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def choose_bucket(date_from, date_to):
+    """Выбор детализации по ширине периода"""
+    if date_from is None or date_to is None:
+        return 'month'
+    days = (date_to - date_from).days
+    if days <= DAILY_BUCKETS_MAX_DAYS:
+        return 'day'
+    if days <= WEEKLY_BUCKETS_MAX_DAYS:
+        return 'week'
+    return 'month'
+
+
+def income_expense_sums():
+    """Условные суммы поступлений и списаний для агрегирующих запросов"""
+    income = Q(type__name=INCOME_TYPE_NAME)
+    return {
+        'income': Sum('total_amount', filter=income, default=Decimal('0')),
+        'expense': Sum('total_amount', filter=~income, default=Decimal('0')),
+    }
+
+
+def build_report(filters):
+    """
+    Отчёт по записям ДДС для фильтров главной страницы.
+
+    Все показатели считаются группирующими запросами к таблице дневных итогов
+    (DailyRollup), поэтому объём работы зависит от числа дней и разрезов
+    справочников, а не от числа записей.
+    """
+    # Дневные итоги не содержат комментариев, поэтому поиск в отчёте не учитывается
+    rollups = filter_records(
+        DailyRollup.objects.order_by(), {name: filters.get(name) for name in FILTER_PARAMS}
+    )
+
+    date_from = parse_date(filters.get('date_from'))
+    date_to = parse_date(filters.get('date_to'))
+    if date_from is None or date_to is None:
+        bounds = rollups.aggregate(first=Min('date'), last=Max('date'))
+        date_from = date_from or bounds['first']
+        date_to = date_to or bounds['last']
+    bucket = choose_bucket(date_from, date_to)
+
+    totals = rollups.aggregate(
+        record_count=Sum('record_count', default=0),
+        **income_expense_sums()
+    )
+    totals['net'] = totals['income'] - totals['expense']
+
+    periods = list(
+        rollups.annotate(period=BUCKETS[bucket]('date'))
+        .values('period')
+        .annotate(**income_expense_sums())
+        .order_by('period')
+    )
+    for row in periods:
+        row['net'] = row['income'] - row['expense']
+
+    categories = list(
+        rollups.values('type__name', 'category_id', 'category__name')
+        .annotate(total=Sum('total_amount'), record_count=Sum('record_count'))
+        .order_by('type__name', '-total')
+    )
+    for row in categories:
+        row['is_income'] = row['type__name'] == INCOME_TYPE_NAME
+
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'bucket': bucket,
+        'totals': totals,
+        'periods': periods,
+        'categories': categories,
+    }
+
+
+def reference_usage_counts():
+    """
+    Количество записей ДДС и шаблонов регулярных операций, ссылающихся на
+    каждый элемент справочников.
+
+    Считается группирующими запросами к дневным итогам и шаблонам; результат -
+    словари {id: количество} для статусов, типов, категорий и подкатегорий.
+    """
+    return count_reference_usage(row for queryset in usage_querysets() for row in queryset)
+
+
+async def areference_usage_counts():
+    """Асинхронный вариант reference_usage_counts"""
+    return count_reference_usage([
+        row for queryset in usage_querysets() async for row in queryset.aiterator()
+    ])
+
+
+def usage_querysets():
+    fields = ('status_id', 'type_id', 'category_id', 'subcategory_id')
+    return (
+        DailyRollup.objects.order_by().values(*fields).annotate(count=Sum('record_count')),
+        # Шаблон, как и запись, не даёт удалить элемент справочника (PROTECT)
+        RecurringRecord.objects.order_by().values(*fields).annotate(count=Count('id')),
+    )
+
+
+def count_reference_usage(rows):
+    usage = {name: Counter() for name in ('status', 'type', 'category', 'subcategory')}
+    for row in rows:
+        for name in usage:
+            usage[name][row[f'{name}_id']] += row['count']
+    return usage
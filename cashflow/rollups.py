@@ -0,0 +1,256 @@
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from .balances import clear_checkpoints, shift_checkpoints
+from .models import ArchivedCashFlowRecord, CashFlowRecord, DailyRollup
+
+
+# Поля записи ДДС, определяющие строку дневного итога
+BUCKET_FIELDS = ('date', 'status_id', 'type_id', 'category_id', 'subcategory_id')
+
+# Версия дневных итогов в общем кеше Django для кешей, построенных по итогам
+VERSION_CACHE_KEY = 'cashflow:rollups_version'
+
+
+def get_rollups_version():
+    """Текущая версия дневных итогов, общая для всех процессов"""
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def touch_rollups():
+    """Смена версии дневных итогов после фиксации транзакции, изменившей итоги"""
+    transaction.on_commit(lambda: cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None))
+
+
+def get_bucket(values):
+    """Ключ дневного итога из словаря значений записи"""
+    if any(values.get(name) is None for name in BUCKET_FIELDS):
+        return None
+    return tuple(values[name] for name in BUCKET_FIELDS)
+
+
+def get_record_state(record):
+    """Текущие ключ итога и сумма записи ДДС"""
+    values = {name: getattr(record, name) for name in BUCKET_FIELDS}
+    # Значение по умолчанию для даты - datetime, приводим к дате как при сохранении
+    values['date'] = CashFlowRecord._meta.get_field('date').to_python(values['date'])
+    amount = record.amount
+    if amount is not None and not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return get_bucket(values), amount
+
+
+def remember_state(record, state):
+    """Обновление запомненного состояния записи после сохранения"""
+    bucket, amount = state
+    if bucket is not None:
+        record._loaded_values = {'amount': amount, **dict(zip(BUCKET_FIELDS, bucket))}
+
+
+def get_loaded_state(record):
+    """
+    Ключ итога и сумма записи в том виде, в каком она хранится в базе.
+
+    Используются значения, запомненные при загрузке из базы; если часть полей
+    была отложена, значения дочитываются одним запросом.
+    """
+    loaded = getattr(record, '_loaded_values', None)
+    if loaded is None or 'amount' not in loaded or get_bucket(loaded) is None:
+        loaded = CashFlowRecord.objects.filter(pk=record.pk).values(
+            'amount', *BUCKET_FIELDS
+        ).first()
+        if loaded is None:
+            return None, None
+    return get_bucket(loaded), loaded['amount']
+
+
+def apply_delta(bucket, amount, count):
+    """Изменение одной строки дневного итога на заданные сумму и количество"""
+    lookup = dict(zip(BUCKET_FIELDS, bucket))
+    with transaction.atomic():
+        updated = DailyRollup.objects.filter(**lookup).update(
+            total_amount=F('total_amount') + amount,
+            record_count=F('record_count') + count,
+        )
+        if not updated and count > 0:
+            try:
+                with transaction.atomic():
+                    DailyRollup.objects.create(
+                        total_amount=amount, record_count=count, **lookup
+                    )
+            except IntegrityError:
+                # Строку параллельно создал другой процесс
+                DailyRollup.objects.filter(**lookup).update(
+                    total_amount=F('total_amount') + amount,
+                    record_count=F('record_count') + count,
+                )
+        if count < 0:
+            DailyRollup.objects.filter(record_count__lte=0, **lookup).delete()
+
+
+def apply_record_change(old_state, new_state):
+    """Перенос записи из одной строки итога в другую (создание, изменение, удаление)"""
+    old_bucket, old_amount = old_state
+    new_bucket, new_amount = new_state
+    if old_bucket == new_bucket:
+        if new_bucket is not None and old_amount != new_amount:
+            with transaction.atomic():
+                apply_delta(new_bucket, new_amount - old_amount, 0)
+                shift_checkpoints([(new_bucket, new_amount - old_amount)])
+                touch_rollups()
+        return
+    with transaction.atomic():
+        if old_bucket is not None:
+            apply_delta(old_bucket, -old_amount, -1)
+        if new_bucket is not None:
+            apply_delta(new_bucket, new_amount, 1)
+        shift_checkpoints([
+            (bucket, amount) for bucket, amount in ((old_bucket, -(old_amount or 0)), (new_bucket, new_amount))
+            if bucket is not None
+        ])
+        touch_rollups()
+
+
+def apply_records(rows, sign=1):
+    """
+    Пакетное обновление итогов для набора записей.
+
+    rows - словари со значениями BUCKET_FIELDS и amount (например, из values()).
+    Используется для массовых операций, которые не вызывают сигналы моделей.
+    """
+    totals = defaultdict(lambda: [Decimal('0'), 0])
+    for row in rows:
+        bucket = get_bucket(row)
+        totals[bucket][0] += sign * row['amount']
+        totals[bucket][1] += sign
+    apply_bucket_totals(totals)
+
+
+def apply_bucket_totals(totals):
+    """
+    Применение изменений к набору строк итогов фиксированным числом запросов.
+
+    totals - словарь {ключ итога: (сумма, количество)}. Прибавления выполняются
+    одним пакетным INSERT ... ON CONFLICT DO UPDATE, вычитания - пакетным
+    UPDATE с последующим удалением опустевших строк. Для баз без поддержки
+    ON CONFLICT строки обновляются по одной.
+    """
+    if not totals:
+        return
+    if not connection.features.supports_update_conflicts_with_target:
+        with transaction.atomic():
+            touch_rollups()
+            for bucket, (amount, count) in totals.items():
+                apply_delta(bucket, amount, count)
+            shift_checkpoints((bucket, amount) for bucket, (amount, count) in totals.items())
+        return
+
+    ops = connection.ops
+    table = ops.quote_name(DailyRollup._meta.db_table)
+    columns = [
+        ops.quote_name(DailyRollup._meta.get_field(name).column)
+        for name in BUCKET_FIELDS
+    ]
+    total_column = ops.quote_name('total_amount')
+    count_column = ops.quote_name('record_count')
+    # Первое поле ключа итога - дата, остальные - id справочников
+    adapt_date = ops.adapt_datefield_value
+    adapt_amount = ops.adapt_decimalfield_value
+    key_condition = ' AND '.join(f'{column} = %s' for column in columns)
+
+    additions = [
+        (*bucket, amount, count) for bucket, (amount, count) in totals.items() if count > 0
+    ]
+    removals = [
+        (amount, count, *bucket) for bucket, (amount, count) in totals.items() if count <= 0
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        touch_rollups()
+        if additions:
+            cursor.executemany(
+                f'INSERT INTO {table} ({", ".join(columns)}, {total_column}, {count_column}) '
+                f'VALUES ({", ".join(["%s"] * (len(columns) + 2))}) '
+                f'ON CONFLICT ({", ".join(columns)}) DO UPDATE SET '
+                f'{total_column} = {table}.{total_column} + excluded.{total_column}, '
+                f'{count_column} = {table}.{count_column} + excluded.{count_column}',
+                [
+                    (adapt_date(row[0]), *row[1:-2], adapt_amount(row[-2], 18, 2), row[-1])
+                    for row in additions
+                ],
+            )
+        if removals:
+            cursor.executemany(
+                f'UPDATE {table} SET {total_column} = {total_column} + %s, '
+                f'{count_column} = {count_column} + %s WHERE {key_condition}',
+                [
+                    (adapt_amount(row[0], 18, 2), row[1], adapt_date(row[2]), *row[3:])
+                    for row in removals
+                ],
+            )
+            DailyRollup.objects.filter(
+                date__in={row[2] for row in removals}, record_count__lte=0
+            ).delete()
+        shift_checkpoints((bucket, amount) for bucket, (amount, count) in totals.items())
+
+
+def group_records(model, date_from=None, date_to=None):
+    """Суммы и количества записей модели по ключам дневных итогов за период"""
+    records = model.objects.order_by()
+    if date_from:
+        records = records.filter(date__gte=date_from)
+    if date_to:
+        records = records.filter(date__lte=date_to)
+    return records.values(*BUCKET_FIELDS).annotate(total=Sum('amount'), count=Count('id'))
+
+
+def rebuild_rollups(date_from=None, date_to=None, batch_size=5000):
+    """Полный пересчёт дневных итогов за период одним агрегирующим запросом"""
+    rollups = DailyRollup.objects.all()
+    if date_from:
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(date__lte=date_to)
+
+    # Архивные записи входят в итоги наравне с записями ленты
+    archived = {
+        get_bucket(row): (row['total'], row['count'])
+        for row in group_records(ArchivedCashFlowRecord, date_from, date_to)
+    }
+
+    def iter_totals():
+        for row in group_records(CashFlowRecord, date_from, date_to).iterator(chunk_size=batch_size):
+            bucket = get_bucket(row)
+            total, count = archived.pop(bucket, (0, 0))
+            yield bucket, row['total'] + total, row['count'] + count
+        for bucket, (total, count) in archived.items():
+            yield bucket, total, count
+
+    created = 0
+    with transaction.atomic():
+        rollups.delete()
+        # Контрольные точки остатка после начала периода пересчитаются при запросе
+        clear_checkpoints(date_from)
+        touch_rollups()
+        batch = []
+        for bucket, total, count in iter_totals():
+            batch.append(DailyRollup(
+                total_amount=total,
+                record_count=count,
+                **dict(zip(BUCKET_FIELDS, bucket))
+            ))
+            if len(batch) >= batch_size:
+                DailyRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            DailyRollup.objects.bulk_create(batch)
+            created += len(batch)
+    return created
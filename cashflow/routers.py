@@ -0,0 +1,92 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+
+
+# Чтение с реплик включается только явно для представлений, которые
+# не записывают данные (лента, отчёты, выгрузки, API только для чтения)
+_use_replica = ContextVar('cashflow_use_replica', default=False)
+
+# Модели, которые можно читать с реплик; справочники и служебные таблицы
+# Django всегда читаются с основной базы
+REPLICA_MODELS = {'cashflowrecord', 'archivedcashflowrecord', 'dailyrollup', 'balancecheckpoint'}
+
+
+def get_replicas():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+@contextmanager
+def replica_reads():
+    """Чтение записей ДДС и итогов с реплик внутри блока"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Чтение с основной базы внутри блока (для расчётов, результат которых сохраняется)"""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_from_replica(view):
+    """Декоратор представления, которое только читает данные (синхронного или асинхронного)"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await view(request, *args, **kwargs)
+            # Асинхронный ORM выполняет запросы с копией контекста, поэтому флаг виден маршрутизатору
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def stream_from_replica(iterable):
+    """Потоковый ответ читается после выхода из представления, поэтому реплика включается снова"""
+    with replica_reads():
+        yield from iterable
+
+
+class ReplicaRouter:
+    """
+    Маршрутизация чтения на реплики.
+
+    Запись всегда идёт в основную базу; чтение записей ДДС и итогов - на
+    случайную реплику, если она настроена и чтение с реплик включено.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or model._meta.model_name not in REPLICA_MODELS:
+            return None
+        replicas = get_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,150 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+
+# Словарь PostgreSQL для поиска по комментариям (стемминг русских слов)
+SEARCH_CONFIG = 'russian'
+
+# Токенизатор FTS5: регистр и диакритика не учитываются, в том числе для кириллицы
+FTS_TOKENIZER = 'unicode61 remove_diacritics 2'
+
+# Порядок результатов поиска: релевантность, затем порядок ленты
+SEARCH_ORDERING = ('-search_rank', '-date', '-created_at', '-id')
+
+# Имена полнотекстовых таблиц SQLite, найденных в каждой базе
+_fts_tables = {}
+
+
+def fts_table(table):
+    """Имя таблицы FTS5 для таблицы записей"""
+    return f'{table}_fts'
+
+
+def install_fts(connection, table):
+    """
+    Таблица FTS5 с содержимым из таблицы записей и триггеры её синхронизации.
+
+    Триггеры срабатывают при любой записи в таблицу, в том числе при пакетном
+    импорте и массовых UPDATE/DELETE мимо ORM. Создание идемпотентно: SQLite
+    удаляет триггеры при пересоздании таблицы миграцией, и они восстанавливаются
+    после migrate вместе с перестроением индекса.
+    """
+    fts = fts_table(table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"comment, content='{table}', content_rowid='id', tokenize='{FTS_TOKENIZER}')"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, comment) VALUES (new.id, new.comment); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, comment) VALUES ('delete', old.id, old.comment); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF comment ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, comment) VALUES ('delete', old.id, old.comment); "
+            f"INSERT INTO {fts}(rowid, comment) VALUES (new.id, new.comment); END"
+        )
+        cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    _fts_tables.pop(connection.alias, None)
+
+
+def drop_fts(connection, table):
+    fts = fts_table(table)
+    with connection.cursor() as cursor:
+        for suffix in ('insert', 'delete', 'update'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+    _fts_tables.pop(connection.alias, None)
+
+
+def missing_fts_triggers(connection, table):
+    """Есть ли таблица FTS5 без полного набора триггеров"""
+    fts = fts_table(table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = %s)",
+            [fts, table],
+        )
+        names = {row[0] for row in cursor.fetchall()}
+    if fts not in names:
+        return False
+    return any(f'{fts}_{suffix}' not in names for suffix in ('insert', 'delete', 'update'))
+
+
+def has_fts_table(alias, table):
+    if alias not in _fts_tables:
+        _fts_tables[alias] = set(connections[alias].introspection.table_names())
+    return fts_table(table) in _fts_tables[alias]
+
+
+def fts_query(query):
+    """Запрос FTS5 из введённого текста: все слова, каждое как префикс"""
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_records(records, query):
+    """
+    Отбор записей, комментарий которых содержит все слова запроса.
+
+    SQLite использует таблицу FTS5, PostgreSQL - GIN-индекс по SearchVector;
+    без индекса поиск выполняется через LIKE.
+    """
+    vendor = connections[records.db].vendor
+    table = records.model._meta.db_table
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchVector
+
+        return records.alias(
+            search_document=SearchVector('comment', config=SEARCH_CONFIG)
+        ).filter(search_document=SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch'))
+
+    match = fts_query(query)
+    if vendor == 'sqlite' and match and has_fts_table(records.db, table):
+        fts = fts_table(table)
+        return records.filter(pk__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [match]))
+    return records.filter(comment__icontains=query)
+
+
+def rank_records(records, query):
+    """Релевантность записи запросу в поле search_rank (больше - лучше)"""
+    vendor = connections[records.db].vendor
+    table = records.model._meta.db_table
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        rank = SearchRank(
+            SearchVector('comment', config=SEARCH_CONFIG),
+            SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch'),
+        )
+        return records.annotate(search_rank=rank)
+
+    match = fts_query(query)
+    if vendor == 'sqlite' and match and has_fts_table(records.db, table):
+        fts = fts_table(table)
+        # Релевантность всех совпадений считается за один проход по FTS5:
+        # LIMIT не даёт SQLite подставить подзапрос в коррелированный и
+        # выполнять MATCH для каждой записи. bm25 отрицательна, и меньшее
+        # значение релевантнее
+        rank = RawSQL(
+            f'SELECT ranks.rank FROM (SELECT rowid, -bm25({fts}) AS rank FROM {fts} '
+            f'WHERE {fts} MATCH %s LIMIT -1) AS ranks WHERE ranks.rowid = "{table}"."id"',
+            [match],
+            output_field=FloatField(),
+        )
+        return records.annotate(search_rank=rank)
+    return records.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search_key(record):
+    """Значения порядка результатов поиска для объединения ленты и архива"""
+    return record.search_rank, record.date, record.created_at, record.pk
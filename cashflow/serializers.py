@@ -0,0 +1,96 @@
+from rest_framework import serializers
+from .models import Status, Type, Category, Subcategory, CashFlowRecord
+
+
+def get_requested_fields(request):
+    """Набор полей из параметра ?fields=id,date,amount (None - все поля)"""
+    if request is None:
+        return None
+    value = request.query_params.get('fields', '')
+    fields = {name.strip() for name in value.split(',') if name.strip()}
+    return fields or None
+
+
+class SparseFieldsMixin:
+    """
+    Выбор полей ответа параметром ?fields=.
+
+    related_fields связывает поля ответа со связями, которые нужно загрузить
+    через select_related, чтобы viewset не загружал лишние таблицы.
+    """
+
+    related_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = get_requested_fields(self.context.get('request'))
+        if requested and requested & set(self.fields):
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    @classmethod
+    def get_select_related(cls, request):
+        requested = get_requested_fields(request)
+        if requested and not requested & set(cls.Meta.fields):
+            requested = None
+        return sorted({
+            relation for name, relation in cls.related_fields.items()
+            if requested is None or name in requested
+        })
+
+
+class StatusSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Status
+        fields = ['id', 'name', 'description', 'created_at', 'updated_at']
+
+
+class TypeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Type
+        fields = ['id', 'name', 'description', 'created_at', 'updated_at']
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    type_name = serializers.CharField(source='type.name', read_only=True)
+
+    related_fields = {'type_name': 'type'}
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'type', 'type_name', 'description', 'created_at', 'updated_at']
+
+
+class SubcategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    type = serializers.IntegerField(source='category.type_id', read_only=True)
+
+    related_fields = {'category_name': 'category', 'type': 'category'}
+
+    class Meta:
+        model = Subcategory
+        fields = ['id', 'name', 'category', 'category_name', 'type', 'description', 'created_at', 'updated_at']
+
+
+class CashFlowRecordSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    status_name = serializers.CharField(source='status.name', read_only=True)
+    type_name = serializers.CharField(source='type.name', read_only=True)
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    subcategory_name = serializers.CharField(source='subcategory.name', read_only=True)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    related_fields = {
+        'status_name': 'status',
+        'type_name': 'type',
+        'category_name': 'category',
+        'subcategory_name': 'subcategory',
+    }
+
+    class Meta:
+        model = CashFlowRecord
+        fields = [
+            'id', 'date',
+            'status', 'status_name', 'type', 'type_name',
+            'category', 'category_name', 'subcategory', 'subcategory_name',
+            'amount', 'comment', 'idempotency_key', 'created_at', 'updated_at',
+        ]
@@ -0,0 +1,95 @@
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate
+from django.dispatch import receiver
+from .balances import clear_checkpoints
+from .models import Status, Type, Category, Subcategory, CashFlowRecord, ArchivedCashFlowRecord
+from .reference_cache import invalidate_reference_data
+from .rollups import apply_record_change, get_loaded_state, get_record_state, remember_state
+from .integrity import TAXONOMY_MIGRATION, install_taxonomy_triggers, missing_taxonomy_triggers
+from .search import install_fts, missing_fts_triggers
+from .sqlite_profile import apply_sqlite_pragmas
+
+
+EMPTY_STATE = (None, None)
+
+
+@receiver(pre_save, sender=CashFlowRecord)
+def remember_record_state(sender, instance, raw=False, **kwargs):
+    """Запоминание состояния записи в базе до сохранения"""
+    if raw or instance._state.adding or instance.pk is None:
+        instance._rollup_previous = EMPTY_STATE
+    else:
+        instance._rollup_previous = get_loaded_state(instance)
+
+
+@receiver(post_save, sender=CashFlowRecord)
+def update_rollups_on_save(sender, instance, raw=False, **kwargs):
+    """Перенос записи в актуальную строку дневного итога"""
+    if raw:
+        return
+    new_state = get_record_state(instance)
+    apply_record_change(getattr(instance, '_rollup_previous', EMPTY_STATE), new_state)
+    remember_state(instance, new_state)
+
+
+@receiver(pre_delete, sender=CashFlowRecord)
+def remember_deleted_record_state(sender, instance, **kwargs):
+    """Запоминание состояния удаляемой записи, пока она ещё есть в базе"""
+    instance._rollup_previous = get_loaded_state(instance)
+
+
+@receiver(post_delete, sender=CashFlowRecord)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    """Исключение удалённой записи из дневного итога"""
+    apply_record_change(getattr(instance, '_rollup_previous', EMPTY_STATE), EMPTY_STATE)
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_save, sender=Type)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Status)
+@receiver(post_delete, sender=Type)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Subcategory)
+def reset_reference_cache(sender, **kwargs):
+    """Сброс кеша справочников при любом изменении справочника"""
+    invalidate_reference_data()
+
+
+@receiver(post_save, sender=Type)
+@receiver(post_delete, sender=Type)
+def reset_balance_checkpoints(sender, **kwargs):
+    """Пересчёт остатков после изменения типов: поступлением считается тип по названию"""
+    clear_checkpoints()
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using='default', **kwargs):
+    """Восстановление триггеров поиска, удалённых при пересоздании таблицы миграцией SQLite"""
+    if sender.name != 'cashflow':
+        return
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    for model in (CashFlowRecord, ArchivedCashFlowRecord):
+        if missing_fts_triggers(connection, model._meta.db_table):
+            install_fts(connection, model._meta.db_table)
+
+
+@receiver(post_migrate)
+def restore_taxonomy_triggers(sender, apps, using='default', **kwargs):
+    """Восстановление триггеров согласованности классификации после пересоздания таблиц SQLite"""
+    if sender.name != 'cashflow':
+        return
+    connection = connections[using]
+    if TAXONOMY_MIGRATION not in MigrationRecorder(connection).applied_migrations():
+        return
+    if missing_taxonomy_triggers(connection, apps):
+        install_taxonomy_triggers(connection, apps)
+
+
+# Профиль производительности SQLite для каждого нового соединения
+connection_created.connect(apply_sqlite_pragmas, dispatch_uid='cashflow_sqlite_pragmas')
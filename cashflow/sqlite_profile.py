@@ -0,0 +1,34 @@
+from django.conf import settings
+
+
+# Профиль SQLite для однонодовых установок: WAL позволяет читать во время
+# записи, busy_timeout - ждать блокировку вместо ошибки "database is locked"
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 134217728,
+    'cache_size': -20000,
+    'temp_store': 'memory',
+}
+
+
+def get_sqlite_pragmas():
+    """PRAGMA, применяемые к каждому новому соединению SQLite ({} - не применять)"""
+    return getattr(settings, 'CASHFLOW_SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Настройка нового соединения SQLite (обработчик сигнала connection_created)"""
+    if connection.vendor != 'sqlite':
+        return
+    statements = pragma_statements(get_sqlite_pragmas())
+    if not statements:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
@@ -1,3 +1,674 @@
-from django.test import TestCase
+import io
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .archive import archive_records
+from .bulk import delete_records, insert_records, update_records
+from .filters import clean_record_filters, filter_records, get_record_filters
+from .importers import ImportFormatError, RecordImporter, read_file
+from .ingest import ingest_records
+from .jobs import claim_job, enqueue
+from .models import (
+    ArchivedCashFlowRecord, CashFlowRecord, Category, DailyRollup, Job, RecurringRecord, Status,
+    Subcategory, Type,
+)
+from .pagination import AsyncPaginator, KeysetPaginator, MergedRecords, keyset_key
+from .recurring import get_record_key, materialize_recurring, parse_rule
+from .reference_cache import get_reference_data, get_reference_version
+from .reports import areference_usage_counts, reference_usage_counts
+from .rollups import get_bucket, get_rollups_version, group_records
+from .search import search_records
+from .views import index_records
+
+
+# Кеш одного процесса: тесты не трогают общий кеш из настроек
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReferenceDataTestCase(TestCase):
+    """Справочники для записей ДДС и чистый кеш в каждом тесте"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.business = Status.objects.create(name='Тест: бизнес')
+        cls.personal = Status.objects.create(name='Тест: личное')
+        cls.expense = Type.objects.create(name='Тест: списание')
+        cls.category = Category.objects.create(name='Тест: офис', type=cls.expense)
+        cls.rent = Subcategory.objects.create(name='Аренда', category=cls.category)
+        cls.supplies = Subcategory.objects.create(name='Канцелярия', category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_record(self, day, amount, subcategory=None, status=None):
+        return CashFlowRecord.objects.create(
+            date=day,
+            status=status or self.business,
+            type=self.expense,
+            category=self.category,
+            subcategory=subcategory or self.rent,
+            amount=Decimal(amount),
+        )
+
+    def assertRollupsMatchRecords(self):
+        expected = {}
+        for model in (CashFlowRecord, ArchivedCashFlowRecord):
+            for row in group_records(model):
+                total, count = expected.get(get_bucket(row), (Decimal('0'), 0))
+                expected[get_bucket(row)] = (total + row['total'], count + row['count'])
+        actual = {
+            get_bucket(row): (row['total_amount'], row['record_count'])
+            for row in DailyRollup.objects.values(
+                'date', 'status_id', 'type_id', 'category_id', 'subcategory_id', 'total_amount', 'record_count'
+            )
+        }
+        self.assertEqual(actual, expected)
+
+
+class RollupConsistencyTests(ReferenceDataTestCase):
+    """Дневные итоги совпадают с записями ленты и архива после любых изменений"""
+
+    def test_save_moves_record_between_rollups(self):
+        record = self.create_record(date(2025, 1, 10), '100.00')
+        self.create_record(date(2025, 1, 10), '50.00')
+        self.assertRollupsMatchRecords()
+
+        record.amount = Decimal('120.00')
+        record.save()
+        self.assertRollupsMatchRecords()
+
+        record.date = date(2025, 1, 11)
+        record.subcategory = self.supplies
+        record.save()
+        self.assertRollupsMatchRecords()
+        self.assertEqual(DailyRollup.objects.count(), 2)
+
+    def test_delete_removes_empty_rollup(self):
+        record = self.create_record(date(2025, 1, 10), '100.00')
+        other = self.create_record(date(2025, 1, 12), '40.00')
+        record.delete()
+        self.assertRollupsMatchRecords()
+        self.assertEqual(list(DailyRollup.objects.values_list('date', flat=True)), [other.date])
+
+    def test_insert_records(self):
+        self.create_record(date(2025, 1, 10), '100.00')
+        rows = [
+            (date(2025, 1, 10), self.business.pk, self.expense.pk, self.category.pk, self.rent.pk,
+             Decimal('10.00'), ''),
+            (date(2025, 1, 11), self.personal.pk, self.expense.pk, self.category.pk, self.supplies.pk,
+             Decimal('5.50'), 'пакет'),
+        ]
+        self.assertEqual(insert_records(rows), 2)
+        self.assertRollupsMatchRecords()
+
+    def test_bulk_update(self):
+        for day in (10, 10, 11):
+            self.create_record(date(2025, 1, day), '30.00')
+        self.create_record(date(2025, 1, 10), '70.00', subcategory=self.supplies)
+
+        updated = update_records(
+            CashFlowRecord.objects.filter(subcategory=self.rent), status_id=self.personal.pk,
+        )
+        self.assertEqual(updated, 3)
+        self.assertRollupsMatchRecords()
+
+        update_records(CashFlowRecord.objects.filter(date=date(2025, 1, 10)), subcategory_id=self.rent.pk)
+        self.assertRollupsMatchRecords()
+
+    def test_bulk_delete(self):
+        for day in (10, 10, 11, 12):
+            self.create_record(date(2025, 1, day), '25.00')
+        deleted = delete_records(CashFlowRecord.objects.filter(date__lte=date(2025, 1, 11)))
+        self.assertEqual(deleted, 3)
+        self.assertRollupsMatchRecords()
+        self.assertEqual(DailyRollup.objects.count(), 1)
+
+    def test_archive_keeps_rollups(self):
+        for day in (1, 15, 31):
+            self.create_record(date(2024, 12, day), '10.00')
+        self.create_record(date(2025, 1, 10), '20.00')
+        rollups = list(DailyRollup.objects.order_by('date').values_list('date', 'total_amount', 'record_count'))
+
+        self.assertEqual(archive_records(date(2025, 1, 1), batch_size=2), 3)
+        self.assertEqual(ArchivedCashFlowRecord.objects.count(), 3)
+        self.assertRollupsMatchRecords()
+        self.assertEqual(
+            list(DailyRollup.objects.order_by('date').values_list('date', 'total_amount', 'record_count')),
+            rollups,
+        )
+
+    def test_archive_moves_only_copied_records(self):
+        first = self.create_record(date(2024, 12, 1), '10.00')
+        moved = self.create_record(date(2025, 2, 1), '20.00')
+        last = self.create_record(date(2024, 12, 2), '30.00')
+        bulk_create = ArchivedCashFlowRecord.objects.bulk_create
+
+        def backdate_during_copy(objs, *args, **kwargs):
+            # Дату записи из диапазона id пакета параллельно переносят в архивный период
+            CashFlowRecord.objects.filter(pk=moved.pk).update(date=date(2024, 12, 15))
+            return bulk_create(objs, *args, **kwargs)
+
+        with mock.patch.object(
+            ArchivedCashFlowRecord.objects, 'bulk_create', side_effect=backdate_during_copy,
+        ):
+            self.assertEqual(archive_records(date(2025, 1, 1), batch_size=2), 3)
+        self.assertFalse(CashFlowRecord.objects.exists())
+        self.assertEqual(
+            set(ArchivedCashFlowRecord.objects.values_list('pk', flat=True)), {first.pk, moved.pk, last.pk},
+        )
+
+    def test_bulk_delete_by_search(self):
+        for comment in ('аренда январь', 'канцелярия', 'аренда февраль'):
+            record = self.create_record(date(2025, 1, 10), '15.00')
+            CashFlowRecord.objects.filter(pk=record.pk).update(comment=comment)
+        self.assertEqual(delete_records(filter_records(CashFlowRecord.objects.all(), {'q': 'аренда'})), 2)
+        self.assertEqual(list(CashFlowRecord.objects.values_list('comment', flat=True)), ['канцелярия'])
+        self.assertRollupsMatchRecords()
+
+    def test_version_changes_after_commit(self):
+        version = get_rollups_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            record = self.create_record(date(2025, 1, 10), '100.00')
+        changed = get_rollups_version()
+        self.assertNotEqual(changed, version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_records(CashFlowRecord.objects.filter(pk=record.pk))
+        self.assertNotEqual(get_rollups_version(), changed)
+
+
+class IngestTests(ReferenceDataTestCase):
+    """Пакетная загрузка: повтор ключа возвращает существующую запись"""
+
+    def build_item(self, key=None, amount='10.00', **values):
+        item = {
+            'date': '2025-01-10', 'status': self.business.name, 'type': self.expense.name,
+            'category': self.category.name, 'subcategory': self.rent.name, 'amount': amount,
+        }
+        if key:
+            item['idempotency_key'] = key
+        item.update(values)
+        return item
+
+    def test_repeated_batch_creates_nothing(self):
+        items = [self.build_item('k-1'), self.build_item('k-2', amount='20.00')]
+        results = ingest_records(items)
+        self.assertEqual([result['status'] for result in results], ['created', 'created'])
+        rollups = list(DailyRollup.objects.values_list('total_amount', 'record_count'))
+
+        repeated = ingest_records(items)
+        self.assertEqual([result['status'] for result in repeated], ['duplicate', 'duplicate'])
+        self.assertEqual([result['id'] for result in repeated], [result['id'] for result in results])
+        self.assertEqual(CashFlowRecord.objects.count(), 2)
+        self.assertEqual(list(DailyRollup.objects.values_list('total_amount', 'record_count')), rollups)
+        self.assertRollupsMatchRecords()
+
+    def test_key_repeated_within_batch(self):
+        results = ingest_records([self.build_item('k-1'), self.build_item('k-1', amount='99.00')])
+        self.assertEqual([result['status'] for result in results], ['created', 'duplicate'])
+        self.assertEqual(results[1]['id'], results[0]['id'])
+        self.assertEqual(list(CashFlowRecord.objects.values_list('amount', flat=True)), [Decimal('10.00')])
+        self.assertRollupsMatchRecords()
+
+    def test_records_without_key_are_always_created(self):
+        ingest_records([self.build_item(), self.build_item()])
+        ingest_records([self.build_item()])
+        self.assertEqual(CashFlowRecord.objects.count(), 3)
+        self.assertRollupsMatchRecords()
+
+    def test_archived_key_is_duplicate(self):
+        created = ingest_records([self.build_item('k-1', date='2024-12-10')])[0]
+        archive_records(date(2025, 1, 1))
+        result = ingest_records([self.build_item('k-1', date='2024-12-10')])[0]
+        self.assertEqual(result, {'index': 0, 'status': 'duplicate', 'id': created['id']})
+        self.assertFalse(CashFlowRecord.objects.exists())
+        self.assertRollupsMatchRecords()
+
+    def test_invalid_items_are_reported(self):
+        results = ingest_records([
+            self.build_item('k-1'),
+            self.build_item('k-2', subcategory='Нет такой'),
+            'не запись',
+            self.build_item('x' * 101),
+        ])
+        self.assertEqual([result['status'] for result in results], ['created', 'error', 'error', 'error'])
+        self.assertEqual(results[1]['errors'], ['подкатегория: значение «Нет такой» не найдено'])
+        self.assertEqual(CashFlowRecord.objects.count(), 1)
+        self.assertRollupsMatchRecords()
+
+    def test_batch_api(self):
+        url = reverse('cashflow:api-record-batch')
+        items = [self.build_item('k-1'), self.build_item(amount='0')]
+        response = self.client.post(url, {'records': items}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['created'], response.json()['failed']), (1, 1))
+
+        response = self.client.post(url, items[:1], content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['duplicates'], 1)
+
+
+class ImportTests(ReferenceDataTestCase):
+    """Импорт файла: корректные строки сохраняются, ошибочные попадают в отчёт"""
+
+    def read(self, text, name='records.csv'):
+        return read_file(io.BytesIO(text.encode('utf-8')), name)
+
+    def test_valid_and_invalid_lines(self):
+        income = Type.objects.create(name='Тест: поступление')
+        Category.objects.create(name='Тест: продажи', type=income)
+        text = (
+            'Дата;Статус;Тип;Категория;Подкатегория;Сумма;Комментарий\n'
+            f'10.01.2025;{self.business.name};{self.expense.name};{self.category.name};аренда;1 000,50;январь\n'
+            f'2025-01-11;{self.personal.pk};{self.expense.pk};{self.category.pk};{self.supplies.pk};20;\n'
+            f'2025-02-30;{self.business.name};{self.expense.name};{self.category.name};Аренда;10;\n'
+            f'2025-01-12;{self.business.name};{self.expense.name};Тест: продажи;Аренда;10;\n'
+            f'2025-01-12;{self.business.name};{self.expense.name};{self.category.name};Аренда;abc;\n'
+            ';;;;;;\n'
+            f'2025-01-12;{self.business.name};{self.expense.name};{self.category.name};Аренда;0;\n'
+        )
+        result = RecordImporter(batch_size=1).run(self.read(text))
+
+        self.assertEqual((result.processed, result.created), (6, 2))
+        self.assertEqual(result.errors, [
+            (4, 'дата: «2025-02-30» не является датой'),
+            (5, 'категория: значение «Тест: продажи» не найдено'),
+            (6, 'сумма: «abc» не является числом'),
+            (8, 'сумма: 0.00 вне допустимого диапазона (0.01 - 9999999999.99)'),
+        ])
+        self.assertEqual(
+            list(CashFlowRecord.objects.order_by('date').values_list('date', 'subcategory', 'amount', 'comment')),
+            [
+                (date(2025, 1, 10), self.rent.pk, Decimal('1000.50'), 'январь'),
+                (date(2025, 1, 11), self.supplies.pk, Decimal('20.00'), ''),
+            ],
+        )
+        self.assertRollupsMatchRecords()
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(ImportFormatError, 'Нет обязательных колонок: сумма (amount)'):
+            list(self.read('date,status,type,category,subcategory\n'))
+
+    def test_unsupported_format(self):
+        with self.assertRaisesMessage(ImportFormatError, 'Неподдерживаемый формат файла: .json'):
+            self.read('[]', name='records.json')
+
+    def test_upload_page(self):
+        upload = SimpleUploadedFile('records.csv', (
+            'date,status,type,category,subcategory,amount\n'
+            f'2025-01-10,{self.business.name},{self.expense.name},{self.category.name},Аренда,15\n'
+            f'2025-01-10,{self.business.name},{self.expense.name},{self.category.name},Нет такой,15\n'
+        ).encode('utf-8'))
+        response = self.client.post(reverse('cashflow:record_import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Импортировано записей: 1')
+        self.assertContains(response, 'Пропущено строк с ошибками: 1')
+        self.assertEqual(CashFlowRecord.objects.count(), 1)
+        self.assertRollupsMatchRecords()
+
+
+class ArchivePaginationTests(ReferenceDataTestCase):
+    """Страницы ленты вместе с архивом идут по порядку без пропусков и повторов"""
+
+    def setUp(self):
+        super().setUp()
+        for day in (3, 3, 3, 10, 20):
+            self.create_record(date(2024, 12, day), '10.00')
+        archive_records(date(2025, 1, 1))
+        for day in (5, 5, 15):
+            self.create_record(date(2025, 1, day), '20.00')
+        # Запись за архивный период, добавленная после переноса, остаётся в ленте
+        self.create_record(date(2024, 12, 10), '30.00')
+        # Одинаковое время создания: порядок внутри дня задаёт id
+        created_at = timezone.now()
+        for model in (CashFlowRecord, ArchivedCashFlowRecord):
+            model.objects.filter(date__in=(date(2024, 12, 3), date(2025, 1, 5))).update(created_at=created_at)
+        self.querysets = [CashFlowRecord.objects.all(), ArchivedCashFlowRecord.objects.all()]
+        rows = [row for queryset in self.querysets for row in queryset]
+        self.expected = [row.pk for row in sorted(rows, key=keyset_key, reverse=True)]
+
+    def test_keyset_pages(self):
+        paginator = KeysetPaginator(self.querysets, 3)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([record.pk for page in pages for record in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 3])
+        self.assertFalse(pages[0].has_previous)
+
+        # Обратный проход по курсорам «назад» возвращает те же страницы
+        page = pages[-1]
+        for expected_page in reversed(pages[:-1]):
+            page = paginator.get_page(page.previous_cursor)
+            self.assertEqual([record.pk for record in page], [record.pk for record in expected_page])
+        self.assertFalse(page.has_previous)
+
+    def test_async_keyset_pages(self):
+        paginator = KeysetPaginator(self.querysets, 4)
+        first = async_to_sync(paginator.aget_page)()
+        second = async_to_sync(paginator.aget_page)(first.next_cursor)
+        self.assertEqual([record.pk for record in [*first, *second]], self.expected[:8])
+
+    def test_merged_records_pages(self):
+        paginator = Paginator(MergedRecords(self.querysets), 4)
+        self.assertEqual(paginator.count, 9)
+        pages = [paginator.page(number) for number in paginator.page_range]
+        self.assertEqual([record.pk for page in pages for record in page], self.expected)
+
+        async_paginator = AsyncPaginator(MergedRecords(self.querysets), 4)
+        page = async_to_sync(async_paginator.aget_page)(3)
+        self.assertEqual([record.pk for record in page], self.expected[8:])
+
+    def test_api_pages(self):
+        url = reverse('cashflow:api-record-list')
+        params = {'page_size': 2, 'fields': 'id'}
+        pages = []
+        while True:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json())
+            if not pages[-1]['next']:
+                break
+            url, params = pages[-1]['next'], None
+        self.assertEqual([row['id'] for page in pages for row in page['results']], self.expected)
+
+        # Период после границы архива читает только ленту
+        response = self.client.get(reverse('cashflow:api-record-list'), {'date_from': '2025-01-01', 'fields': 'id'})
+        self.assertEqual([row['id'] for row in response.json()['results']], self.expected[:3])
+
+
+class SearchTests(ReferenceDataTestCase):
+    """Полнотекстовый поиск по комментариям и постраничный вывод результатов"""
+
+    def create_records(self, day, comments):
+        insert_records([
+            (day, self.business.pk, self.expense.pk, self.category.pk, self.rent.pk, Decimal('10.00'), comment)
+            for comment in comments
+        ])
+
+    def search(self, query, model=CashFlowRecord):
+        return sorted(search_records(model.objects.all(), query).values_list('comment', flat=True))
+
+    def test_words_match_as_prefixes(self):
+        self.create_records(date(2025, 1, 10), ['Аренда офиса', 'аренда склада', 'Канцелярия для офиса'])
+        self.assertEqual(self.search('АРЕНД'), ['Аренда офиса', 'аренда склада'])
+        self.assertEqual(self.search('офис аренда'), ['Аренда офиса'])
+        self.assertEqual(self.search('склад офис'), [])
+
+        # Индекс следует за изменениями в обход ORM
+        CashFlowRecord.objects.filter(comment='аренда склада').update(comment='склад')
+        self.assertEqual(self.search('аренда'), ['Аренда офиса'])
+        delete_records(CashFlowRecord.objects.filter(comment='Аренда офиса'))
+        self.assertEqual(self.search('аренда'), [])
+
+    def test_results_are_ranked(self):
+        # Более релевантная запись выше более поздней
+        long_comment = 'аренда и ещё много других слов в комментарии'
+        self.create_records(date(2025, 1, 10), [long_comment])
+        self.create_records(date(2025, 1, 5), ['аренда аренда'])
+        records = index_records([CashFlowRecord.objects.all()], 'аренда')
+        self.assertEqual([record.comment for record in records], ['аренда аренда', long_comment])
+
+    def test_live_results_are_paged_in_sql(self):
+        self.create_records(date(2025, 1, 10), [f'аренда {number}' for number in range(5)])
+        records = index_records([CashFlowRecord.objects.all()], 'аренда')
+        self.assertIsInstance(records, QuerySet)
+        with CaptureQueriesContext(connection) as queries:
+            page = Paginator(records, 2).page(2)
+            self.assertEqual(len(page), 2)
+        self.assertIn('LIMIT 2 OFFSET 2', queries[-1]['sql'])
+
+    def test_pages_include_archive(self):
+        self.create_records(date(2024, 12, 10), [f'аренда декабрь {number}' for number in range(15)])
+        archive_records(date(2025, 1, 1))
+        self.create_records(date(2025, 1, 10), [f'аренда январь {number}' for number in range(10)])
+        self.create_records(date(2025, 1, 10), ['канцелярия'])
+
+        url = reverse('cashflow:index')
+        first = self.client.get(url, {'q': 'аренда'}).context['page_obj']
+        second = self.client.get(url, {'q': 'аренда', 'page': 2}).context['page_obj']
+        self.assertEqual(first.paginator.count, 25)
+        comments = [record.comment for page in (first, second) for record in page]
+        self.assertEqual(len(comments), 25)
+        self.assertEqual(len(set(comments)), 25)
+        self.assertTrue(all(comment.startswith('аренда') for comment in comments))
+
+        # Период после границы архива ищется только в ленте
+        page = self.client.get(url, {'q': 'аренда', 'date_from': '2025-01-01'}).context['page_obj']
+        self.assertIsInstance(page.paginator.object_list, QuerySet)
+        self.assertEqual(page.paginator.count, 10)
+
+
+class RecordFilterTests(ReferenceDataTestCase):
+    """Некорректные параметры фильтров не доходят до запросов к базе"""
+
+    def test_clean_record_filters(self):
+        filters, errors = clean_record_filters(get_record_filters(QueryDict(
+            'date_from=bad&date_to=2025-01-31&status=abc&type=99999999999999999999&category=3&subcategory=%C2%B2'
+        )))
+        self.assertEqual(
+            {name: filters[name] for name in ('date_from', 'date_to', 'status', 'type', 'category', 'subcategory')},
+            {'date_from': None, 'date_to': '2025-01-31', 'status': None, 'type': None, 'category': '3',
+             'subcategory': None},
+        )
+        self.assertEqual(len(errors), 4)
+
+    def test_pages_ignore_invalid_filters(self):
+        self.create_record(date(2025, 1, 10), '100.00')
+        for url in ('cashflow:index', 'cashflow:report'):
+            response = self.client.get(reverse(url), {'status': 'abc', 'date_from': '2025-02-30'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['messages']), 2)
+            self.assertIsNone(response.context['current_filters']['status'])
+
+    def test_bulk_action_refuses_invalid_filters(self):
+        self.create_record(date(2025, 1, 10), '100.00')
+        response = self.client.post(reverse('cashflow:record_bulk'), {
+            'scope': 'filtered', 'filter_query': 'status=abc', 'action': 'delete',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CashFlowRecord.objects.count(), 1)
+
+
+class ForecastFilterTests(ReferenceDataTestCase):
+    """Некорректные фильтры прогноза: предупреждение на странице и 400 в API"""
+
+    def test_page_ignores_invalid_filters(self):
+        response = self.client.get(reverse('cashflow:forecast'), {'status': 'abc', 'months': '3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['messages']), 1)
+        self.assertIsNone(response.context['current_filters']['status'])
+
+    def test_api_rejects_invalid_filters(self):
+        response = self.client.get(reverse('cashflow:api-forecast'), {
+            'status': 'abc', 'type': '99999999999999999999', 'date_from': 'bad', 'months': '0',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'status', 'type', 'date_from', 'months'})
+
+    def test_api_accepts_valid_filters(self):
+        self.create_record(date(2025, 1, 10), '100.00')
+        response = self.client.get(reverse('cashflow:api-forecast'), {
+            'category': str(self.category.pk), 'date_to': '2025-06-30', 'months': '2',
+        })
+        # Без numpy прогноз недоступен, но фильтры всё равно принимаются
+        self.assertIn(response.status_code, (200, 501))
+        if response.status_code == 200:
+            self.assertEqual(response.json()['months'], ['2025-07-01', '2025-08-01'])
+
+
+class ReferenceCacheTests(ReferenceDataTestCase):
+    """Снимок справочников обновляется после фиксации изменений"""
+
+    def test_version_changes_after_commit(self):
+        version = get_reference_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Category.objects.create(name='Тест: транспорт', type=self.expense)
+            # До фиксации другие процессы продолжают использовать прежний снимок
+            self.assertEqual(get_reference_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_reference_version(), version)
+
+    def test_snapshot_contains_committed_changes(self):
+        get_reference_data()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.supplies.name = 'Канцтовары'
+            self.supplies.save()
+            self.personal.delete()
+        reference = get_reference_data()
+        self.assertEqual(reference.subcategories_by_id[self.supplies.pk].name, 'Канцтовары')
+        self.assertNotIn(self.personal.pk, reference.statuses_by_id)
+
+    def test_rolled_back_change_keeps_version(self):
+        version = get_reference_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Status.objects.create(name='Тест: отменённый')
+                raise RuntimeError
+        self.assertEqual(get_reference_version(), version)
+
+
+class RecurringRecordTests(ReferenceDataTestCase):
+    """Создание записей ДДС по шаблонам регулярных операций"""
+
+    def create_template(self, rule, start_date=date(2025, 1, 1)):
+        return RecurringRecord.objects.create(
+            name='Аренда офиса',
+            status=self.business,
+            type=self.expense,
+            category=self.category,
+            subcategory=self.rent,
+            amount=Decimal('1000.00'),
+            rule=rule,
+            start_date=start_date,
+        )
+
+    def test_subdaily_rules_are_rejected(self):
+        for rule in ('FREQ=HOURLY', 'RRULE:FREQ=MINUTELY;INTERVAL=30', 'FREQ=SECONDLY'):
+            with self.assertRaises(ValueError):
+                parse_rule(rule, date(2025, 1, 1))
+        template = RecurringRecord(
+            name='Каждый час', status=self.business, type=self.expense, category=self.category,
+            subcategory=self.rent, amount=Decimal('1.00'), rule='FREQ=HOURLY', start_date=date(2025, 1, 1),
+        )
+        with self.assertRaises(ValidationError) as context:
+            template.full_clean()
+        self.assertIn('rule', context.exception.message_dict)
+
+    def test_subdaily_template_is_skipped(self):
+        # Шаблон, сохранённый до проверки частоты, не останавливает остальные
+        hourly = self.create_template('FREQ=HOURLY')
+        monthly = self.create_template('FREQ=MONTHLY;BYMONTHDAY=5')
+        result = materialize_recurring(date(2025, 3, 31))
+        self.assertEqual(result['created'], 3)
+        self.assertEqual([template for template, _ in result['invalid']], [hourly])
+        self.assertEqual(
+            set(CashFlowRecord.objects.values_list('idempotency_key', flat=True)),
+            {get_record_key(monthly.pk, date(2025, month, 5)) for month in (1, 2, 3)},
+        )
+
+    def test_several_occurrences_a_day_create_one_record(self):
+        template = self.create_template('FREQ=DAILY;BYHOUR=9,18')
+        result = materialize_recurring(date(2025, 1, 3))
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(
+            list(CashFlowRecord.objects.order_by('date').values_list('date', flat=True)),
+            [date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 3)],
+        )
+        template.refresh_from_db()
+        self.assertEqual(template.materialized_until, date(2025, 1, 3))
+
+    def test_repeated_run_creates_nothing(self):
+        self.create_template('FREQ=WEEKLY;BYDAY=FR')
+        self.assertEqual(materialize_recurring(date(2025, 1, 31))['created'], 5)
+        result = materialize_recurring(
+            date(2025, 1, 31), date_from=date(2025, 1, 1), templates=RecurringRecord.objects.all(),
+        )
+        self.assertEqual((result['created'], result['existing']), (0, 5))
+
+    def test_moved_record_is_not_created_again(self):
+        template = self.create_template('FREQ=MONTHLY;BYMONTHDAY=5')
+        materialize_recurring(date(2025, 3, 31))
+        # Пользователь перенёс созданную запись за пределы окна
+        CashFlowRecord.objects.filter(
+            idempotency_key=get_record_key(template.pk, date(2025, 2, 5))
+        ).update(date=date(2025, 4, 10))
+
+        result = materialize_recurring(
+            date(2025, 3, 31), date_from=date(2025, 1, 1), templates=RecurringRecord.objects.all(),
+        )
+        self.assertEqual((result['created'], result['existing']), (0, 3))
+        self.assertEqual(CashFlowRecord.objects.count(), 3)
+
+    def test_archived_record_is_not_created_again(self):
+        self.create_template('FREQ=MONTHLY;BYMONTHDAY=5')
+        materialize_recurring(date(2025, 3, 31))
+        archive_records(date(2025, 3, 1))
+        result = materialize_recurring(
+            date(2025, 3, 31), date_from=date(2025, 1, 1), templates=RecurringRecord.objects.all(),
+        )
+        self.assertEqual((result['created'], result['existing']), (0, 3))
+
+
+    def test_usage_counts_include_templates(self):
+        self.create_template('FREQ=MONTHLY;BYMONTHDAY=5')
+        self.create_record(date(2025, 1, 10), '100.00', subcategory=self.supplies)
+        for usage in (reference_usage_counts(), async_to_sync(areference_usage_counts)()):
+            self.assertEqual(usage['category'][self.category.pk], 2)
+            self.assertEqual(usage['subcategory'][self.rent.pk], 1)
+            self.assertEqual(usage['subcategory'][self.supplies.pk], 1)
+        response = self.client.get(reverse('cashflow:reference_data'))
+        self.assertIn((self.rent, 1), response.context['subcategory_rows'])
+
+
+class ClaimJobTests(TestCase):
+    """Каждое задание очереди достаётся только одному воркеру"""
+
+    def test_jobs_are_claimed_once_in_order(self):
+        jobs = [enqueue('rebuild_rollups') for _ in range(3)]
+        claimed = [claim_job(worker) for worker in ('a', 'b', 'a')]
+        self.assertEqual([job.pk for job in claimed], [job.pk for job in jobs])
+        self.assertEqual([job.worker for job in claimed], ['a', 'b', 'a'])
+        self.assertTrue(all(job.status == Job.RUNNING and job.started_at for job in claimed))
+        self.assertIsNone(claim_job('b'))
+
+    def test_job_taken_by_another_worker_is_skipped(self):
+        first = enqueue('rebuild_rollups')
+        second = enqueue('rebuild_rollups')
+        now = timezone.now
+        calls = []
+
+        def claim_first_elsewhere():
+            # Другой воркер захватывает задание между выбором кандидатов и UPDATE
+            if not calls:
+                Job.objects.filter(pk=first.pk).update(status=Job.RUNNING, worker='other')
+            calls.append(1)
+            return now()
+
+        with mock.patch('cashflow.jobs.timezone.now', side_effect=claim_first_elsewhere):
+            job = claim_job('b')
+
+        self.assertEqual(job.pk, second.pk)
+        self.assertEqual(job.worker, 'b')
+        first.refresh_from_db()
+        self.assertEqual(first.worker, 'other')
+
+    def test_only_pending_jobs_are_claimed(self):
+        job = enqueue('rebuild_rollups')
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE)
+        self.assertIsNone(claim_job('a'))
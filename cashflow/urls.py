@@ -1,21 +1,56 @@
-from django.urls import path
-from . import views
+from django.conf import settings
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+from . import api, async_views, views
 
 app_name = 'cashflow'
 
+# Под ASGI лента и справочники обслуживаются асинхронными представлениями
+read_views = async_views if getattr(settings, 'CASHFLOW_ASYNC_VIEWS', False) else views
+
+# REST API только для чтения
+router = DefaultRouter()
+router.register('records', api.CashFlowRecordViewSet, basename='api-record')
+router.register('statuses', api.StatusViewSet, basename='api-status')
+router.register('types', api.TypeViewSet, basename='api-type')
+router.register('categories', api.CategoryViewSet, basename='api-category')
+router.register('subcategories', api.SubcategoryViewSet, basename='api-subcategory')
+
 urlpatterns = [
     # Главная страница
-    path('', views.index, name='index'),
+    path('', read_views.index, name='index'),
+
+    # Отчёт по периодам и категориям
+    path('report/', views.report, name='report'),
+
+    # Прогноз по категориям на ближайшие месяцы
+    path('forecast/', views.forecast, name='forecast'),
 
     # CRUD операции для записей ДДС
     path('record/create/', views.record_create, name='record_create'),
+    path('record/import/', views.record_import, name='record_import'),
+    path('record/export/', views.record_export, name='record_export'),
+    path('record/export/job/', views.record_export_job, name='record_export_job'),
+    path('record/bulk/', views.record_bulk, name='record_bulk'),
     path('record/<int:pk>/edit/', views.record_edit, name='record_edit'),
     path('record/<int:pk>/delete/', views.record_delete, name='record_delete'),
 
     # AJAX endpoints для динамической фильтрации
-    path('api/categories-by-type/', views.get_categories_by_type, name='categories_by_type'),
-    path('api/subcategories-by-category/', views.get_subcategories_by_category, name='subcategories_by_category'),
+    path('api/categories-by-type/', read_views.get_categories_by_type, name='categories_by_type'),
+    path('api/subcategories-by-category/', read_views.get_subcategories_by_category, name='subcategories_by_category'),
+    path('api/taxonomy/', views.get_taxonomy, name='taxonomy'),
+
+    # REST API
+    path('api/v1/balance/', api.BalanceView.as_view(), name='api-balance'),
+    path('api/v1/forecast/', api.ForecastView.as_view(), name='api-forecast'),
+    path('api/v1/', include(router.urls)),
+
+    # Фоновые задания
+    path('jobs/', views.job_list, name='job_list'),
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:pk>/status/', views.job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', views.job_download, name='job_download'),
 
     # Управление справочниками
-    path('reference/', views.reference_data, name='reference_data'),
+    path('reference/', read_views.reference_data, name='reference_data'),
 ]
@@ -1,70 +1,189 @@
+import hashlib
+import json
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.db.models import Q
 from django.utils import timezone
+from django.conf import settings
 from django.core.paginator import Paginator
-from django.http import JsonResponse
-from .models import Status, Type, Category, Subcategory, CashFlowRecord
-from .forms import CashFlowRecordForm
+from django.http import FileResponse, Http404, JsonResponse, QueryDict, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+from .models import CashFlowRecord, Job
+from .forms import CashFlowRecordForm, RecordBulkForm, RecordImportForm
+from .filters import SEARCH_PARAM, clean_record_filters, get_record_filters, filter_records, invalid_filters
+from .pagination import KeysetPaginator, KEYSET_ORDERING, MergedRecords, cached_count
+from .archive import reaches_archive, record_querysets
+from .reports import build_report, reference_usage_counts
+from .reference_cache import aget_reference_version, get_reference_data, get_reference_version
+from .importers import ImportFormatError, RecordImporter, read_file
+from .exporters import iter_csv
+from .bulk import delete_records, update_records
+from .balances import add_report_balances
+from .forecast import METHOD_CHOICES, ForecastUnavailable, build_forecast, get_forecast_options
+from .routers import read_from_replica, stream_from_replica
+from .search import SEARCH_ORDERING, rank_records, search_key
+from .jobs import enqueue, job_path, save_upload
+
+
+# Команды без параметров, которые можно запустить со страницы заданий
+QUEUED_FROM_JOB_LIST = ('rebuild_rollups', 'materialize_recurring')
+
+
+INDEX_SELECT_RELATED = ('status', 'type', 'category', 'subcategory')
+
+
+def index_records(querysets, search_query):
+    """Записи ленты для постраничного вывода по номеру страницы"""
+    if search_query:
+        # Результаты поиска упорядочены по релевантности; без архива страница
+        # выбирается в базе через OFFSET/LIMIT
+        if len(querysets) == 1:
+            return rank_records(querysets[0], search_query).order_by(*SEARCH_ORDERING)
+        return MergedRecords(
+            [rank_records(queryset, search_query) for queryset in querysets],
+            ordering=SEARCH_ORDERING,
+            key=search_key,
+        )
+    if len(querysets) == 1:
+        return querysets[0].order_by(*KEYSET_ORDERING)
+    return MergedRecords(querysets)
+
+
+def get_page_filters(request):
+    """Фильтры страницы из GET-параметров; некорректные значения отбрасываются с предупреждением"""
+    current_filters, errors = clean_record_filters(get_record_filters(request.GET))
+    for message in errors:
+        messages.warning(request, f'{message}, фильтр не применён.')
+    return current_filters
+
 
+def get_pagination_mode(search_query):
+    if search_query:
+        # Порядок по релевантности не поддерживает курсор ленты
+        return 'offset'
+    return getattr(settings, 'CASHFLOW_PAGINATION_MODE', 'keyset')
 
+
+def live_count_filters(filters):
+    """Ключ кеша количества записей ленты без архива (для массовых действий)"""
+    return dict(filters, scope='live')
+
+
+def index_context(request, current_filters, reference, page_obj, pagination_mode, total_count, bulk_count):
+    # Параметры фильтрации без параметров пагинации для ссылок навигации
+    filter_params = request.GET.copy()
+    filter_params.pop('page', None)
+    filter_params.pop('cursor', None)
+
+    return {
+        'page_obj': page_obj,
+        'statuses': reference.statuses,
+        'types': reference.types,
+        'categories': reference.categories,
+        'subcategories': reference.subcategories,
+        'pagination_mode': pagination_mode,
+        'total_count': total_count,
+        # Массовые действия по фильтрам не затрагивают архив
+        'bulk_count': bulk_count,
+        'bulk_skips_archive': total_count != bulk_count,
+        'filter_query': filter_params.urlencode(),
+        'current_filters': current_filters,
+        'bulk_form': RecordBulkForm(prefix='bulk', reference=reference),
+    }
+
+
+@read_from_replica
 def index(request):
     """Главная страница с таблицей записей ДДС и фильтрами"""
     # Получение параметров фильтрации
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
-    status_id = request.GET.get('status')
-    type_id = request.GET.get('type')
-    category_id = request.GET.get('category')
-    subcategory_id = request.GET.get('subcategory')
-
-    # Базовый queryset
-    records = CashFlowRecord.objects.select_related(
-        'status', 'type', 'category', 'subcategory'
-    ).order_by('-date', '-created_at')
-
-    # Применение фильтров
-    if date_from:
-        records = records.filter(date__gte=date_from)
-    if date_to:
-        records = records.filter(date__lte=date_to)
-    if status_id:
-        records = records.filter(status_id=status_id)
-    if type_id:
-        records = records.filter(type_id=type_id)
-    if category_id:
-        records = records.filter(category_id=category_id)
-    if subcategory_id:
-        records = records.filter(subcategory_id=subcategory_id)
+    current_filters = get_page_filters(request)
+
+    # Querysets с применением фильтров: лента и, если период его захватывает, архив
+    querysets = record_querysets(current_filters, select_related=INDEX_SELECT_RELATED)
+    search_query = current_filters[SEARCH_PARAM]
 
     # Пагинация
-    paginator = Paginator(records, 20)  # 20 записей на страницу
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    pagination_mode = get_pagination_mode(search_query)
+    total_count = None
+    if pagination_mode == 'keyset':
+        page_obj = KeysetPaginator(querysets, 20).get_page(request.GET.get('cursor'))
+        if getattr(settings, 'CASHFLOW_SHOW_TOTAL_COUNT', True):
+            total_count = cached_count(querysets, current_filters)
+    else:
+        paginator = Paginator(index_records(querysets, search_query), 20)  # 20 записей на страницу
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+        total_count = paginator.count
+    bulk_count = total_count
+    if total_count is not None and len(querysets) > 1:
+        bulk_count = cached_count(querysets[0], live_count_filters(current_filters))
+
+    # Получение данных для фильтров из кеша справочников
+    reference = get_reference_data()
+
+    context = index_context(
+        request, current_filters, reference, page_obj, pagination_mode, total_count, bulk_count,
+    )
+    return render(request, 'cashflow/index.html', context)
 
-    # Получение данных для фильтров
-    statuses = Status.objects.all()
-    types = Type.objects.all()
-    categories = Category.objects.select_related('type').all()
-    subcategories = Subcategory.objects.select_related('category').all()
+
+@read_from_replica
+def report(request):
+    """Отчёт по поступлениям и списаниям для фильтров главной страницы"""
+    current_filters = get_page_filters(request)
+    reference = get_reference_data()
+
+    report_data = build_report(current_filters)
+    # Остаток имеет смысл только для всех операций статуса, без фильтров по классификации
+    if not any(current_filters.get(name) for name in ('type', 'category', 'subcategory')):
+        add_report_balances(report_data, current_filters.get('status'))
 
     context = {
-        'page_obj': page_obj,
-        'statuses': statuses,
-        'types': types,
-        'categories': categories,
-        'subcategories': subcategories,
-        'current_filters': {
-            'date_from': date_from,
-            'date_to': date_to,
-            'status': status_id,
-            'type': type_id,
-            'category': category_id,
-            'subcategory': subcategory_id,
-        }
+        'report': report_data,
+        'statuses': reference.statuses,
+        'types': reference.types,
+        'categories': reference.categories,
+        'subcategories': reference.subcategories,
+        'filter_query': request.GET.urlencode(),
+        'current_filters': current_filters,
     }
+    return render(request, 'cashflow/report.html', context)
 
-    return render(request, 'cashflow/index.html', context)
+
+@read_from_replica
+def forecast(request):
+    """Прогноз поступлений и списаний по категориям на ближайшие месяцы"""
+    current_filters = get_page_filters(request)
+    reference = get_reference_data()
+
+    options, errors = get_forecast_options(request.GET)
+    for message in errors.values():
+        messages.warning(request, f'Параметр прогноза проигнорирован: {message}')
+    try:
+        forecast_data = build_forecast(current_filters, options)
+    except ForecastUnavailable:
+        forecast_data = None
+        messages.error(request, 'Прогноз недоступен: не установлен пакет numpy.')
+
+    context = {
+        'forecast': forecast_data,
+        'forecast_options': options,
+        'forecast_methods': METHOD_CHOICES,
+        'statuses': reference.statuses,
+        'types': reference.types,
+        'categories': reference.categories,
+        'subcategories': reference.subcategories,
+        'filter_query': request.GET.urlencode(),
+        'current_filters': current_filters,
+    }
+    return render(request, 'cashflow/forecast.html', context)
 
 
 def record_create(request):
@@ -85,6 +204,74 @@ def record_create(request):
     return render(request, 'cashflow/record_form.html', context)
 
 
+def record_import(request):
+    """Импорт записей ДДС из файла CSV/XLSX"""
+    result = None
+    if request.method == 'POST':
+        form = RecordImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            if upload.size > getattr(settings, 'CASHFLOW_IMPORT_INLINE_MAX_SIZE', 1024 * 1024):
+                # Большой файл импортируется фоновым заданием, страница показывает его ход
+                name = save_upload(upload)
+                job = enqueue('import_records', job_path(name), input_file=name)
+                messages.info(request, f'Файл {upload.name} поставлен в очередь на импорт.')
+                return redirect('cashflow:job_detail', pk=job.pk)
+            try:
+                result = RecordImporter().run(read_file(upload.file, upload.name))
+            except ImportFormatError as error:
+                form.add_error('file', str(error))
+            else:
+                if result.created:
+                    messages.success(request, f'Импортировано записей: {result.created}')
+                if result.errors:
+                    messages.warning(request, f'Пропущено строк с ошибками: {result.failed}')
+    else:
+        form = RecordImportForm()
+
+    context = {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:200] if result else [],
+        'title': 'Импорт записей ДДС'
+    }
+    return render(request, 'cashflow/record_import.html', context)
+
+
+@read_from_replica
+def record_export(request):
+    """Потоковая выгрузка записей ДДС в CSV с фильтрами главной страницы"""
+    # Сообщение о некорректном фильтре некуда показать: фильтр не применяется
+    current_filters, _ = clean_record_filters(get_record_filters(request.GET))
+    response = StreamingHttpResponse(
+        stream_from_replica(iter_csv(current_filters)),
+        content_type='text/csv; charset=utf-8',
+    )
+    filename = f"cashflow_records_{timezone.localdate():%Y%m%d}.csv"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def record_export_job(request):
+    """Выгрузка записей ДДС фоновым заданием: файл скачивается со страницы задания"""
+    filter_query = request.POST.get('filter_query', '')
+    if request.method != 'POST':
+        return redirect(reverse('cashflow:index') + (f'?{filter_query}' if filter_query else ''))
+
+    current_filters = get_record_filters(QueryDict(filter_query))
+    errors = invalid_filters(current_filters)
+    if errors:
+        for message in errors.values():
+            messages.error(request, message)
+        return redirect(reverse('cashflow:index') + f'?{filter_query}')
+    name = f'exports/cashflow_records_{timezone.localdate():%Y%m%d}_{uuid.uuid4().hex[:8]}.csv'
+    job_path(name).parent.mkdir(parents=True, exist_ok=True)
+    options = {key: value for key, value in current_filters.items() if value}
+    job = enqueue('export_records', output=str(job_path(name)), result_file=name, **options)
+    messages.info(request, 'Выгрузка поставлена в очередь.')
+    return redirect('cashflow:job_detail', pk=job.pk)
+
+
 def record_edit(request, pk):
     """Редактирование записи ДДС"""
     record = get_object_or_404(CashFlowRecord, pk=pk)
@@ -122,30 +309,206 @@ def record_delete(request, pk):
     return render(request, 'cashflow/record_confirm_delete.html', context)
 
 
+def record_bulk(request):
+    """Массовое изменение или удаление записей ДДС, выбранных в таблице или по фильтрам"""
+    filter_query = request.POST.get('filter_query', '')
+    redirect_url = reverse('cashflow:index') + (f'?{filter_query}' if filter_query else '')
+    if request.method != 'POST':
+        return redirect(redirect_url)
+
+    # Архивные записи только для чтения и массовыми действиями не изменяются
+    archive_note = ''
+    if request.POST.get('scope') == 'filtered':
+        current_filters = get_record_filters(QueryDict(filter_query))
+        # Без некорректного фильтра действие затронуло бы больше записей
+        errors = invalid_filters(current_filters)
+        if errors:
+            for message in errors.values():
+                messages.error(request, message)
+            return redirect(redirect_url)
+        records = filter_records(CashFlowRecord.objects.all(), current_filters)
+        if reaches_archive(current_filters):
+            archive_note = ' (архивные записи не изменялись)'
+    else:
+        ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+        if not ids:
+            messages.warning(request, 'Не выбрано ни одной записи.')
+            return redirect(redirect_url)
+        records = CashFlowRecord.objects.filter(pk__in=ids)
+
+    if request.POST.get('action') == 'delete':
+        deleted = delete_records(records)
+        messages.success(request, f'Удалено записей: {deleted}{archive_note}')
+        return redirect(redirect_url)
+
+    form = RecordBulkForm(request.POST, prefix='bulk')
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return redirect(redirect_url)
+    changes = form.get_changes()
+    if not changes:
+        messages.warning(request, 'Не выбрано ни одного нового значения.')
+        return redirect(redirect_url)
+    updated = update_records(records, **changes)
+    messages.success(request, f'Изменено записей: {updated}{archive_note}')
+    return redirect(redirect_url)
+
+
+def reference_json(view):
+    """
+    Условный GET для JSON со справочниками.
+
+    ETag - версия кеша справочников, поэтому повторный запрос браузера
+    получает 304 без формирования ответа, пока справочники не изменились.
+    """
+    max_age = getattr(settings, 'CASHFLOW_REFERENCE_MAX_AGE', 60)
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            etag = quote_etag(await aget_reference_version())
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                if request.method in ('GET', 'HEAD'):
+                    response.headers.setdefault('ETag', etag)
+            patch_cache_control(response, max_age=max_age)
+            return response
+        return async_wrapper
+
+    conditional_view = condition(
+        etag_func=lambda request, *args, **kwargs: get_reference_version()
+    )(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        patch_cache_control(response, max_age=max_age)
+        return response
+    return wrapper
+
+
+@reference_json
 def get_categories_by_type(request):
     """AJAX endpoint для получения категорий по типу"""
     type_id = request.GET.get('type_id')
     if type_id:
-        categories = Category.objects.filter(type_id=type_id).values('id', 'name')
-        return JsonResponse(list(categories), safe=False)
+        try:
+            categories = get_reference_data().categories_for_type(int(type_id))
+        except ValueError:
+            categories = []
+        return JsonResponse([{'id': c.id, 'name': c.name} for c in categories], safe=False)
     return JsonResponse([], safe=False)
 
 
+@reference_json
 def get_subcategories_by_category(request):
     """AJAX endpoint для получения подкатегорий по категории"""
     category_id = request.GET.get('category_id')
     if category_id:
-        subcategories = Subcategory.objects.filter(category_id=category_id).values('id', 'name')
-        return JsonResponse(list(subcategories), safe=False)
+        try:
+            subcategories = get_reference_data().subcategories_for_category(int(category_id))
+        except ValueError:
+            subcategories = []
+        return JsonResponse([{'id': s.id, 'name': s.name} for s in subcategories], safe=False)
     return JsonResponse([], safe=False)
 
 
+@reference_json
+def get_taxonomy(request):
+    """AJAX endpoint со всем деревом тип → категории → подкатегории для выбора на клиенте"""
+    reference = get_reference_data()
+    types = [
+        {
+            'id': type_obj.id,
+            'name': type_obj.name,
+            'categories': [
+                {
+                    'id': category.id,
+                    'name': category.name,
+                    'subcategories': [
+                        {'id': subcategory.id, 'name': subcategory.name}
+                        for subcategory in reference.subcategories_for_category(category.id)
+                    ],
+                }
+                for category in reference.categories_for_type(type_obj.id)
+            ],
+        }
+        for type_obj in reference.types
+    ]
+    return JsonResponse({'version': reference.version, 'types': types})
+
+
 def reference_data(request):
     """Страница управления справочниками"""
+    context = reference_context(get_reference_data(), reference_usage_counts())
+    return render(request, 'cashflow/reference_data.html', context)
+
+
+def reference_context(reference, usage):
+    return {
+        # Таблицы справочников кешируются до изменения справочников или числа записей
+        'usage_version': hashlib.md5(
+            json.dumps(usage, sort_keys=True).encode()
+        ).hexdigest(),
+        'statuses': reference.statuses,
+        'types': reference.types,
+        'categories': reference.categories,
+        'subcategories': reference.subcategories,
+        'status_rows': [(obj, usage['status'][obj.pk]) for obj in reference.statuses],
+        'type_rows': [(obj, usage['type'][obj.pk]) for obj in reference.types],
+        'category_rows': [(obj, usage['category'][obj.pk]) for obj in reference.categories],
+        'subcategory_rows': [(obj, usage['subcategory'][obj.pk]) for obj in reference.subcategories],
+    }
+
+
+def job_list(request):
+    """Последние фоновые задания и запуск пересчёта итогов"""
+    if request.method == 'POST':
+        command = request.POST.get('command')
+        if command in QUEUED_FROM_JOB_LIST:
+            job = enqueue(command)
+            messages.info(request, f'{job.get_command_display()}: задание поставлено в очередь.')
+            return redirect('cashflow:job_detail', pk=job.pk)
+        messages.warning(request, 'Эту команду нельзя запустить со страницы заданий.')
+        return redirect('cashflow:job_list')
+
     context = {
-        'statuses': Status.objects.all(),
-        'types': Type.objects.all(),
-        'categories': Category.objects.select_related('type').all(),
-        'subcategories': Subcategory.objects.select_related('category').all(),
+        'jobs': Job.objects.defer('output')[:50],
+        'commands': [(command, dict(Job.COMMAND_CHOICES)[command]) for command in QUEUED_FROM_JOB_LIST],
     }
-    return render(request, 'cashflow/reference_data.html', context)
+    return render(request, 'cashflow/job_list.html', context)
+
+
+def job_detail(request, pk):
+    """Страница задания; пока задание выполняется, страница опрашивает job_status"""
+    job = get_object_or_404(Job, pk=pk)
+    return render(request, 'cashflow/job_detail.html', {'job': job})
+
+
+def job_status(request, pk):
+    """AJAX endpoint с состоянием и прогрессом задания"""
+    job = get_object_or_404(Job, pk=pk)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'message': job.message,
+        'output': job.output,
+        'finished': job.is_finished,
+    })
+
+
+def job_download(request, pk):
+    """Скачивание файла результата выполненного задания"""
+    job = get_object_or_404(Job, pk=pk, status=Job.DONE)
+    if not job.result_file or not job_path(job.result_file).exists():
+        raise Http404('Файл результата не найден')
+    path = job_path(job.result_file)
+    # Имя файла для пользователя - без случайного суффикса
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=path.name.rsplit('_', 1)[0] + path.suffix)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cashflow_project.settings')
+# Профиль ASGI: асинхронные представления и соединения с базой без CONN_MAX_AGE
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 
 application = get_asgi_application()
@@ -0,0 +1,45 @@
+"""
+Настройки кеша Django из переменных окружения.
+
+В кеше хранятся версии справочников и дневных итогов, граница архива,
+количества записей и прогнозы. Их меняют веб-процессы, команды управления
+и воркеры run_workers, поэтому кеш должен быть общим для всех процессов:
+
+    CACHE_BACKEND  - file (по умолчанию), redis, database или locmem
+    CACHE_LOCATION - каталог для file (cache/ в каталоге проекта), адрес
+                     для redis (redis://localhost:6379/0) или таблица для
+                     database (cashflow_cache, создаётся командой createcachetable)
+
+file - общий кеш процессов одного сервера; процессам на нескольких серверах
+нужен redis (пакет redis) или database. locmem - кеш одного процесса: изменения,
+сделанные другими процессами, в нём не видны, поэтому он подходит только для
+разработки в одном процессе, и run_workers с ним не запускается.
+"""
+import os
+
+
+BACKENDS = {
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'database': 'django.core.cache.backends.db.DatabaseCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+def get_caches(base_dir, environ=os.environ):
+    """Словарь CACHES с кешем 'default'"""
+    backend = environ.get('CACHE_BACKEND', 'file').strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f'Unsupported CACHE_BACKEND: {backend}')
+    config = {'BACKEND': BACKENDS[backend]}
+    location = environ.get('CACHE_LOCATION')
+    if backend == 'file':
+        config['LOCATION'] = location or str(base_dir / 'cache')
+        # При переполнении кеш удаляет случайную треть файлов; версии без срока
+        # хранения при этом просто создаются заново
+        config['OPTIONS'] = {'MAX_ENTRIES': 10000}
+    elif backend == 'redis':
+        config['LOCATION'] = location or 'redis://localhost:6379/0'
+    elif backend == 'database':
+        config['LOCATION'] = location or 'cashflow_cache'
+    return {'default': config}
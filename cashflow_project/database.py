@@ -0,0 +1,86 @@
+"""
+Настройки баз данных из переменных окружения.
+
+По умолчанию используется SQLite (db.sqlite3 в каталоге проекта), PRAGMA
+соединений задаются настройкой CASHFLOW_SQLITE_PRAGMAS.
+PostgreSQL включается переменной DB_ENGINE=postgresql:
+
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT - параметры подключения
+    DB_CONN_MAX_AGE        - время жизни постоянного соединения, секунды (60, под ASGI 0)
+    DB_CONN_HEALTH_CHECKS  - проверять соединение перед повторным использованием (1)
+    DB_POOL                - пул соединений psycopg (Django 5.1+), вместо CONN_MAX_AGE (0)
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE - размеры пула (2, 10)
+    DB_REPLICA_HOSTS       - хосты реплик для чтения через запятую (host или host:port)
+
+SERVER_INTERFACE=asgi (задаётся в asgi.py) выключает постоянные соединения
+по умолчанию: под ASGI каждый запрос выполняет запросы к базе в своём потоке,
+и постоянные соединения таких потоков не переиспользуются. Для повторного
+использования соединений под ASGI включается пул DB_POOL.
+"""
+import os
+
+import django
+
+
+def env_bool(environ, name, default=False):
+    value = environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def postgresql_config(environ, host=None, port=None):
+    """Параметры подключения PostgreSQL (основная база или реплика)"""
+    config = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('DB_NAME', 'cashflow'),
+        'USER': environ.get('DB_USER', 'cashflow'),
+        'PASSWORD': environ.get('DB_PASSWORD', ''),
+        'HOST': host or environ.get('DB_HOST', 'localhost'),
+        'PORT': port or environ.get('DB_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': env_bool(environ, 'DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': {},
+    }
+    if env_bool(environ, 'DB_POOL'):
+        # Пул соединений несовместим с постоянными соединениями (CONN_MAX_AGE)
+        config['CONN_MAX_AGE'] = 0
+        config['OPTIONS']['pool'] = {
+            'min_size': env_int(environ, 'DB_POOL_MIN_SIZE', 2),
+            'max_size': env_int(environ, 'DB_POOL_MAX_SIZE', 10),
+        }
+    else:
+        asgi = environ.get('SERVER_INTERFACE') == 'asgi'
+        config['CONN_MAX_AGE'] = env_int(environ, 'DB_CONN_MAX_AGE', 0 if asgi else 60)
+    return config
+
+
+def get_databases(base_dir, environ=os.environ):
+    """Словарь DATABASES: основная база 'default' и реплики 'replica_1', 'replica_2'..."""
+    engine = environ.get('DB_ENGINE', 'sqlite').strip().lower()
+    if engine in ('sqlite', 'sqlite3'):
+        config = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': environ.get('DB_NAME') or base_dir / 'db.sqlite3',
+        }
+        if django.VERSION >= (5, 1):
+            # Транзакция сразу берёт блокировку записи: параллельные сохранения
+            # ждут её (busy_timeout), а не падают при повышении блокировки
+            config['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+        return {'default': config}
+    if engine not in ('postgresql', 'postgres'):
+        raise ValueError(f'Unsupported DB_ENGINE: {engine}')
+
+    databases = {'default': postgresql_config(environ)}
+    replica_hosts = [host.strip() for host in environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+    for number, replica in enumerate(replica_hosts, start=1):
+        host, _, port = replica.partition(':')
+        config = postgresql_config(environ, host=host, port=port or None)
+        # В тестах реплика - та же тестовая база, что и основная
+        config['TEST'] = {'MIRROR': 'default'}
+        databases[f'replica_{number}'] = config
+    return databases
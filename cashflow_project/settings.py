@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .caches import get_caches
+from .database import get_databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы общее время включало остальные middleware
+    'cashflow.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +61,8 @@ ROOT_URLCONF = 'cashflow_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки для RequestMetricsMiddleware
+        'BACKEND': 'cashflow.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +70,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'cashflow.context_processors.reference_fragments',
             ],
         },
     },
@@ -73,13 +81,20 @@ WSGI_APPLICATION = 'cashflow_project.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# SQLite по умолчанию, PostgreSQL и реплики - через переменные DB_* (см. database.py)
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+DATABASES = get_databases(BASE_DIR)
+
+# Чтение ленты, отчётов и выгрузок с реплик, запись - в основную базу
+DATABASE_ROUTERS = ['cashflow.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+# Общий для всех процессов кеш: файлы в cache/ по умолчанию, redis или таблица
+# в базе - через переменные CACHE_* (см. caches.py)
+
+CACHES = get_caches(BASE_DIR)
 
 
 # Password validation
@@ -122,3 +137,91 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Cash flow application settings
+
+# Режим пагинации ленты записей: 'keyset' (по курсору) или 'offset' (по номеру страницы)
+CASHFLOW_PAGINATION_MODE = 'keyset'
+
+# Показывать общее количество записей на главной странице
+CASHFLOW_SHOW_TOTAL_COUNT = True
+
+# Время жизни кешированного количества записей (секунды)
+CASHFLOW_COUNT_CACHE_TIMEOUT = 60
+
+# Время кеширования браузером JSON со справочниками (секунды); после него
+# браузер перепроверяет ответ по ETag
+CASHFLOW_REFERENCE_MAX_AGE = 60
+
+# Максимальное количество записей в одном запросе пакетной загрузки API
+CASHFLOW_INGEST_MAX_BATCH = 1000
+
+# Сколько последних месяцев команда archive_records оставляет в основной таблице
+CASHFLOW_ARCHIVE_KEEP_MONTHS = 24
+
+# Срок хранения в кеше последней даты архива (секунды); archive_records сбрасывает
+# её сразу, срок ограничивает устаревание при кеше одного процесса (locmem)
+CASHFLOW_ARCHIVE_BOUNDARY_TIMEOUT = 300
+
+# Время хранения фрагментов шаблонов со списками справочников (секунды); ключ
+# содержит версию справочников, поэтому после изменений фрагменты строятся заново
+CASHFLOW_FRAGMENT_CACHE_TIMEOUT = 86400
+
+# PRAGMA для каждого нового соединения SQLite ({} - настройки SQLite по умолчанию);
+# команда benchmark_sqlite_writes сравнивает их с настройками по умолчанию
+CASHFLOW_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 134217728,
+    'cache_size': -20000,
+    'temp_store': 'memory',
+}
+
+# Измерение запросов (RequestMetricsMiddleware): число SQL-запросов, время базы
+# и шаблонов в заголовке Server-Timing и в логе cashflow.metrics
+CASHFLOW_REQUEST_METRICS = True
+
+# Асинхронные представления ленты, JSON справочников и страницы справочников;
+# включаются при запуске через cashflow_project/asgi.py (SERVER_INTERFACE=asgi)
+CASHFLOW_ASYNC_VIEWS = os.environ.get('SERVER_INTERFACE') == 'asgi'
+
+# Фоновые задания (команда run_workers): каталог загруженных файлов и результатов,
+# число процессов-воркеров, интервал сигнала воркера и время, после которого
+# задание без сигналов считается прерванным (секунды)
+CASHFLOW_JOB_DIR = BASE_DIR / 'job_files'
+CASHFLOW_JOB_WORKERS = 2
+CASHFLOW_JOB_HEARTBEAT = 30
+CASHFLOW_JOB_STALE_TIMEOUT = 300
+
+# Файлы импорта больше этого размера (байты) импортируются фоновым заданием
+CASHFLOW_IMPORT_INLINE_MAX_SIZE = 1024 * 1024
+
+# Прогноз (страница «Прогноз», требуется numpy): горизонт и длина истории
+# по умолчанию (месяцы), время хранения прогноза в кеше (секунды; прогноз
+# пересчитывается раньше при изменении записей, справочников или шаблонов)
+CASHFLOW_FORECAST_MONTHS = 6
+CASHFLOW_FORECAST_HISTORY_MONTHS = 24
+CASHFLOW_FORECAST_CACHE_TIMEOUT = 86400
+
+# Допустимое число SQL-запросов на запрос к страницам и API приложения;
+# запросы сверх него пишутся в лог с уровнем WARNING
+CASHFLOW_QUERY_BUDGET = 20
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'cashflow.metrics': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}